@@ -0,0 +1,244 @@
+'''
+batch builds a whole catalogue of keyboards in one go.
+
+Jobs come from a manifest and are spread over a pool of worker processes. Each
+worker imports skidl, pcbnew and the rest of keycad once and then stays warm
+for as many jobs as it's given. Every job writes to its own directory under
+the batch's output directory. Pool workers can't start processes of their own,
+so each job runs its output stages one after another.
+
+A manifest is a JSON file like
+
+    {
+        "args": ["--add_pro_micro"],
+        "jobs": [
+            {
+                "kle": "ansi-104.json",
+                "descriptors": "ansi-104.descriptors.json",
+                "positions": "ansi-104.positions.json",
+                "args": ["--add_per_key_rgb"]
+            }
+        ]
+    }
+
+where paths are relative to the manifest, and the top-level "args" apply to
+every job. A directory also works as a manifest: each KLE file in it becomes a
+job, picking up NAME.descriptors.json and NAME.positions.json when present.
+'''
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+DESCRIPTORS_SUFFIX = ".descriptors.json"
+POSITIONS_SUFFIX = ".positions.json"
+KLE_SUFFIX = ".json"
+
+
+class Job:
+    def __init__(self,
+                 name,
+                 kle_filename,
+                 descriptors_filename=None,
+                 positions_filename=None,
+                 args=()):
+        self.name = name
+        self.kle_filename = kle_filename
+        self.descriptors_filename = descriptors_filename
+        self.positions_filename = positions_filename
+        self.args = list(args)
+
+    def get_argv(self, out_dir):
+        argv = [
+            self.kle_filename, "--output_prefix", self.name, "--out_dir",
+            os.path.join(out_dir, self.name), "--no_open", "--output_workers",
+            "0"
+        ]
+        if self.descriptors_filename:
+            argv += ["--descriptors_filename", self.descriptors_filename]
+        if self.positions_filename:
+            argv += ["--position_json_filename", self.positions_filename]
+        return argv + self.args
+
+
+def _sibling(kle_filename, suffix):
+    filename = kle_filename[:-len(KLE_SUFFIX)] + suffix
+    if os.path.exists(filename):
+        return filename
+    return None
+
+
+def _layout_name(kle_filename):
+    return os.path.basename(kle_filename)[:-len(KLE_SUFFIX)]
+
+
+def discover_jobs(directory, args=()):
+    jobs = []
+    for filename in sorted(glob.glob(os.path.join(directory,
+                                                  "*" + KLE_SUFFIX))):
+        if (filename.endswith(DESCRIPTORS_SUFFIX)
+                or filename.endswith(POSITIONS_SUFFIX)):
+            continue
+        jobs.append(
+            Job(_layout_name(filename),
+                filename,
+                descriptors_filename=_sibling(filename, DESCRIPTORS_SUFFIX),
+                positions_filename=_sibling(filename, POSITIONS_SUFFIX),
+                args=args))
+    return jobs
+
+
+def read_manifest(path, args=()):
+    if os.path.isdir(path):
+        return discover_jobs(path, args)
+
+    with open(path, "r") as f:
+        manifest = json.loads(f.read())
+    base_dir = os.path.dirname(path)
+
+    def resolve(filename):
+        if filename is None:
+            return None
+        return os.path.join(base_dir, filename)
+
+    common_args = list(args) + manifest.get("args", [])
+    jobs = []
+    names = set()
+    for entry in manifest["jobs"]:
+        kle_filename = resolve(entry["kle"])
+        name = entry.get("name", _layout_name(kle_filename))
+        if name in names:
+            raise ValueError("duplicate job name %s in %s" % (name, path))
+        names.add(name)
+        descriptors = resolve(entry.get("descriptors"))
+        if descriptors is None:
+            descriptors = _sibling(kle_filename, DESCRIPTORS_SUFFIX)
+        positions = resolve(entry.get("positions"))
+        if positions is None:
+            positions = _sibling(kle_filename, POSITIONS_SUFFIX)
+        jobs.append(
+            Job(name,
+                kle_filename,
+                descriptors_filename=descriptors,
+                positions_filename=positions,
+                args=common_args + entry.get("args", [])))
+    return jobs
+
+
+def _init_worker():
+    # Importing the pipeline pulls in skidl, pcbnew and jinja2. Doing it here
+    # means each worker pays for that once, not once per job.
+    from keycad import keycad  # noqa: F401
+
+
+def run_job(name, argv):
+    from keycad import keycad
+    from keycad.partstore import get_template_cache
+
+    templates = get_template_cache()
+    hits, misses = templates.hits, templates.misses
+    start = time.perf_counter()
+    result = {"name": name, "pid": os.getpid()}
+    try:
+        keycad.build_keyboard(keycad.make_arg_parser().parse_args(argv))
+        result["status"] = "ok"
+    except Exception:
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+    except SystemExit as e:
+        # argparse rejecting a job's arguments shouldn't take down the worker.
+        result["status"] = "failed"
+        result["error"] = "exited with status %s" % e.code
+    result["seconds"] = time.perf_counter() - start
+    result["template_hits"] = templates.hits - hits
+    result["template_misses"] = templates.misses - misses
+    return result
+
+
+def _run_job(job_and_argv):
+    return run_job(*job_and_argv)
+
+
+def run_batch(jobs, out_dir, workers=None):
+    work = [(job.name, job.get_argv(out_dir)) for job in jobs]
+    results = []
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(_run_job, work):
+            print("%-24s %-6s %7.2fs  parts %d copied, %d loaded" %
+                  (result["name"], result["status"], result["seconds"],
+                   result["template_hits"], result["template_misses"]))
+            results.append(result)
+    return results
+
+
+def print_summary(results, wall_seconds):
+    ok = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] != "ok"]
+    busy_seconds = sum(r["seconds"] for r in results)
+
+    print()
+    print("%d jobs: %d ok, %d failed" % (len(results), len(ok), len(failed)))
+    print("wall time %.2fs, job time %.2fs across %d workers" %
+          (wall_seconds, busy_seconds, len(set(r["pid"] for r in results))))
+    if results:
+        slowest = max(results, key=lambda r: r["seconds"])
+        print("slowest: %s (%.2fs)" % (slowest["name"], slowest["seconds"]))
+    for r in failed:
+        print()
+        print("%s failed:" % r["name"])
+        print(r["error"])
+
+
+def board_argv(args, actions):
+    '''The options for actions, with their values in args, as arguments.'''
+    argv = []
+    for action in actions:
+        value = getattr(args, action.dest)
+        flag = action.option_strings[0]
+        if action.nargs == 0:
+            if value:
+                argv.append(flag)
+        elif isinstance(value, list):
+            argv += [flag] + [str(v) for v in value]
+        elif value is not None:
+            argv += [flag, str(value)]
+    return argv
+
+
+def main(argv=None):
+    from keycad.keycad import add_board_arguments
+
+    arg_parser = argparse.ArgumentParser(
+        prog="keycad batch",
+        description="Build many keyboards from a manifest in parallel.")
+    arg_parser.add_argument(
+        "manifest",
+        help="manifest JSON file, or a directory of KLE files such as "
+        "kle_layouts/")
+    arg_parser.add_argument("--out_dir",
+                            help="directory for per-job output directories",
+                            default="output")
+    arg_parser.add_argument("--workers",
+                            help="number of worker processes",
+                            type=int,
+                            default=os.cpu_count())
+    arg_parser.add_argument("--only",
+                            help="build just the jobs with these names",
+                            nargs="+")
+    board_actions = add_board_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+
+    # Board options given to the batch apply to every job.
+    common_args = board_argv(args, board_actions)
+    jobs = read_manifest(args.manifest, common_args)
+    if args.only:
+        jobs = [job for job in jobs if job.name in args.only]
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.out_dir, args.workers)
+    print_summary(results, time.perf_counter() - start)
+    return 1 if any(r["status"] != "ok" for r in results) else 0
@@ -0,0 +1,67 @@
+'''
+boardhash fingerprints what a board's zone fills depend on, straight from the
+.kicad_pcb text and without pcbnew.
+
+copper_hash() covers the design rules, nets, pads, tracks, vias and board
+outline. zone_hash() covers the zones, but not their filled polygons, which
+are what a fill produces rather than what it depends on.
+'''
+
+import hashlib
+
+from keycad import sexpr
+
+# Board-level items that fills are cut around.
+_COPPER_ITEMS = ("segment", "arc", "via")
+_GRAPHIC_ITEMS = ("gr_line", "gr_arc", "gr_circle", "gr_poly", "gr_curve",
+                  "gr_text")
+_FILL_OUTPUTS = ("filled_polygon", "fill_segments")
+
+
+def _update(h, expr):
+    h.update(sexpr.dumps(expr, inline_depth=0).encode("utf-8"))
+    h.update(b"\n")
+
+
+def _is_copper_or_edge(item):
+    layer = sexpr.find(item, "layer")
+    return layer is not None and (layer[1].endswith(".Cu")
+                                  or layer[1] == "Edge.Cuts")
+
+
+def copper_hash(board):
+    '''board is a parsed .kicad_pcb.'''
+    h = hashlib.sha256()
+    for item in board[1:]:
+        if not isinstance(item, list) or not item:
+            continue
+        keyword = item[0]
+        if keyword in ("setup", "net", "net_class") + _COPPER_ITEMS:
+            _update(h, item)
+        elif keyword in _GRAPHIC_ITEMS:
+            if _is_copper_or_edge(item):
+                _update(h, item)
+        elif keyword == "module":
+            _update(h, [
+                keyword, item[1],
+                sexpr.find(item, "layer"),
+                sexpr.find(item, "at")
+            ] + sexpr.find_all(item, "pad"))
+    return h.hexdigest()
+
+
+def zone_hash(board):
+    h = hashlib.sha256()
+    for zone in sexpr.find_all(board, "zone"):
+        _update(h, [
+            e for e in zone
+            if not (isinstance(e, list) and e and e[0] in _FILL_OUTPUTS)
+        ])
+    return h.hexdigest()
+
+
+def board_hashes(filename):
+    '''(copper_hash, zone_hash) of the board in filename.'''
+    with open(filename, "r") as f:
+        board = sexpr.parse(f.read())
+    return copper_hash(board), zone_hash(board)
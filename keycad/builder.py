@@ -1,43 +1,164 @@
+from keycad import ledchain
+from keycad import ports
+from keycad.matrix import PARSE_ORDER, STANDARD
+from keycad.pcb import KC_TO_MM
+from keycad.placement import Placer
+
+SKIDL_BACKEND = "skidl"
+DIRECT_BACKEND = "direct"
+NETLIST_BACKENDS = (SKIDL_BACKEND, DIRECT_BACKEND)
+
+# The USB-C receptacle's mating face is its footprint's x axis, with the body
+# behind it towards -y. On the bottom of the board at 0 degrees, the face is
+# the part's top edge and the body points into the board.
+USB_C_EDGE_ANGLE = 0
+USB_C_FACE_MM = 0
+
+
 class BoardBuilder:
     def __init__(self, kle, schematic):
         self._kle = kle
         self._schematic = schematic
 
+        # (part, nets, whether it goes on the top edge) in the order that
+        # place_parts() moves them.
+        self._movable = []
+        self._led_chains = []
+        self._mcu = None
+
+    @property
+    def circuit(self):
+        return self._schematic.circuit
+
+    @property
+    def mcu(self):
+        return self._mcu
+
+    @property
+    def led_chains(self):
+        '''Key indexes of each LED chain's LEDs, in chain order.'''
+        return self._led_chains
+
+    def generate_netlist(self, f, backend=SKIDL_BACKEND):
+        '''
+        Writes the board's KiCad netlist to f, either through skidl or
+        directly from the schematic's netlist model.
+        '''
+        if backend == DIRECT_BACKEND:
+            self._schematic.netlist.write(f)
+        elif backend == SKIDL_BACKEND:
+            self.circuit.generate_netlist(file_=f)
+        else:
+            raise ValueError("unknown netlist backend %s" % backend)
+
+    def find_collisions(self):
+        '''
+        Returns a Collision for each pair of parts placed on top of each
+        other, checked from footprint geometry without loading pcbnew.
+        '''
+        return self._schematic.pcb.find_collisions()
+
+    def _outline(self):
+        pcb = self._schematic.pcb
+        left, top = pcb.convert_keyboard_grid_to_kicad_units(
+            self._kle.board_left - 0.5, self._kle.board_top - 0.5, 0, 0)
+        right, bottom = pcb.convert_keyboard_grid_to_kicad_units(
+            self._kle.board_right - 0.5, self._kle.board_bottom - 0.5, 0, 0)
+        return (left / KC_TO_MM, top / KC_TO_MM, right / KC_TO_MM,
+                bottom / KC_TO_MM)
+
+    def place_parts(self):
+        '''
+        Moves the MCU, reset switch, USB-C connector and CC resistors from
+        their fixed spots to free places that keep their wires short. The
+        USB-C connector goes on the top edge, facing out, and hangs over it
+        as far as it has to where the top row of keys leaves no room. Parts
+        with positions from a positions file stay put.
+
+        Returns {ref: (x_mm, y_mm, angle)}, with None for a part there was no
+        room for.
+        '''
+        pcb = self._schematic.pcb
+        placer = Placer(pcb, self._schematic.netlist, self._outline())
+        placed = {}
+        for part, nets, on_top_edge in self._movable:
+            if pcb.get_part_position(part.ref) is not None:
+                continue
+            if nets is None:
+                nets = [
+                    n for n in placer.net_names
+                    if n.startswith(("ROW_", "COL_", "LINE_", "LED_DATA"))
+                ]
+            if on_top_edge:
+                placed[part.ref] = placer.place(part,
+                                                nets,
+                                                angles=(USB_C_EDGE_ANGLE, ),
+                                                edge_y_mm=placer.outline[1] +
+                                                USB_C_FACE_MM)
+            else:
+                placed[part.ref] = placer.place(part, nets)
+        return placed
+
     def build(self,
               add_pro_micro=True,
               add_blue_pill=False,
-              add_per_key_rgb=True):
+              add_per_key_rgb=True,
+              matrix_strategy=PARSE_ORDER,
+              led_chain_order=ledchain.PARSE_ORDER,
+              led_frame_time_us=None,
+              pin_allocation=ports.IN_ORDER,
+              matrix_topologies=(STANDARD, )):
         mcu = None
         if add_pro_micro:
             mcu = self._schematic.create_pro_micro()
         if add_blue_pill:
             mcu = self._schematic.create_blue_pill()
+        self._mcu = mcu
 
         self._schematic.create_matrix_nets(self._kle.key_count,
                                            self._kle.row_count,
                                            self._kle.max_col_count,
-                                           mcu.gpio_count)
+                                           mcu.gpio_count, matrix_topologies)
+        self._schematic.assign_matrix(self._kle.keys, matrix_strategy)
         board_width = self._kle.board_right - self._kle.board_left
         board_height = self._kle.board_bottom - self._kle.board_top
-        led_identifier = 0
         for key in self._kle.keys:
             self._schematic.add_key(key)
-            if add_per_key_rgb:
-                self._schematic.add_per_key_rgb(key)
-            (led_x, led_y) = key.position
-            # https://docs.qmk.fm/#/feature_rgb_matrix
-            key.led_x = (led_x / board_width) * 224
-            key.led_y = (led_y / board_height) * 64
-            key.led_identifier = led_identifier
-            led_identifier += 1
+        self._kle.key_table.assign_led_coordinates(self._kle.board_left,
+                                                   self._kle.board_top,
+                                                   board_width, board_height)
+        self._led_chains = []
+        if add_per_key_rgb:
+            # LEDs are created in chain order, so their refs, their QMK
+            # indexes and the data lines all follow the chains.
+            keys = self._kle.keys
+            chain = ledchain.order([key.position for key in keys],
+                                   led_chain_order)
+            count = 1
+            if led_frame_time_us is not None and mcu is not None:
+                # One GPIO is set aside for the first chain.
+                free_pins = (mcu.gpio_count - 1 -
+                             self._schematic.matrix_pin_count)
+                count = ledchain.chain_count(len(chain), led_frame_time_us,
+                                             1 + max(0, free_pins))
+            self._led_chains = ledchain.split(chain, count)
+            for run in self._led_chains:
+                self._schematic.start_led_chain()
+                for i in run:
+                    self._schematic.add_per_key_rgb(keys[i])
+            self._kle.key_table.assign_led_identifiers(chain)
 
+        self._movable = []
+        if mcu:
+            self._movable.append((mcu.part, None, False))
         if add_pro_micro:
             reset = self._schematic.create_reset_switch()
             self._schematic.connect_reset_switch(reset, mcu)
+            self._movable.append((reset, ["RST"], False))
         if add_blue_pill:
             pass
         if mcu:
-            self._schematic.connect_mcu(mcu)
+            self._schematic.connect_mcu(mcu, pin_allocation)
 
             if add_blue_pill:
                 # TODO(miket): manual wiring option for Pro Micro
@@ -45,3 +166,5 @@ class BoardBuilder:
                 r1 = self._schematic.create_resistor("5K1")
                 r2 = self._schematic.create_resistor("5K1")
                 self._schematic.connect_usb_c_connector(conn, mcu, r1, r2)
+                self._movable += [(conn, ["USB_DP", "USB_DM"], True),
+                                  (r1, ["CC1"], False), (r2, ["CC2"], False)]
@@ -0,0 +1,224 @@
+'''
+collisions finds parts placed on top of each other before KiCad ever sees
+the board.
+
+Each side of the board is checked separately. A part takes up its body's
+outline on the side its body is on, and only its through-hole pads on the
+other side, so a diode under a switch is fine but a diode over a socket isn't.
+Shapes are kept in a uniform grid, so checking a part looks at a handful of
+nearby cells whatever the size of the board.
+'''
+
+import collections
+import math
+
+from keycad.footprints import (SIDES, get_footprint_index, is_through_hole,
+                               pad_corners, to_board)
+from keycad.netlist import natural_key
+
+# Roughly the size of the biggest common shape, a switch body.
+CELL_SIZE_MM = 8
+
+# Shapes that only touch don't collide.
+_EPSILON_MM = 1e-6
+
+Collision = collections.namedtuple("Collision", ("ref_a", "ref_b", "side"))
+
+
+class SpatialHash:
+    '''
+    Boxes (left, top, right, bottom) by key in a uniform grid of cells.
+    '''
+    def __init__(self, cell_size=CELL_SIZE_MM):
+        self._cell_size = cell_size
+        self._cells = {}
+        self._boxes = {}
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def _cell_range(self, box):
+        size = self._cell_size
+        left, top, right, bottom = box
+        for i in range(math.floor(left / size), math.floor(right / size) + 1):
+            for j in range(math.floor(top / size),
+                           math.floor(bottom / size) + 1):
+                yield (i, j)
+
+    def insert(self, key, box):
+        self.remove(key)
+        self._boxes[key] = box
+        for cell in self._cell_range(box):
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        box = self._boxes.pop(key, None)
+        if box is None:
+            return
+        for cell in self._cell_range(box):
+            keys = self._cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def query(self, box):
+        '''Keys whose boxes overlap box.'''
+        left, top, right, bottom = box
+        found = set()
+        for cell in self._cell_range(box):
+            for key in self._cells.get(cell, ()):
+                if key in found:
+                    continue
+                l, t, r, b = self._boxes[key]
+                if (l < right - _EPSILON_MM and left < r - _EPSILON_MM
+                        and t < bottom - _EPSILON_MM
+                        and top < b - _EPSILON_MM):
+                    found.add(key)
+        return found
+
+
+def _convex_hull(points):
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def half(points):
+        hull = []
+        for p in points:
+            while len(hull) >= 2 and ((hull[-1][0] - hull[-2][0]) *
+                                      (p[1] - hull[-2][1]) -
+                                      (hull[-1][1] - hull[-2][1]) *
+                                      (p[0] - hull[-2][0])) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull[:-1]
+
+    return half(points) + half(reversed(points))
+
+
+def _projection(polygon, nx, ny):
+    dots = [x * nx + y * ny for x, y in polygon]
+    return min(dots), max(dots)
+
+
+def polygons_overlap(a, b):
+    '''Whether convex polygons a and b overlap by more than a touch.'''
+    for polygon in (a, b):
+        for i in range(len(polygon)):
+            x1, y1 = polygon[i - 1]
+            x2, y2 = polygon[i]
+            nx, ny = y1 - y2, x2 - x1
+            length = math.hypot(nx, ny)
+            if length == 0:
+                continue
+            nx, ny = nx / length, ny / length
+            a_min, a_max = _projection(a, nx, ny)
+            b_min, b_max = _projection(b, nx, ny)
+            if a_max <= b_min + _EPSILON_MM or b_max <= a_min + _EPSILON_MM:
+                return False
+    return True
+
+
+def _box(polygon):
+    xs = [p[0] for p in polygon]
+    ys = [p[1] for p in polygon]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def placed_shapes(footprint, x_mm, y_mm, angle=0, side="top"):
+    '''
+    Returns {board side: [convex polygon, ...]} for footprint placed at
+    (x_mm, y_mm), turned angle degrees counterclockwise, on side.
+    '''
+    bottom = side == "bottom"
+
+    def place(polygon):
+        return _convex_hull(to_board(polygon, x_mm, y_mm, angle, side))
+
+    holes = [
+        pad_corners(pad) for pad in footprint.pads if is_through_hole(pad)
+    ]
+    shapes = {}
+    for footprint_side in SIDES:
+        board_side = footprint_side
+        if bottom:
+            board_side = "B" if footprint_side == "F" else "F"
+        outline = footprint.outlines.get(footprint_side)
+        polygons = ([outline] if outline else []) + holes
+        shapes[board_side] = [place(polygon) for polygon in polygons]
+    return shapes
+
+
+class CollisionChecker:
+    '''
+    Placed parts by reference, with their shapes in one SpatialHash per side
+    of the board.
+    '''
+    def __init__(self, index=None, cell_size=CELL_SIZE_MM):
+        self._index = index or get_footprint_index()
+        self._grids = {side: SpatialHash(cell_size) for side in SIDES}
+        self._shapes = {}
+        self._unchecked = set()
+
+    @property
+    def unchecked(self):
+        '''Refs of parts whose footprints couldn't be read.'''
+        return self._unchecked
+
+    def place(self, ref, footprint, x_mm, y_mm, angle=0, side="top"):
+        self.remove(ref)
+        try:
+            geometry = self._index.get(footprint)
+        except (FileNotFoundError, ValueError):
+            self._unchecked.add(ref)
+            return
+        shapes = placed_shapes(geometry, x_mm, y_mm, angle, side)
+        self._shapes[ref] = shapes
+        for board_side, polygons in shapes.items():
+            for i, polygon in enumerate(polygons):
+                self._grids[board_side].insert((ref, i), _box(polygon))
+
+    def remove(self, ref):
+        self._unchecked.discard(ref)
+        shapes = self._shapes.pop(ref, None)
+        if shapes is None:
+            return
+        for board_side, polygons in shapes.items():
+            for i in range(len(polygons)):
+                self._grids[board_side].remove((ref, i))
+
+    def boxes(self, side, exclude=None):
+        '''
+        Bounding boxes of the shapes on side of every placed part but
+        exclude.
+        '''
+        return [
+            _box(polygon) for ref, shapes in self._shapes.items()
+            if ref != exclude for polygon in shapes[side]
+        ]
+
+    def collisions_with(self, ref):
+        '''Collisions between ref and any other placed part.'''
+        found = set()
+        for board_side, polygons in self._shapes.get(ref, {}).items():
+            grid = self._grids[board_side]
+            for polygon in polygons:
+                for other, j in grid.query(_box(polygon)):
+                    if other == ref or (other, board_side) in found:
+                        continue
+                    if polygons_overlap(polygon,
+                                        self._shapes[other][board_side][j]):
+                        found.add((other, board_side))
+        return sorted(
+            (Collision(*sorted((ref, other), key=natural_key), board_side)
+             for other, board_side in found),
+            key=lambda c: (natural_key(c.ref_a), natural_key(c.ref_b), c.side))
+
+    def find_collisions(self):
+        '''Every pair of placed parts that overlap, on each side they do.'''
+        found = set()
+        for ref in self._shapes:
+            found.update(self.collisions_with(ref))
+        return sorted(found,
+                      key=lambda c:
+                      (natural_key(c.ref_a), natural_key(c.ref_b), c.side))
@@ -0,0 +1,74 @@
+'''
+diskcache holds what keycad's on-disk caches share: where they live, writing
+an entry so that readers never see part of one, and least-recently-used
+eviction by mtime.
+'''
+
+import os
+import tempfile
+
+
+def default_cache_dir(name):
+    '''Returns the directory of the cache called name under ~/.cache/keycad.'''
+    base = os.environ.get("XDG_CACHE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "keycad", name)
+
+
+def remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def touch(path):
+    '''Marks the entry at path as just used.'''
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def write_atomically(path, data):
+    '''
+    Writes the bytes data to path by way of a temporary file in the same
+    directory. Raises OSError on failure, having removed the temporary file.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        remove(tmp_path)
+        raise
+
+
+def evict(cache_dir, suffix, max_bytes):
+    '''
+    Removes the least recently used entries ending in suffix until those left
+    in cache_dir total no more than max_bytes.
+    '''
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            # Unfinished writes end in .tmp, so they're never evicted.
+            if not entry.name.endswith(suffix):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                # Another process sharing the cache evicted it first.
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        remove(path)
+        total -= size
@@ -0,0 +1,285 @@
+'''
+footprints reads KiCad footprints from .pretty directories such as
+keycad.pretty, without pcbnew.
+
+FootprintLibrary parses each .kicad_mod once and reparses it when its mtime
+changes. FootprintIndex boils a parsed footprint down to its geometry: pads,
+courtyard, bounding box and 3D model. All positions are in millimetres
+relative to the footprint's origin, with y pointing down as in KiCad.
+'''
+
+import collections
+import math
+import os
+import threading
+
+from keycad import sexpr
+
+Pad = collections.namedtuple("Pad",
+                             ("number", "kind", "shape", "x", "y", "width",
+                              "height", "angle", "drill", "layers"))
+Footprint = collections.namedtuple(
+    "Footprint",
+    ("name", "layer", "pads", "courtyard", "bbox", "model", "outlines"))
+
+SIDES = ("F", "B")
+_COURTYARD_LAYERS = ("F.CrtYd", "B.CrtYd")
+_BODY_LAYERS = ("SilkS", "Fab")
+
+
+class FootprintLibrary:
+    '''
+    Parsed footprints by "lib:name", reloaded when a file's mtime changes.
+    '''
+    def __init__(self, search_paths=None):
+        if search_paths is None:
+            package_dir = os.path.dirname(os.path.abspath(__file__))
+            search_paths = [".", os.path.dirname(package_dir)]
+        self._search_paths = search_paths
+        self._footprints = {}
+        self._lock = threading.Lock()
+
+    def find(self, footprint):
+        lib, name = footprint.split(":", 1)
+        for directory in self._search_paths:
+            path = os.path.join(directory, lib + ".pretty",
+                                name + ".kicad_mod")
+            if os.path.isfile(path):
+                return path
+        raise FileNotFoundError("can't find footprint %s" % footprint)
+
+    def get(self, footprint):
+        path = self.find(footprint)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._footprints.get(footprint)
+            if entry is not None and entry[0] == (path, mtime):
+                return entry[1]
+        with open(path, "r") as f:
+            module = sexpr.parse(f.read())
+        with self._lock:
+            self._footprints[footprint] = ((path, mtime), module)
+        return module
+
+
+def _xy(item, keyword):
+    at = sexpr.find(item, keyword)
+    return float(at[1]), float(at[2])
+
+
+def _read_pad(item):
+    at = sexpr.find(item, "at")
+    size = sexpr.find(item, "size")
+    drill = sexpr.find(item, "drill")
+    drill_size = None
+    if drill is not None:
+        sizes = [
+            float(d) for d in drill[1:]
+            if not isinstance(d, list) and d != "oval"
+        ]
+        if sizes:
+            drill_size = sizes[0]
+    layers = sexpr.find(item, "layers")
+    return Pad(str(item[1]), item[2], item[3], float(at[1]), float(at[2]),
+               float(size[1]), float(size[2]),
+               float(at[3]) if len(at) >= 4 else 0.0, drill_size,
+               tuple(layers[1:]) if layers is not None else ())
+
+
+def pad_corners(pad):
+    # KiCad angles are counterclockwise on screen, where y points down.
+    theta = math.radians(pad.angle)
+    cos, sin = math.cos(theta), math.sin(theta)
+    corners = []
+    for dx, dy in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+        x = dx * pad.width / 2
+        y = dy * pad.height / 2
+        corners.append((pad.x + x * cos + y * sin, pad.y - x * sin + y * cos))
+    return corners
+
+
+def to_board(points, x_mm, y_mm, angle=0, side="top"):
+    '''
+    Moves points from a footprint's frame to the board, for the footprint
+    placed at (x_mm, y_mm), turned angle degrees counterclockwise, on side.
+    '''
+    theta = math.radians(angle)
+    cos, sin = math.cos(theta), math.sin(theta)
+    flip = -1 if side == "bottom" else 1
+    return [(x_mm + x * cos + flip * y * sin, y_mm - x * sin + flip * y * cos)
+            for x, y in points]
+
+
+def _item_points(item):
+    keyword = item[0]
+    if keyword == "fp_line":
+        return [_xy(item, "start"), _xy(item, "end")]
+    if keyword in ("fp_circle", "fp_arc"):
+        # The whole circle, which is never smaller than an arc of it.
+        cx, cy = _xy(item, "center" if keyword == "fp_circle" else "start")
+        ex, ey = _xy(item, "end")
+        r = math.hypot(ex - cx, ey - cy)
+        return [(cx - r, cy - r), (cx + r, cy + r)]
+    if keyword == "fp_poly":
+        return [(float(xy[1]), float(xy[2]))
+                for xy in sexpr.find(item, "pts")[1:]]
+    return []
+
+
+def _chain(segments):
+    '''Joins segments end to end into a closed polygon, or returns None.'''
+    if not segments:
+        return None
+    remaining = list(segments[1:])
+    polygon = [segments[0][0], segments[0][1]]
+    while remaining:
+        end = polygon[-1]
+        for i, (a, b) in enumerate(remaining):
+            if math.isclose(a[0], end[0]) and math.isclose(a[1], end[1]):
+                polygon.append(b)
+                break
+            if math.isclose(b[0], end[0]) and math.isclose(b[1], end[1]):
+                polygon.append(a)
+                break
+        else:
+            return None
+        del remaining[i]
+    if polygon[0] != polygon[-1] and not (
+            math.isclose(polygon[0][0], polygon[-1][0])
+            and math.isclose(polygon[0][1], polygon[-1][1])):
+        return None
+    return tuple(polygon[:-1])
+
+
+def is_through_hole(pad):
+    return "*.Cu" in pad.layers or ("F.Cu" in pad.layers
+                                    and "B.Cu" in pad.layers)
+
+
+def _bbox(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _rectangle(bbox):
+    l, t, r, b = bbox
+    return ((l, t), (r, t), (r, b), (l, b))
+
+
+def _outline(segments, points):
+    polygon = _chain(segments)
+    if polygon is None:
+        polygon = _rectangle(_bbox(points))
+    return polygon
+
+
+def read_footprint(module):
+    '''
+    Returns the Footprint of a parsed .kicad_mod. Where the footprint has no
+    courtyard, or one that isn't a simple closed outline, the courtyard is the
+    rectangle around its pads and drawings.
+
+    outlines maps "F" and "B" to the footprint's body on that side of the
+    board: its courtyard there, or else the rectangle around its silkscreen,
+    fab drawings and surface-mount pads there. A side with none of those has
+    no outline; only the footprint's through-hole pads reach it.
+    '''
+    pads = []
+    courtyard_segments = []
+    courtyard_points = []
+    outline_points = []
+    side_segments = {side: [] for side in SIDES}
+    side_courtyards = {side: [] for side in SIDES}
+    side_bodies = {side: [] for side in SIDES}
+    model = None
+    for item in module[2:]:
+        if not isinstance(item, list) or not item:
+            continue
+        keyword = item[0]
+        if keyword == "pad":
+            pad = _read_pad(item)
+            pads.append(pad)
+            corners = pad_corners(pad)
+            outline_points += corners
+            if not is_through_hole(pad):
+                for side in SIDES:
+                    if side + ".Cu" in pad.layers:
+                        side_bodies[side] += corners
+        elif keyword == "model" and model is None:
+            model = str(item[1])
+        elif keyword in ("fp_line", "fp_circle", "fp_arc", "fp_poly"):
+            layer = sexpr.find(item, "layer")
+            layer = layer[1] if layer is not None else ""
+            side, _, kind = layer.partition(".")
+            points = _item_points(item)
+            segments = []
+            if keyword == "fp_line":
+                segments = [points]
+            elif keyword == "fp_poly":
+                segments = list(zip(points, points[1:] + points[:1]))
+            if layer in _COURTYARD_LAYERS:
+                courtyard_points += points
+                courtyard_segments += segments
+                side_courtyards[side] += points
+                side_segments[side] += segments
+            else:
+                outline_points += points
+                if side in SIDES and kind in _BODY_LAYERS:
+                    side_bodies[side] += points
+
+    if courtyard_points:
+        courtyard = _outline(courtyard_segments, courtyard_points)
+        bbox = _bbox(courtyard_points)
+    elif outline_points:
+        bbox = _bbox(outline_points)
+        courtyard = _rectangle(bbox)
+    else:
+        bbox = (0.0, 0.0, 0.0, 0.0)
+        courtyard = _rectangle(bbox)
+
+    outlines = {}
+    for side in SIDES:
+        if side_courtyards[side]:
+            outlines[side] = _outline(side_segments[side],
+                                      side_courtyards[side])
+        elif side_bodies[side]:
+            outlines[side] = _rectangle(_bbox(side_bodies[side]))
+
+    layer = sexpr.find(module, "layer")
+    return Footprint(str(module[1]), layer[1] if layer else "F.Cu",
+                     tuple(pads), courtyard, bbox, model, outlines)
+
+
+class FootprintIndex:
+    '''
+    Footprint geometry by "lib:name". An entry is rebuilt whenever library
+    reparses its file.
+    '''
+    def __init__(self, library=None):
+        self._library = library or get_footprint_library()
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def get(self, footprint):
+        module = self._library.get(footprint)
+        with self._lock:
+            entry = self._index.get(footprint)
+            if entry is not None and entry[0] is module:
+                return entry[1]
+        result = read_footprint(module)
+        with self._lock:
+            self._index[footprint] = (module, result)
+        return result
+
+
+_footprint_library = FootprintLibrary()
+_footprint_index = FootprintIndex(_footprint_library)
+
+
+def get_footprint_library():
+    return _footprint_library
+
+
+def get_footprint_index():
+    return _footprint_index
@@ -0,0 +1,216 @@
+'''
+ghosting checks from the netlist that the key matrix reads exactly the keys
+that are held down.
+
+Each key is a switch and a diode in series, so a held key lets current flow
+one way, from the net on its switch to the net on its diode's cathode. The
+firmware pulls a driven line low and sees a read line go low if current can
+get from the read line to the driven line through held keys. A key ghosts
+when a chain of other held keys does that for its lines, and it's masked
+when no scan ever reads its lines at all.
+
+Holding more keys never stops a ghost, so the smallest chords that ghost a
+key are chains of keys from its switch's net to its cathode's net. Rather
+than trying every chord, which for six of a hundred keys is over a billion,
+verify() searches for the shortest such chain, with each net's keys held as a
+bitset of the nets they lead to. That proves every chord up to max_keys
+keys, on any board, in milliseconds. chord_ghosts() checks one chord the same
+way.
+'''
+
+import collections
+
+from keycad.matrix import DUPLEX, ROUND_ROBIN
+from keycad.netlist import natural_key
+
+DEFAULT_MAX_KEYS = 6
+
+MatrixKey = collections.namedtuple("MatrixKey", ("ref", "anode", "cathode"))
+
+
+def matrix_keys(netlist):
+    '''
+    The keys in netlist, each with the nets on its switch and on its diode's
+    cathode.
+    '''
+    names, offsets, part_indexes, pin_nums = netlist.net_table()
+    pins = {}
+    members = {}
+    for i, name in enumerate(names):
+        for j in range(offsets[i], offsets[i + 1]):
+            ref = netlist.parts[part_indexes[j]].ref
+            pins[ref, pin_nums[j]] = name
+            members.setdefault(name, []).append((ref, pin_nums[j]))
+
+    keys = []
+    for part in netlist.parts:
+        if not part.ref.startswith("K"):
+            continue
+        anode = pins.get((part.ref, "1"))
+        between = pins.get((part.ref, "2"))
+        diodes = [
+            ref for ref, num in members.get(between, ())
+            if ref.startswith("D") and num == "2"
+        ]
+        if anode is None or len(diodes) != 1:
+            continue
+        keys.append(MatrixKey(part.ref, anode, pins.get((diodes[0], "1"))))
+    return sorted(keys, key=lambda k: natural_key(k.ref))
+
+
+def scan_pairs(net_names, topology):
+    '''
+    The (driven, read) pairs of nets that the firmware samples for a matrix
+    of topology on net_names.
+    '''
+    rows = [n for n in net_names if n.startswith("ROW_")]
+    cols = [n for n in net_names if n.startswith("COL_")]
+    lines = [n for n in net_names if n.startswith("LINE_")]
+    passes = [(rows, cols)]
+    if topology == DUPLEX:
+        passes.append((cols, rows))
+    elif topology == ROUND_ROBIN:
+        passes = [(lines, lines)]
+    return {(d, r)
+            for driven, read in passes
+            for d in driven
+            for r in read if d != r}
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class _Graph:
+    '''
+    keys as edges between net indexes, with a bitset of the nets that each
+    net's keys lead to.
+    '''
+    def __init__(self, keys):
+        nets = sorted({n for k in keys for n in (k.anode, k.cathode)})
+        self.index = {n: i for i, n in enumerate(nets)}
+        self.edges = [(self.index[k.anode], self.index[k.cathode])
+                      for k in keys]
+        self.out = [0] * len(nets)
+        self.key_of = {}
+        for k, (a, b) in enumerate(self.edges):
+            self.out[a] |= 1 << b
+            self.key_of.setdefault((a, b), k)
+
+
+def chord_ghosts(keys, chord):
+    '''Indexes of keys, other than those in chord, that chord makes read.'''
+    graph = _Graph(keys)
+    reach = [0] * len(graph.out)
+    for k in chord:
+        a, b = graph.edges[k]
+        reach[a] |= 1 << b
+    # Close reach over chains of held keys, a word of nets at a time.
+    changed = True
+    while changed:
+        changed = False
+        for x in range(len(reach)):
+            grown = reach[x]
+            for y in _bits(reach[x]):
+                grown |= reach[y]
+            if grown != reach[x]:
+                reach[x] = grown
+                changed = True
+    held = set(chord)
+    return {
+        k
+        for k, (a, b) in enumerate(graph.edges)
+        if k not in held and reach[a] >> b & 1
+    }
+
+
+def _shortest_chain(graph, k, max_keys):
+    '''
+    The fewest keys, at most max_keys and at least two, that chain from key
+    k's anode net to its cathode net, or None.
+    '''
+    a, b = graph.edges[k]
+    parent = {}
+    visited = 1 << a
+    frontier = graph.out[a] & ~(1 << b) & ~visited
+    for y in _bits(frontier):
+        parent[y] = a
+    visited |= frontier
+    for _ in range(max_keys - 1):
+        if not frontier:
+            break
+        found = None
+        reached = 0
+        for x in _bits(frontier):
+            if graph.out[x] >> b & 1:
+                found = x
+                break
+            new = graph.out[x] & ~visited & ~reached & ~(1 << b)
+            for y in _bits(new):
+                parent[y] = x
+            reached |= new
+        if found is not None:
+            nets = [b, found]
+            while nets[-1] != a:
+                nets.append(parent[nets[-1]])
+            nets.reverse()
+            return [graph.key_of[pair] for pair in zip(nets, nets[1:])]
+        visited |= reached
+        frontier = reached
+    return None
+
+
+def verify(netlist, topology, max_keys=DEFAULT_MAX_KEYS):
+    '''verify_keys() for the keys in netlist.'''
+    return verify_keys(matrix_keys(netlist), topology, max_keys)
+
+
+def verify_keys(keys, topology, max_keys=DEFAULT_MAX_KEYS):
+    '''
+    Checks every chord of up to max_keys of keys, as a dict that can be
+    dumped as JSON. ghosts has the smallest chord that ghosts each key that
+    can ghost, and masked has each key that can never be read and why.
+    rollover is how many keys can always be held, or None if that's any
+    number at all.
+    '''
+    graph = _Graph(keys)
+    net_names = {n for k in keys for n in (k.anode, k.cathode)}
+    pairs = scan_pairs(net_names, topology)
+
+    masked = []
+    first_on_pair = {}
+    for k in keys:
+        other = first_on_pair.setdefault((k.anode, k.cathode), k.ref)
+        if (k.cathode, k.anode) not in pairs:
+            masked.append({"key": k.ref, "reason": "its lines aren't scanned"})
+        elif other != k.ref:
+            masked.append({
+                "key": k.ref,
+                "reason": "it's on the same lines as %s" % other
+            })
+
+    ghosts = []
+    shortest = None
+    for k, key in enumerate(keys):
+        if (key.cathode, key.anode) not in pairs:
+            continue
+        # Without a limit a chain can be at most every key long.
+        chain = _shortest_chain(graph, k, len(keys))
+        if chain is None:
+            continue
+        if shortest is None or len(chain) < shortest:
+            shortest = len(chain)
+        if len(chain) <= max_keys:
+            chord = sorted((keys[c].ref for c in chain), key=natural_key)
+            ghosts.append({"key": key.ref, "chord": chord})
+
+    return {
+        "keys": len(keys),
+        "max_keys": max_keys,
+        "rollover": None if shortest is None else shortest - 1,
+        "ghosts": ghosts,
+        "masked": masked,
+    }
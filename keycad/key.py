@@ -1,3 +1,7 @@
+import array
+
+import numpy as np
+
 # https://docs.qmk.fm/#/keycodes
 SYMBOL_TO_ALNUM = {
     "!": 'EXCL',
@@ -52,83 +56,269 @@ SYMBOL_TO_ALNUM = {
 }
 
 
+def _column(column, start=0):
+    '''A numpy view of column's rows from start on, without copying.'''
+    return np.frombuffer(column, dtype=np.float64)[start:]
+
+
+def _int_array(values):
+    '''values truncated towards zero, as an array('i') column.'''
+    column = array.array('i')
+    column.frombytes(values.astype(np.intc).tobytes())
+    return column
+
+
+class KeyTable:
+    '''
+    Struct-of-arrays storage for every key on a board.
+
+    The parser appends rows straight into the columns; Key objects are views
+    onto a single row. Derived values (key centres, QMK LED coordinates, mm
+    positions of the silkscreen labels) are computed for all keys at once
+    rather than per access.
+
+    Keys may be rotated clockwise by rotation_angle degrees about
+    (rotation_x, rotation_y), as in keyboard-layout-editor.com. Key centres
+    and the board bounds account for the rotation.
+    '''
+    def __init__(self):
+        self._labels = []
+        self._x = array.array('d')
+        self._y = array.array('d')
+        self._width = array.array('d')
+        self._height = array.array('d')
+        self._is_homing = array.array('b')
+        self._rotation_angle = array.array('d')
+        self._rotation_x = array.array('d')
+        self._rotation_y = array.array('d')
+        self._matrix_row = array.array('i')
+        self._matrix_col = array.array('i')
+        self._led_x = array.array('i')
+        self._led_y = array.array('i')
+        self._led_identifier = array.array('i')
+
+        # Derived columns, filled in by _update_geometry().
+        self._position_x = array.array('d')
+        self._position_y = array.array('d')
+        self._bounds = (99999, 99999, 0, 0)
+
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __getitem__(self, index):
+        return self._keys[index]
+
+    @property
+    def keys(self):
+        return self._keys
+
+    def append(self,
+               x,
+               y,
+               text='none',
+               width=1,
+               height=1,
+               is_homing=False,
+               rotation_angle=0,
+               rotation_x=0,
+               rotation_y=0):
+        self._labels.append(text.split("\n"))
+        self._x.append(x)
+        self._y.append(y)
+        self._width.append(width)
+        self._height.append(height)
+        self._is_homing.append(is_homing)
+        self._rotation_angle.append(rotation_angle)
+        self._rotation_x.append(rotation_x)
+        self._rotation_y.append(rotation_y)
+        self._matrix_row.append(-1)
+        self._matrix_col.append(-1)
+        self._led_x.append(-1)
+        self._led_y.append(-1)
+        self._led_identifier.append(-1)
+        k = Key(self, len(self._keys))
+        self._keys.append(k)
+        return k
+
+    # The columns the parser fills in. Everything else is either derived or
+    # assigned later by the schematic and board builder.
+    def parsed_columns(self):
+        return (self._labels, self._x, self._y, self._width, self._height,
+                self._is_homing, self._rotation_angle, self._rotation_x,
+                self._rotation_y)
+
+    @classmethod
+    def from_parsed_columns(cls, labels, x, y, width, height, is_homing,
+                            rotation_angle, rotation_x, rotation_y):
+        table = cls()
+        count = len(labels)
+        table._labels = list(labels)
+        table._x = array.array('d', x)
+        table._y = array.array('d', y)
+        table._width = array.array('d', width)
+        table._height = array.array('d', height)
+        table._is_homing = array.array('b', is_homing)
+        table._rotation_angle = array.array('d', rotation_angle)
+        table._rotation_x = array.array('d', rotation_x)
+        table._rotation_y = array.array('d', rotation_y)
+        table._matrix_row = array.array('i', [-1]) * count
+        table._matrix_col = array.array('i', [-1]) * count
+        table._led_x = array.array('i', [-1]) * count
+        table._led_y = array.array('i', [-1]) * count
+        table._led_identifier = array.array('i', [-1]) * count
+        table._keys = [Key(table, i) for i in range(count)]
+        return table
+
+    def _update_geometry(self):
+        # Catches up on every key appended since the last call, as numpy
+        # operations over the new rows of each column. Each key's centre goes
+        # through the affine transform for its own rotation; the rotated
+        # outline's extents feed the board bounds.
+        start = len(self._position_x)
+        if start == len(self._keys):
+            return
+        columns = (self._x, self._y, self._width, self._height,
+                   self._rotation_angle, self._rotation_x, self._rotation_y)
+        x, y, w, h, angle, rx, ry = (_column(c, start) for c in columns)
+        theta = np.radians(angle)
+        cos, sin = np.cos(theta), np.sin(theta)
+        dx = x + w / 2 - rx
+        dy = y + h / 2 - ry
+        cx = rx + dx * cos - dy * sin
+        cy = ry + dx * sin + dy * cos
+        # Positions are shifted half a key so that a 1u key at the origin is
+        # centred on (0, 0).
+        self._position_x.frombytes((cx - 0.5).tobytes())
+        self._position_y.frombytes((cy - 0.5).tobytes())
+        extent_x = (np.abs(w * cos) + np.abs(h * sin)) / 2
+        extent_y = (np.abs(w * sin) + np.abs(h * cos)) / 2
+        left, top, right, bottom = self._bounds
+        self._bounds = (min(left, float(np.min(cx - extent_x))),
+                        min(top, float(np.min(cy - extent_y))),
+                        max(right, float(np.max(cx + extent_x))),
+                        max(bottom, float(np.max(cy + extent_y))))
+
+    @property
+    def bounds(self):
+        '''(left, top, right, bottom) of all keys, in keyboard units.'''
+        self._update_geometry()
+        return self._bounds
+
+    def position(self, index):
+        self._update_geometry()
+        return (self._position_x[index], self._position_y[index])
+
+    def assign_led_coordinates(self, board_left, board_top, board_width,
+                               board_height):
+        # https://docs.qmk.fm/#/feature_rgb_matrix
+        self._update_geometry()
+        x_scale = 224 / board_width
+        y_scale = 64 / board_height
+        self._led_x = _int_array(
+            (_column(self._position_x) - board_left) * x_scale)
+        self._led_y = _int_array(
+            (_column(self._position_y) - board_top) * y_scale)
+        self._led_identifier = array.array('i', range(len(self._keys)))
+
+    def assign_led_identifiers(self, chain):
+        '''chain lists key indexes in the order their LEDs are chained.'''
+        for identifier, index in enumerate(chain):
+            self._led_identifier[index] = identifier
+
+    def get_rowcol_label_dicts(self, width_mm, height_mm):
+        self._update_geometry()
+        return [{
+            "text": "R%dC%d" % (row, col),
+            "x_mm": (x + 0.1) * width_mm,
+            "y_mm": (y + 0.3) * height_mm
+        } for row, col, x, y in zip(self._matrix_row, self._matrix_col,
+                                    self._position_x, self._position_y)]
+
+
 class Key:
-    def __init__(self, x, y, text='none', width=1, height=1, is_homing=False):
-        self.__labels = text.split("\n")
-        self.__x = x
-        self.__y = y
-        self.__width = width
-        self.__height = height
-        self.__is_homing = is_homing
-        self.__matrix_row = -1
-        self.__matrix_col = -1
-        self.__led_x = -1
-        self.__led_y = -1
-        self.__led_identifier = -1
+    '''A view onto one row of a KeyTable.'''
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def index(self):
+        return self._index
 
     @property
     def labels(self):
-        return self.__labels
+        return self._table._labels[self._index]
 
     @property
     def x(self):
-        return self.__x
+        return self._table._x[self._index]
 
     @property
     def y(self):
-        return self.__y
+        return self._table._y[self._index]
 
     @property
     def led_x(self):
-        return self.__led_x
+        return self._table._led_x[self._index]
 
     @property
     def led_y(self):
-        return self.__led_y
+        return self._table._led_y[self._index]
 
     @led_x.setter
     def led_x(self, x):
-        self.__led_x = int(x)
+        self._table._led_x[self._index] = int(x)
 
     @led_y.setter
     def led_y(self, y):
-        self.__led_y = int(y)
+        self._table._led_y[self._index] = int(y)
 
     @property
     def led_identifier(self):
-        return self.__led_identifier
+        return self._table._led_identifier[self._index]
 
     @led_identifier.setter
     def led_identifier(self, id):
-        self.__led_identifier = id
+        self._table._led_identifier[self._index] = id
 
     @property
     def width(self):
-        return self.__width
+        return self._table._width[self._index]
 
     @property
     def height(self):
-        return self.__height
+        return self._table._height[self._index]
 
     @property
     def is_homing(self):
-        return self.__is_homing
+        return bool(self._table._is_homing[self._index])
+
+    @property
+    def rotation(self):
+        '''Clockwise rotation in degrees, as in keyboard-layout-editor.com.'''
+        return self._table._rotation_angle[self._index]
 
     def __str__(self):
-        return "%s [%.2f %.2f]" % (self.__labels[0], self.x, self.y)
+        return "%s [%.2f %.2f]" % (self.labels[0], self.x, self.y)
 
     @property
     def position(self):
-        return ((self.x + (self.width - 1) / 2,
-                 self.y + (self.height - 1) / 2))
+        return self._table.position(self._index)
 
     @property
     def matrix_row(self):
-        return self.__matrix_row
+        return self._table._matrix_row[self._index]
 
     @property
     def matrix_col(self):
-        return self.__matrix_col
+        return self._table._matrix_col[self._index]
 
     @property
     def rowcol_label(self):
@@ -150,11 +340,11 @@ class Key:
 
     @matrix_row.setter
     def matrix_row(self, row):
-        self.__matrix_row = row
+        self._table._matrix_row[self._index] = row
 
     @matrix_col.setter
     def matrix_col(self, col):
-        self.__matrix_col = col
+        self._table._matrix_col[self._index] = col
 
     @property
     def qmk_keycode(self):
@@ -163,10 +353,11 @@ class Key:
 
     @property
     def printable_label(self):
-        if len(self.__labels) > 1:
-            label = self.__labels[1]
+        labels = self.labels
+        if len(labels) > 1:
+            label = labels[1]
         else:
-            label = self.__labels[0]
+            label = labels[0]
         if label in SYMBOL_TO_ALNUM:
             return SYMBOL_TO_ALNUM[label]
         return label
@@ -0,0 +1,422 @@
+'''
+keycad turns a keyboard-layout-editor.com layout into a KiCad PCB, sandwich
+plates, and a user guide with QMK configuration.
+'''
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+
+from keycad.builder import NETLIST_BACKENDS, SKIDL_BACKEND, BoardBuilder
+from keycad.kicad import (BoardSession, add_outline_to_board,
+                          generate_kicad_pcb_async)
+from keycad.kle import Parser
+from keycad.manual import Manual
+from keycad.matrix import (DUPLEX, STANDARD, STRATEGIES, TOPOLOGIES,
+                           WIRELENGTH)
+from keycad.parsecache import ParseCache
+from keycad.pcb import Pcb
+from keycad.schematic import Schematic
+from keycad.partstore import PartStore
+from keycad import ghosting
+from keycad import latency
+from keycad import ledchain
+from keycad import pcbwriter
+from keycad import ports
+from keycad import trace
+
+PCB_FILENAME_SUFFIX = ".kicad_pcb"
+NETLIST_FILENAME_SUFFIX = ".net"
+USER_GUIDE_SUFFIX = "-user-guide.md"
+LATENCY_SUFFIX = "-latency.json"
+
+# A round robin matrix ghosts nearly every key, so only the first few get a
+# line each.
+MAX_GHOST_WARNINGS = 5
+
+KINJECTOR_JSON_FILENAME = "keycad-kinjector.json"
+
+
+def add_board_arguments(arg_parser):
+    '''
+    Adds the options that describe the board to arg_parser, returning their
+    actions.
+    '''
+    actions = []
+
+    def add(*args, **kwargs):
+        actions.append(arg_parser.add_argument(*args, **kwargs))
+
+    add("--add_pro_micro",
+        help="whether to add Pro Micro to board",
+        action="store_true")
+    add("--add_blue_pill",
+        help="whether to add Blue Pill to board",
+        action="store_true")
+    add("--add_per_key_rgb",
+        help="whether to add an RGB LED for each keyswitch",
+        action="store_true")
+    add("--use_pg1350",
+        help="whether to use Kailh Choc PG1350 instead of Cherry MX",
+        action="store_true")
+    add("--no_hotswap",
+        help="whether to use soldered sockets instead of Kailh hotswap sockets",
+        action="store_true")
+    add("--matrix_strategy",
+        help="assign keys to matrix rows and columns by physical position to "
+        "keep the matrix nets short, or in parse order as keycad used to",
+        choices=STRATEGIES,
+        default=WIRELENGTH)
+    add("--matrix_topologies",
+        help="ways to wire the matrix that may be used when the layout's own "
+        "rows and columns need more GPIOs than the MCU has; round_robin "
+        "ghosts whenever two keys are held, so it's only used if asked for",
+        nargs="+",
+        choices=TOPOLOGIES,
+        default=[STANDARD, DUPLEX])
+    add("--led_chain_order",
+        help="order in which to chain the per-key LEDs",
+        choices=ledchain.STRATEGIES,
+        default=ledchain.TSP)
+    add("--led_frame_time_us",
+        help="split the per-key LEDs into as many data chains as it takes, "
+        "pins permitting, to refresh them all within this many microseconds",
+        type=int)
+    add("--pin_allocation",
+        help="put the matrix columns on as few MCU ports as possible, so "
+        "that a custom matrix can read them a port at a time, or take the "
+        "MCU's pins in order as keycad used to",
+        choices=ports.STRATEGIES,
+        default=ports.BY_PORT)
+    add("--place_parts",
+        help="whether to move the MCU, reset switch and USB-C connector to "
+        "free spots near their nets instead of fixed ones",
+        action="store_true")
+    return actions
+
+
+def make_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        description=
+        "Generate keyboard manufacturing files from www.keyboard-layout-editor.com JSON.",
+        epilog="Run 'keycad batch --help' to build many keyboards at once.")
+    arg_parser.add_argument("kle_json_filename", help="KLE JSON filename")
+    arg_parser.add_argument("--descriptors_filename",
+                            help="JSON file containing keyboard description")
+    arg_parser.add_argument("--position_json_filename",
+                            help="kinjector-format overrides of positions")
+    arg_parser.add_argument("--output_prefix",
+                            help="prefix for output filenames",
+                            default="my-keyboard")
+    arg_parser.add_argument("--out_dir",
+                            help="directory to place output files",
+                            default="output")
+    add_board_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--parse_cache_dir",
+        help="directory for cached KLE parses (default ~/.cache/keycad/kle)")
+    arg_parser.add_argument("--no_parse_cache",
+                            help="whether to always re-parse the KLE file",
+                            action="store_true")
+    arg_parser.add_argument(
+        "--trace_filename",
+        help="write per-stage timings to this file as a Chrome trace and "
+        "print their totals")
+    arg_parser.add_argument(
+        "--netlist_backend",
+        help="write the netlist with skidl, or directly from keycad's model",
+        choices=NETLIST_BACKENDS,
+        default=SKIDL_BACKEND)
+    arg_parser.add_argument(
+        "--use_kinet2pcb",
+        help="create the PCB with kinet2pcb and kinjector instead of directly",
+        action="store_true")
+    arg_parser.add_argument(
+        "--output_workers",
+        help="worker processes for the boards' pcbnew stages; 0 runs every "
+        "stage in this process",
+        type=int,
+        default=3)
+    arg_parser.add_argument(
+        "--rollover_keys",
+        help="warn about chords of up to this many keys that ghost a key",
+        type=int,
+        default=ghosting.DEFAULT_MAX_KEYS)
+    arg_parser.add_argument("--no_open",
+                            help="whether to skip opening the PCB in KiCad",
+                            action="store_true")
+    return arg_parser
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == "batch":
+        from keycad import batch
+        return batch.main(argv[1:])
+
+    args = make_arg_parser().parse_args(argv)
+
+    if args.trace_filename:
+        tracer = trace.enable()
+    try:
+        with trace.span("main"):
+            build_keyboard(args)
+    finally:
+        if args.trace_filename:
+            tracer.write(args.trace_filename)
+            trace.print_summary(tracer)
+
+
+def build_keyboard(args):
+    kbd_dict = {
+        "args": str(args),
+    }
+
+    if args.descriptors_filename:
+        with open(args.descriptors_filename, "r") as f:
+            descriptors = json.loads(f.read())
+            print(descriptors)
+    else:
+        descriptors = {
+            "family_id": "keycad",
+            "identifier": "generic_keyboard",
+            "usb_vid": "0xFEED",
+            "usb_pid": "0x0001",
+            "usb_manufacturer": "Generic",
+            "usb_product": "Generic",
+            "usb_description": "A keyboard"
+        }
+    kbd_dict["descriptors"] = descriptors
+
+    if args.use_pg1350:
+        key_width = 18
+        key_height = 17
+    else:
+        key_width = 19.05
+        key_height = 19.05
+    pcb = Pcb(key_width, key_height)
+
+    kbd_dict["keyswitch_width_mm"] = key_width
+    kbd_dict["keyswitch_height_mm"] = key_height
+
+    if args.position_json_filename is not None:
+        pcb.read_positions(args.position_json_filename)
+    if args.out_dir is not None:
+        out_dir = args.out_dir
+        os.makedirs(out_dir, exist_ok=True)
+    else:
+        out_dir = os.getcwd()
+
+    pcb_filename = os.path.join(out_dir,
+                                args.output_prefix + PCB_FILENAME_SUFFIX)
+    pcb_sandwich_bottom_filename = os.path.join(
+        out_dir, args.output_prefix + "-bottom" + PCB_FILENAME_SUFFIX)
+    pcb_sandwich_plate_filename = os.path.join(
+        out_dir, args.output_prefix + "-top" + PCB_FILENAME_SUFFIX)
+    netlist_filename = os.path.join(
+        out_dir, args.output_prefix + NETLIST_FILENAME_SUFFIX)
+    user_guide_filename = os.path.join(out_dir,
+                                       args.output_prefix + USER_GUIDE_SUFFIX)
+    latency_filename = os.path.join(out_dir,
+                                    args.output_prefix + LATENCY_SUFFIX)
+
+    partstore = PartStore()
+    schematic = Schematic(partstore, pcb, not args.use_pg1350,
+                          not args.no_hotswap)
+
+    parser = Parser()
+    with trace.span("parse"):
+        if args.no_parse_cache:
+            parser.load(args.kle_json_filename)
+        else:
+            ParseCache(args.parse_cache_dir).load(parser,
+                                                  args.kle_json_filename)
+
+    builder = BoardBuilder(parser, schematic)
+    with trace.span("BoardBuilder.build"):
+        builder.build(add_pro_micro=args.add_pro_micro,
+                      add_blue_pill=args.add_blue_pill,
+                      add_per_key_rgb=args.add_per_key_rgb,
+                      matrix_strategy=args.matrix_strategy,
+                      led_chain_order=args.led_chain_order,
+                      led_frame_time_us=args.led_frame_time_us,
+                      pin_allocation=args.pin_allocation,
+                      matrix_topologies=args.matrix_topologies)
+    placed = {}
+    if args.place_parts:
+        with trace.span("place_parts"):
+            placed = builder.place_parts()
+        for ref, position in sorted(placed.items()):
+            if position is None:
+                print("warning: no room for %s; place it by hand" % ref)
+    with trace.span("find_collisions"):
+        collisions = builder.find_collisions()
+    for collision in collisions:
+        print("warning: %s and %s overlap on the %s side" %
+              (collision.ref_a, collision.ref_b,
+               "bottom" if collision.side == "B" else "top"))
+    with trace.span("verify_matrix"):
+        rollover = ghosting.verify(partstore.netlist,
+                                   schematic.matrix_topology,
+                                   args.rollover_keys)
+    for masked in rollover["masked"]:
+        print("warning: %s can't be read; %s" %
+              (masked["key"], masked["reason"]))
+    for ghost in rollover["ghosts"][:MAX_GHOST_WARNINGS]:
+        print("warning: holding %s ghosts %s" %
+              ("+".join(ghost["chord"]), ghost["key"]))
+    if len(rollover["ghosts"]) > MAX_GHOST_WARNINGS:
+        print("warning: and %d more keys can ghost" %
+              (len(rollover["ghosts"]) - MAX_GHOST_WARNINGS))
+    kbd_dict["rollover"] = rollover
+    kbd_dict["matrix_pins"] = schematic.get_legend_dict()
+    kbd_dict["kle"] = parser
+    kbd_dict["key_matrix_keys"] = schematic.key_matrix_keys
+    kbd_dict["matrix_topology"] = schematic.matrix_topology
+    if (args.pin_allocation == ports.BY_PORT
+            and schematic.matrix_topology == STANDARD):
+        kbd_dict["col_reads"] = schematic.col_reads
+
+    kbd_dict["has_per_key_led"] = True
+    if schematic.led_data_pin_name is not None:
+        kbd_dict["led_data_pin"] = schematic.led_data_pin_name
+    kbd_dict["led_count"] = parser.key_count
+    kbd_dict["led_keys"] = sorted(parser.keys,
+                                  key=lambda key: key.led_identifier)
+    kbd_dict["led_chains"] = ledchain.report(builder.led_chains,
+                                             schematic.led_data_pin_names)
+
+    legend = schematic.get_legend_dict()
+    kbd_dict["latency"] = latency.analyze(schematic.key_matrix_keys,
+                                          legend["rows"],
+                                          legend["cols"],
+                                          builder.mcu,
+                                          topology=schematic.matrix_topology)
+    with open(latency_filename, "w") as f:
+        json.dump(kbd_dict["latency"], f, indent=2)
+
+    with trace.span("generate_netlist"):
+        with open(netlist_filename, "w") as f:
+            builder.generate_netlist(f, args.netlist_backend)
+
+    board_width = parser.board_right - parser.board_left
+    board_height = parser.board_bottom - parser.board_top
+    pcb_width_mm = board_width * key_width
+    pcb_height_mm = board_height * key_height
+    # Key positions are the centres of 1u squares, so a key at x=0 has its
+    # left edge half a key to the left of the origin.
+    pcb_left_mm = (parser.board_left - 0.5) * key_width
+    pcb_top_mm = (parser.board_top - 0.5) * key_height
+    kbd_dict["pcb_width_mm"] = pcb_width_mm
+    kbd_dict["pcb_height_mm"] = pcb_height_mm
+
+    usb_cutout_position = -1
+    usb_cutout_width = -1
+    # The keepout runs into the board from the connector's mating face. That's
+    # on the top edge unless place_parts had to hang J1 out over it.
+    usb_face_mm = pcb_top_mm
+    if placed.get("J1") is not None:
+        usb_face_mm = placed["J1"][1]
+    if args.add_blue_pill:
+        KC_TO_MM = 1000000
+        # J1 is a magic ref that means the USB-C connector
+        placement = pcb.get_placement("J1")
+        if placement:
+            usb_cutout_position = placement[0] / KC_TO_MM
+            # Korean Hroparts TYPE-C-31-M-14
+            usb_cutout_width = 4.7 * 2
+    outline = {
+        "left_mm": pcb_left_mm,
+        "top_mm": pcb_top_mm,
+        "width_mm": pcb_width_mm,
+        "height_mm": pcb_height_mm,
+    }
+    keepout = (usb_cutout_position - usb_cutout_width / 2, usb_face_mm,
+               usb_cutout_width, 6.1)
+    labels = parser.key_table.get_rowcol_label_dicts(key_width, key_height)
+    labels.append({
+        "text": schematic.get_legend_text(),
+        "x_mm": pcb_width_mm / 2,
+        "y_mm": pcb_top_mm + pcb_height_mm - 1
+    })
+
+    kbd_dict["bom"] = partstore.get_bom()
+    manual = Manual(kbd_dict)
+
+    async def generate_main_board(processes):
+        with trace.span("generate_kicad_pcb"):
+            if args.use_kinet2pcb:
+                kinjector_filename = os.path.join(out_dir,
+                                                  KINJECTOR_JSON_FILENAME)
+                pcb.write_kinjector_file(kinjector_filename)
+                await generate_kicad_pcb_async(netlist_filename,
+                                               kinjector_filename,
+                                               pcb_filename)
+                os.unlink(kinjector_filename)
+            else:
+                with open(pcb_filename, "w") as f:
+                    pcbwriter.write_board(f, partstore.netlist, pcb)
+        await trace.stage(processes,
+                          "edit_board",
+                          edit_main_board,
+                          pcb_filename,
+                          dict(outline,
+                               usb_cutout_position=usb_cutout_position,
+                               usb_cutout_width=usb_cutout_width),
+                          keepout,
+                          labels,
+                          trace_args={"board": "main"})
+
+    async def generate_outputs(processes, threads):
+        # Once the board's size is known the plates, the main board and the
+        # user guide don't depend on each other. The plates go first so that
+        # they're in the pool before the main board ties up this process.
+        plate = dict(outline,
+                     modify_existing=False,
+                     margin_mm=5,
+                     corner_radius_mm=5)
+        await asyncio.gather(
+            trace.stage(processes,
+                        "add_outline_to_board",
+                        add_outline_to_board,
+                        pcb_sandwich_bottom_filename,
+                        trace_args={"board": "bottom"},
+                        **plate),
+            trace.stage(processes,
+                        "add_outline_to_board",
+                        add_outline_to_board,
+                        pcb_sandwich_plate_filename,
+                        trace_args={"board": "top"},
+                        **plate),
+            trace.stage(threads, "Manual.generate", manual.generate,
+                        user_guide_filename),
+            generate_main_board(processes),
+        )
+
+    if args.output_workers > 0:
+        processes = concurrent.futures.ProcessPoolExecutor(args.output_workers)
+        threads = concurrent.futures.ThreadPoolExecutor(1)
+        with processes, threads:
+            asyncio.run(generate_outputs(processes, threads))
+    else:
+        asyncio.run(generate_outputs(None, None))
+
+    if not args.no_open:
+        subprocess.call(["xdg-open", pcb_filename])
+
+
+def edit_main_board(pcb_filename, outline, keepout, labels):
+    '''Adds the outline, USB keepout and labels in one load and save.'''
+    with BoardSession(pcb_filename) as session:
+        session.add_outline(**outline)
+        session.add_keepout(*keepout)
+        session.add_labels(labels)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
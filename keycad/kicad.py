@@ -1,20 +1,51 @@
-import os
+import asyncio
+import hashlib
+import json
+import logging
 import pcbnew
 import subprocess
+import time
+
+from keycad import boardhash, diskcache, trace
+
+logger = logging.getLogger(__name__)
 
 Point = pcbnew.wxPoint
 
 MM_TO_KC = 1000000
 
+# Beside a board, what its zones were last filled around.
+FILLS_SUFFIX = ".fills.json"
+FILLS_FORMAT_VERSION = 2
+
 
 def generate_kicad_pcb(netlist_filename, kinjector_filename, pcb_filename):
-    subprocess.call([
-        'kinet2pcb', '--nobackup', '--overwrite', '-i', netlist_filename, '-w'
-    ])
-    subprocess.call([
-        'kinjector', '--nobackup', '--overwrite', '--from', kinjector_filename,
-        '--to', pcb_filename
-    ])
+    with trace.span("kinet2pcb", "subprocess"):
+        subprocess.call([
+            'kinet2pcb', '--nobackup', '--overwrite', '-i', netlist_filename,
+            '-w'
+        ])
+    with trace.span("kinjector", "subprocess"):
+        subprocess.call([
+            'kinjector', '--nobackup', '--overwrite', '--from',
+            kinjector_filename, '--to', pcb_filename
+        ])
+
+
+async def _run(*argv):
+    process = await asyncio.create_subprocess_exec(*argv)
+    return await process.wait()
+
+
+async def generate_kicad_pcb_async(netlist_filename, kinjector_filename,
+                                   pcb_filename):
+    '''generate_kicad_pcb() that lets the event loop run other stages.'''
+    with trace.span("kinet2pcb", "subprocess"):
+        await _run('kinet2pcb', '--nobackup', '--overwrite', '-i',
+                   netlist_filename, '-w')
+    with trace.span("kinjector", "subprocess"):
+        await _run('kinjector', '--nobackup', '--overwrite', '--from',
+                   kinjector_filename, '--to', pcb_filename)
 
 
 def draw_segment(board, x1, y1, x2, y2):
@@ -41,16 +72,65 @@ def draw_arc(board, cx, cy, sx, sy, a):
     ds.SetAngle(a * 10)
 
 
-def add_outline_to_board(pcb_filename,
-                         left_mm,
-                         top_mm,
-                         width_mm,
-                         height_mm,
-                         usb_cutout_position=-1,
-                         usb_cutout_width=-1,
-                         modify_existing=True,
-                         margin_mm=0,
-                         corner_radius_mm=3):
+class BoardSession:
+    '''
+    Loads a board once, queues edits to it, and applies them and saves the
+    board once when the with block exits without an exception.
+    '''
+    def __init__(self, pcb_filename, modify_existing=True):
+        self._pcb_filename = pcb_filename
+        self._modify_existing = modify_existing
+        self._edits = []
+        self._board = None
+
+    def __enter__(self):
+        if self._modify_existing:
+            self._board = pcbnew.LoadBoard(self._pcb_filename)
+        else:
+            self._board = pcbnew.BOARD()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        self._board = None
+        return False
+
+    @property
+    def board(self):
+        return self._board
+
+    def commit(self):
+        for edit, args in self._edits:
+            edit(self._board, *args)
+        self._edits = []
+        pcbnew.SaveBoard(self._pcb_filename, self._board)
+
+    def add_outline(self,
+                    left_mm,
+                    top_mm,
+                    width_mm,
+                    height_mm,
+                    usb_cutout_position=-1,
+                    usb_cutout_width=-1,
+                    margin_mm=0,
+                    corner_radius_mm=3):
+        self._edits.append(
+            (_draw_outline,
+             (left_mm, top_mm, width_mm, height_mm, usb_cutout_position,
+              usb_cutout_width, margin_mm, corner_radius_mm)))
+
+    def add_keepout(self, left_mm, top_mm, width_mm, height_mm):
+        self._edits.append(
+            (_draw_keepout, (left_mm, top_mm, width_mm, height_mm)))
+
+    def add_labels(self, labels):
+        self._edits.append((_draw_labels, (list(labels), )))
+
+
+def _draw_outline(board, left_mm, top_mm, width_mm, height_mm,
+                  usb_cutout_position, usb_cutout_width, margin_mm,
+                  corner_radius_mm):
     l = left_mm * MM_TO_KC
     t = top_mm * MM_TO_KC
     r = (left_mm + width_mm) * MM_TO_KC
@@ -70,40 +150,54 @@ def add_outline_to_board(pcb_filename,
         (l - margin_kc, b + margin_kc),
     ]
 
-    if modify_existing:
-        pcb = pcbnew.LoadBoard(pcb_filename)
-    else:
-        pcb = pcbnew.BOARD()
-
     if usb_cutout_position >= 0:
         usb_cutout_left = (usb_cutout_position -
                            usb_cutout_width / 2) * MM_TO_KC
         usb_cutout_right = (usb_cutout_position +
                             usb_cutout_width / 2) * MM_TO_KC
-        draw_segment(pcb, points[0][0] + corner_rad_kc, points[0][1],
+        draw_segment(board, points[0][0] + corner_rad_kc, points[0][1],
                      usb_cutout_left, points[0][1])
-        draw_segment(pcb, usb_cutout_right, points[1][1],
+        draw_segment(board, usb_cutout_right, points[1][1],
                      points[1][0] - corner_rad_kc, points[1][1])
     else:
-        draw_segment(pcb, points[0][0] + corner_rad_kc, points[0][1],
+        draw_segment(board, points[0][0] + corner_rad_kc, points[0][1],
                      points[1][0] - corner_rad_kc, points[1][1])
-    draw_segment(pcb, points[1][0], points[1][1] + corner_rad_kc, points[2][0],
-                 points[2][1] - corner_rad_kc)
-    draw_segment(pcb, points[2][0] - corner_rad_kc, points[2][1],
+    draw_segment(board, points[1][0], points[1][1] + corner_rad_kc,
+                 points[2][0], points[2][1] - corner_rad_kc)
+    draw_segment(board, points[2][0] - corner_rad_kc, points[2][1],
                  points[3][0] + corner_rad_kc, points[3][1])
-    draw_segment(pcb, points[3][0], points[3][1] - corner_rad_kc, points[0][0],
-                 points[0][1] + corner_rad_kc)
+    draw_segment(board, points[3][0], points[3][1] - corner_rad_kc,
+                 points[0][0], points[0][1] + corner_rad_kc)
 
-    draw_arc(pcb, points[0][0] + corner_rad_kc, points[0][1] + corner_rad_kc,
+    draw_arc(board, points[0][0] + corner_rad_kc, points[0][1] + corner_rad_kc,
              points[0][0], points[0][1] + corner_rad_kc, 90)
-    draw_arc(pcb, points[1][0] - corner_rad_kc, points[1][1] + corner_rad_kc,
+    draw_arc(board, points[1][0] - corner_rad_kc, points[1][1] + corner_rad_kc,
              points[1][0] - corner_rad_kc, points[1][1], 90)
-    draw_arc(pcb, points[2][0] - corner_rad_kc, points[2][1] - corner_rad_kc,
+    draw_arc(board, points[2][0] - corner_rad_kc, points[2][1] - corner_rad_kc,
              points[2][0], points[2][1] - corner_rad_kc, 90)
-    draw_arc(pcb, points[3][0] + corner_rad_kc, points[3][1] - corner_rad_kc,
+    draw_arc(board, points[3][0] + corner_rad_kc, points[3][1] - corner_rad_kc,
              points[3][0] + corner_rad_kc, points[3][1], 90)
 
-    pcbnew.SaveBoard(pcb_filename, pcb)
+
+def add_outline_to_board(pcb_filename,
+                         left_mm,
+                         top_mm,
+                         width_mm,
+                         height_mm,
+                         usb_cutout_position=-1,
+                         usb_cutout_width=-1,
+                         modify_existing=True,
+                         margin_mm=0,
+                         corner_radius_mm=3):
+    with BoardSession(pcb_filename, modify_existing) as session:
+        session.add_outline(left_mm,
+                            top_mm,
+                            width_mm,
+                            height_mm,
+                            usb_cutout_position=usb_cutout_position,
+                            usb_cutout_width=usb_cutout_width,
+                            margin_mm=margin_mm,
+                            corner_radius_mm=corner_radius_mm)
 
 
 def draw_text(board, text, x, y):
@@ -117,16 +211,18 @@ def draw_text(board, text, x, y):
     board.Add(txtmod)
 
 
-def add_labels_to_board(pcb_filename, labels):
-    pcb = pcbnew.LoadBoard(pcb_filename)
-
+def _draw_labels(board, labels):
     for label in labels:
-        draw_text(pcb, label["text"], label["x_mm"] * MM_TO_KC,
+        draw_text(board, label["text"], label["x_mm"] * MM_TO_KC,
                   label["y_mm"] * MM_TO_KC)
-    pcbnew.SaveBoard(pcb_filename, pcb)
 
 
-def add_keepout_to_board(pcb_filename, left_mm, top_mm, width_mm, height_mm):
+def add_labels_to_board(pcb_filename, labels):
+    with BoardSession(pcb_filename) as session:
+        session.add_labels(labels)
+
+
+def _draw_keepout(board, left_mm, top_mm, width_mm, height_mm):
     l = left_mm * MM_TO_KC
     t = top_mm * MM_TO_KC
     r = (left_mm + width_mm) * MM_TO_KC
@@ -137,10 +233,9 @@ def add_keepout_to_board(pcb_filename, left_mm, top_mm, width_mm, height_mm):
     r = int(r)
     b = int(b)
 
-    pcb = pcbnew.LoadBoard(pcb_filename)
     layer = pcbnew.F_Cu
-    area = pcb.InsertArea(0, 0, layer, l, t,
-                          pcbnew.ZONE_CONTAINER.DIAGONAL_EDGE)
+    area = board.InsertArea(0, 0, layer, l, t,
+                            pcbnew.ZONE_CONTAINER.DIAGONAL_EDGE)
     area.SetIsKeepout(True)
     area.SetDoNotAllowTracks(True)
     area.SetDoNotAllowVias(True)
@@ -153,10 +248,70 @@ def add_keepout_to_board(pcb_filename, left_mm, top_mm, width_mm, height_mm):
     # Thanks
     # https://github.com/NilujePerchut/kicad_scripts/blob/master/teardrops/td.py
 
-    pcbnew.SaveBoard(pcb_filename, pcb)
 
+def add_keepout_to_board(pcb_filename, left_mm, top_mm, width_mm, height_mm):
+    with BoardSession(pcb_filename) as session:
+        session.add_keepout(left_mm, top_mm, width_mm, height_mm)
+
+
+def zone_outline_hash(zone, layer_name):
+    '''Identifies a zone's net, layer and outline, to tell when it changed.'''
+    h = hashlib.sha256()
+    h.update(zone.GetNetname().encode("utf-8"))
+    h.update(b"\0")
+    h.update(layer_name.encode("utf-8"))
+    for i in range(zone.GetNumCorners()):
+        p = zone.GetCornerPosition(i)
+        h.update(b";%d,%d" % (p.x, p.y))
+    return h.hexdigest()
+
+
+def _read_fill_state(filename):
+    try:
+        with open(filename, "r") as f:
+            state = json.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning("ignoring corrupt fill state %s", filename)
+        return {}
+    if state.get("version") != FILLS_FORMAT_VERSION:
+        return {}
+    return state
+
+
+def _write_fill_state(filename, state):
+    state = dict(state, version=FILLS_FORMAT_VERSION)
+    try:
+        diskcache.write_atomically(filename, json.dumps(state).encode("utf-8"))
+    except OSError as e:
+        logger.warning("couldn't write fill state: %s", e)
+
+
+def pour_fills_on_board(pcb_filename, incremental=False):
+    '''
+    Adds GND zones to both sides of the board unless they're already there,
+    then fills them all in one pass.
+
+    With incremental, a board whose copper and zones are unchanged since the
+    last call isn't even loaded, and None is returned. If only zones changed,
+    just the zones whose net or outline changed, or that have never been
+    filled, are refilled. What the last fill saw is kept in a .fills.json
+    beside the board.
+
+    Returns a list of ([(net, layer), ...], seconds) for each fill pass, with
+    the zones that it filled.
+    '''
+    fills_filename = pcb_filename + FILLS_SUFFIX
+    old_state = {}
+    copper_changed = True
+    if incremental:
+        old_state = _read_fill_state(fills_filename)
+        copper, zones = boardhash.board_hashes(pcb_filename)
+        copper_changed = old_state.get("copper") != copper
+        if not copper_changed and old_state.get("zones") == zones:
+            return None
 
-def pour_fills_on_board(pcb_filename):
     pcb = pcbnew.LoadBoard(pcb_filename)
     pcb.ComputeBoundingBox(False)
     bb = pcb.GetBoundingBox()
@@ -178,7 +333,13 @@ def pour_fills_on_board(pcb_filename):
             powernets.append((name, "B.Cu"))
             break
 
+    # Add every zone before filling any of them. Filling inside this loop
+    # refilled all the zones so far each time round.
+    existing = set((zone.GetNetname(), pcb.GetLayerName(zone.GetLayer()))
+                   for zone in pcb.Zones() if not zone.GetIsKeepout())
     for netname, layername in (powernets):
+        if (netname, layername) in existing:
+            continue
         net = nets.find(netname).value()[1]
         layer = layertable[layername]
         newarea = pcb.InsertArea(net.GetNet(), 0, layer, l, t,
@@ -189,8 +350,42 @@ def pour_fills_on_board(pcb_filename):
         newoutline.Append(r, t)
         newarea.Hatch()
 
-        filler = pcbnew.ZONE_FILLER(pcb)
-        zones = pcb.Zones()
-        filler.Fill(zones)
-
-    pcbnew.SaveBoard(pcb_filename, pcb)
+    old_hashes = old_state.get("zone_outlines", {})
+    hashes = {}
+    to_fill = []
+    for zone in pcb.Zones():
+        if zone.GetIsKeepout():
+            continue
+        layername = pcb.GetLayerName(zone.GetLayer())
+        # A net can have more than one zone on a layer.
+        key = "%s/%s" % (zone.GetNetname(), layername)
+        key += "/%d" % sum(1 for k in hashes if k.startswith(key + "/"))
+        hashes[key] = zone_outline_hash(zone, layername)
+        # Fills flow around the copper, so if that moved they all go again.
+        if (copper_changed or old_hashes.get(key) != hashes[key]
+                or not zone.IsFilled()):
+            to_fill.append((zone, zone.GetNetname(), layername))
+
+    # One pass fills every zone that needs it, so that overlapping zones are
+    # filled together rather than in the order they're listed.
+    report = []
+    if to_fill:
+        zones = pcbnew.ZONE_CONTAINERS()
+        for zone, _, _ in to_fill:
+            zones.append(zone)
+        filled = [(netname, layername) for _, netname, layername in to_fill]
+        start = time.perf_counter()
+        with trace.span("fill_zones", zones=len(filled)):
+            pcbnew.ZONE_FILLER(pcb).Fill(zones)
+        report.append((filled, time.perf_counter() - start))
+
+    if to_fill or not incremental:
+        pcbnew.SaveBoard(pcb_filename, pcb)
+    # Hash the board as saved, which is what the next call will see.
+    copper, zones = boardhash.board_hashes(pcb_filename)
+    _write_fill_state(fills_filename, {
+        "copper": copper,
+        "zones": zones,
+        "zone_outlines": hashes
+    })
+    return report
@@ -2,27 +2,35 @@
 kle knows about keyboard-layout-editor.com JSON files.
 '''
 
-import json
 import logging
 
 from keycad import key
+from keycad import klestream
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
 class Parser:
+    # Bump whenever a change to parsing would produce different keys or board
+    # dimensions from the same file, so that cached parses are discarded.
+    VERSION = 2
+
     def __init__(self):
         self.reset()
 
     def reset(self):
-        self.__keys = []
+        self.__key_table = key.KeyTable()
         self.__cursor_x = 0
         self.__cursor_y = 0
+        self.__rotation_angle = 0
+        self.__rotation_x = 0
+        self.__rotation_y = 0
         self._board_left = 99999
         self._board_top = 99999
         self._board_right = 0
         self._board_bottom = 0
+        self._bounds_key_count = 0
         self._max_col_count = 0
         self._col_count = 0
         self._row_count = 0
@@ -53,28 +61,56 @@ class Parser:
 
     @property
     def keys(self):
-        return self.__keys
+        return self.__key_table.keys
+
+    @property
+    def key_table(self):
+        return self.__key_table
 
     @property
     def board_left(self):
+        self._update_board_bounds()
         return self._board_left
 
     @property
     def board_top(self):
+        self._update_board_bounds()
         return self._board_top
 
     @property
     def board_right(self):
+        self._update_board_bounds()
         return self._board_right
 
     @property
     def board_bottom(self):
+        self._update_board_bounds()
         return self._board_bottom
 
+    def _update_board_bounds(self):
+        # Bounds come from the rotated key outlines, which the key table
+        # computes for all keys at once.
+        if self._bounds_key_count != self.key_count:
+            (self._board_left, self._board_top, self._board_right,
+             self._board_bottom) = self.__key_table.bounds
+            self._bounds_key_count = self.key_count
+
     def _process_row_metadata(self, metadata):
         pass
 
     def _process_key_metadata(self, metadata):
+        # Rotation persists until changed. Setting a new rotation origin also
+        # moves the cursor there, as keyboard-layout-editor.com does.
+        if 'r' in metadata:
+            self.__rotation_angle = float(metadata['r'])
+        if 'rx' in metadata:
+            self.__rotation_x = float(metadata['rx'])
+            self.__cursor_x = self.__rotation_x
+            self.__cursor_y = self.__rotation_y
+        if 'ry' in metadata:
+            self.__rotation_y = float(metadata['ry'])
+            self.__cursor_x = self.__rotation_x
+            self.__cursor_y = self.__rotation_y
         if 'h' in metadata:
             self.__current_key_height = float(metadata['h'])
         if 'w' in metadata:
@@ -88,25 +124,22 @@ class Parser:
 
     def _process_key(self, k):
         logger.info("processing key '%s'" % (k))
-        new_key = key.Key(self.__cursor_x + self.__current_key_x_padding,
-                          self.__cursor_y,
-                          text=k,
-                          width=self.__current_key_width,
-                          height=self.__current_key_height,
-                          is_homing=self.__current_key_is_homing)
-        self.__keys.append(new_key)
-        if new_key.x < self._board_left:
-            self._board_left = new_key.x
-        if new_key.y < self._board_top:
-            self._board_top = new_key.y
-        if new_key.x + self.__current_key_width > self._board_right:
-            self._board_right = new_key.x + self.__current_key_width
-        if new_key.y + self.__current_key_height > self._board_bottom:
-            self._board_bottom = new_key.y + self.__current_key_height
+        new_key = self.__key_table.append(
+            self.__cursor_x + self.__current_key_x_padding,
+            self.__cursor_y,
+            text=k,
+            width=self.__current_key_width,
+            height=self.__current_key_height,
+            is_homing=self.__current_key_is_homing,
+            rotation_angle=self.__rotation_angle,
+            rotation_x=self.__rotation_x,
+            rotation_y=self.__rotation_y)
+        return new_key
 
     def _process_row(self, row):
+        '''Processes one row, yielding each key as it's created.'''
         self.reset_row_parameters()
-        self.__cursor_x = 0
+        self.__cursor_x = self.__rotation_x
         self._row_count += 1
         self._col_count = 0
         first_key_in_row = True
@@ -117,7 +150,7 @@ class Parser:
                 if first_key_in_row:
                     first_key_in_row = False
                     self.__cursor_y += self.__current_key_y_padding
-                self._process_key(key)
+                yield self._process_key(key)
                 self.__cursor_x += (self.__current_key_width +
                                     self.__current_key_x_padding)
                 self._col_count += 1
@@ -125,16 +158,50 @@ class Parser:
                     self._max_col_count = self._col_count
                 self.reset_key_parameters()
 
-    def handle_dict(self, kle_dict):
-        for row in kle_dict:
+    def _process_rows(self, rows):
+        for row in rows:
             if isinstance(row, dict):
                 self._process_row_metadata(row)
             else:
-                self._process_row(row)
-                self.__cursor_x = 0
+                yield from self._process_row(row)
+                self.__cursor_x = self.__rotation_x
                 self.__cursor_y += self.__current_row_height
 
+    def handle_dict(self, kle_dict):
+        for _ in self._process_rows(kle_dict):
+            pass
+
+    def iter_keys(self, filename):
+        '''
+        Parses filename, yielding each key as soon as it has been read.
+
+        The file may be either KLE's downloaded JSON or its relaxed "raw data"
+        syntax. Board dimensions are final once the generator is exhausted.
+        '''
+        with open(filename, "r") as f:
+            yield from self.iter_keys_from_file(f)
+
+    def iter_keys_from_file(self, f):
+        self.reset()
+        yield from self._process_rows(klestream.LayoutReader(f).rows())
+
     def load(self, filename):
+        for _ in self.iter_keys(filename):
+            pass
+
+    def load_from_file(self, f):
+        for _ in self.iter_keys_from_file(f):
+            pass
+
+    def restore(self, key_table, row_count, max_col_count, board_left,
+                board_top, board_right, board_bottom):
+        '''Reinstates the result of an earlier parse, e.g. from a cache.'''
         self.reset()
-        with open(filename, "r") as f:
-            self.handle_dict(json.loads(f.read()))
+        self.__key_table = key_table
+        self._row_count = row_count
+        self._max_col_count = max_col_count
+        self._board_left = board_left
+        self._board_top = board_top
+        self._board_right = board_right
+        self._board_bottom = board_bottom
+        self._bounds_key_count = len(key_table)
@@ -0,0 +1,261 @@
+'''
+klestream reads keyboard-layout-editor.com layouts incrementally.
+
+It understands both the downloaded JSON file and the relaxed, JavaScript-style
+"raw data" that KLE shows in its editor (unquoted keys, single-quoted strings,
+comments, trailing commas, and rows that aren't wrapped in an outer array).
+Rows are handed out one at a time, and each row is itself a generator of
+metadata dicts and key legends, so a layout never has to be held in memory as
+text or as an object tree.
+'''
+
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_TOKEN_RE = re.compile(
+    r'''
+    (?P<space>(?:\s+|//[^\n]*|/\*.*?\*/)+)
+  | (?P<punct>[\[\]{},:])
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+''', re.VERBOSE | re.DOTALL)
+
+_ESCAPE_RE = re.compile(r'\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\r\n|.)',
+                        re.DOTALL)
+
+_ESCAPES = {
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+    '0': '\0',
+    '\n': '',
+    '\r\n': '',
+}
+
+_IDENTS = {
+    'true': True,
+    'false': False,
+    'null': None,
+}
+
+EOF = 'eof'
+STRING = 'string'
+NUMBER = 'number'
+IDENT = 'ident'
+
+
+def _unescape(match):
+    s = match.group(1)
+    if len(s) > 1 and s[0] in 'ux':
+        return chr(int(s[1:], 16))
+    return _ESCAPES.get(s, s)
+
+
+def decode_string(token):
+    s = _ESCAPE_RE.sub(_unescape, token[1:-1])
+    # \uXXXX pairs decode to lone surrogates; let the codec recombine them.
+    return s.encode('utf-16', 'surrogatepass').decode('utf-16')
+
+
+def decode_number(token):
+    if any(c in token for c in '.eE'):
+        return float(token)
+    return int(token)
+
+
+class Tokenizer:
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._offset = 0
+        self._eof = False
+        self._peeked = None
+
+    @property
+    def offset(self):
+        return self._offset + self._pos
+
+    def _fill(self):
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._offset += self._pos
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _match(self):
+        while True:
+            m = _TOKEN_RE.match(self._buffer, self._pos)
+            # A match that runs into the end of the buffer (or no match at
+            # all) might just be a token split across two chunks.
+            if (m is None or m.end() == len(self._buffer)) and not self._eof:
+                if self._fill():
+                    continue
+                m = _TOKEN_RE.match(self._buffer, self._pos)
+            return m
+
+    def _scan(self):
+        while True:
+            if self._pos >= len(self._buffer) and not self._fill():
+                return (EOF, None)
+            m = self._match()
+            if m is None:
+                if self._pos >= len(self._buffer):
+                    return (EOF, None)
+                raise ValueError("unexpected character %r at offset %d" %
+                                 (self._buffer[self._pos], self.offset))
+            self._pos = m.end()
+            kind = m.lastgroup
+            text = m.group(kind)
+            if kind == 'space':
+                continue
+            if kind == 'punct':
+                return (text, text)
+            if kind == STRING:
+                return (STRING, decode_string(text))
+            if kind == NUMBER:
+                return (NUMBER, decode_number(text))
+            return (IDENT, text)
+
+    def peek(self):
+        if self._peeked is None:
+            self._peeked = self._scan()
+        return self._peeked
+
+    def next(self):
+        token = self.peek()
+        self._peeked = None
+        return token
+
+    def expect(self, kind):
+        token = self.next()
+        if token[0] != kind:
+            raise ValueError("expected %r but found %r at offset %d" %
+                             (kind, token[1], self.offset))
+        return token
+
+    def skip_comma(self):
+        if self.peek()[0] == ',':
+            self.next()
+
+
+class LayoutReader:
+    '''
+    Yields the top-level items of a KLE layout: metadata dicts, and rows.
+
+    Each row is a generator of metadata dicts and legend strings. Rows are
+    read lazily, so a row should be consumed before asking for the next one.
+    Anything left unread is skipped when the reader moves on.
+    '''
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self._tokens = Tokenizer(f, chunk_size)
+
+    def rows(self):
+        tokens = self._tokens
+        if tokens.peek()[0] != '[':
+            yield from self._items(EOF)
+            return
+
+        # Either the downloaded file, whose outer array holds the rows, or
+        # raw data, whose first '[' opens the first row. The two can only be
+        # told apart by what follows the first element.
+        tokens.next()
+        kind = tokens.peek()[0]
+        if kind in ('[', ']'):
+            yield from self._items(']')
+        elif kind == '{':
+            metadata = self._value(tokens.next())
+            tokens.skip_comma()
+            if tokens.peek()[0] in ('[', ']'):
+                yield metadata
+                yield from self._items(']')
+            else:
+                yield from self._drain(self._row((metadata, )))
+                yield from self._items(EOF)
+        else:
+            yield from self._drain(self._row())
+            yield from self._items(EOF)
+        tokens.skip_comma()
+        tokens.expect(EOF)
+
+    def _drain(self, row):
+        yield row
+        for _ in row:
+            pass
+
+    def _items(self, end):
+        tokens = self._tokens
+        while True:
+            kind, value = tokens.next()
+            if kind == end:
+                return
+            if kind == '[':
+                yield from self._drain(self._row())
+            elif kind == '{':
+                yield self._object()
+            elif kind != ',':
+                raise ValueError("expected a row but found %r at offset %d" %
+                                 (value, tokens.offset))
+
+    def _row(self, prefix=()):
+        yield from prefix
+        tokens = self._tokens
+        while True:
+            kind, value = tokens.next()
+            if kind == ']':
+                return
+            if kind == STRING:
+                yield value
+            elif kind == '{':
+                yield self._object()
+            elif kind != ',':
+                raise ValueError(
+                    "expected a key or metadata but found %r at offset %d" %
+                    (value, tokens.offset))
+
+    def _value(self, token):
+        kind, value = token
+        if kind == '{':
+            return self._object()
+        if kind == '[':
+            return self._array()
+        if kind in (STRING, NUMBER):
+            return value
+        if kind == IDENT and value in _IDENTS:
+            return _IDENTS[value]
+        raise ValueError("unexpected %r at offset %d" %
+                         (value, self._tokens.offset))
+
+    def _array(self):
+        tokens = self._tokens
+        values = []
+        while True:
+            token = tokens.next()
+            if token[0] == ']':
+                return values
+            if token[0] != ',':
+                values.append(self._value(token))
+
+    def _object(self):
+        tokens = self._tokens
+        values = {}
+        while True:
+            kind, name = tokens.next()
+            if kind == '}':
+                return values
+            if kind == ',':
+                continue
+            if kind not in (STRING, IDENT, NUMBER):
+                raise ValueError("expected a property name at offset %d" %
+                                 tokens.offset)
+            tokens.expect(':')
+            values[str(name)] = self._value(tokens.next())
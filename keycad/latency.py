@@ -0,0 +1,146 @@
+'''
+latency estimates how quickly a keyboard's firmware notices a key.
+
+QMK scans the matrix by driving one line at a time, waiting for it to settle,
+and reading each of the lines across it. With COL2ROW diodes it drives the
+rows and reads the columns, and with ROW2COL the other way around, so the
+same matrix scans at different speeds depending on which way the diodes
+face.
+
+A DUPLEX matrix is scanned both ways, rows and then columns, and a
+ROUND_ROBIN matrix drives each of its lines in turn and reads all the others.
+
+A key pressed just after its line was read is seen a scan later. A deferring
+debounce then waits for the key to settle, and an eager one reports it at
+once. Either way the report then waits for the host's next USB poll. The
+worst case adds up all three.
+
+The MCU's clock and pin access cost come from the Mcu, and the rest are
+QMK's defaults. They're estimates, but good enough to compare layouts.
+'''
+
+from keycad.matrix import DUPLEX, ROUND_ROBIN, STANDARD
+
+COL2ROW = "COL2ROW"
+ROW2COL = "ROW2COL"
+DIRECTIONS = (COL2ROW, ROW2COL)
+
+# QMK's MATRIX_IO_DELAY, how long each driven line settles.
+MATRIX_IO_DELAY_US = 30
+
+# Debouncing, keyboard tasks and the USB stack, once a scan and once a key.
+SCAN_OVERHEAD_CYCLES = 2000
+KEY_OVERHEAD_CYCLES = 10
+
+# QMK's USB_POLLING_INTERVAL_MS.
+USB_POLLING_INTERVAL_MS = 1
+
+DEFER = "sym_defer_g"
+EAGER = "sym_eager_pk"
+DEBOUNCE_TYPES = (DEFER, EAGER)
+DEBOUNCE_MS = (1, 5, 10)
+DEFAULT_DEBOUNCE = (DEFER, 5)
+
+
+def scan_time_us(strobes, reads, clock_mhz, pin_io_cycles):
+    '''
+    Time to scan a matrix by driving strobes lines one at a time and reading
+    reads lines for each.
+    '''
+    # Each driven line is selected, settles, is read across and unselected.
+    strobe_cycles = (reads + 2) * pin_io_cycles
+    cycles = (strobes * strobe_cycles + SCAN_OVERHEAD_CYCLES +
+              strobes * reads * KEY_OVERHEAD_CYCLES)
+    return strobes * MATRIX_IO_DELAY_US + cycles / clock_mhz
+
+
+def worst_latency_us(scan_us, debounce_type, debounce_ms):
+    '''Longest time from a key press to the host reading the report.'''
+    latency = scan_us + USB_POLLING_INTERVAL_MS * 1000
+    if debounce_type == DEFER:
+        # The key must stay put for debounce_ms, which is checked once a
+        # scan.
+        latency += debounce_ms * 1000 + scan_us
+    elif debounce_type != EAGER:
+        raise ValueError("unknown debounce type %s" % debounce_type)
+    return latency
+
+
+def _passes(topology, rows, cols):
+    '''
+    {direction: [(strobes, reads), ...]} for each way that a matrix of
+    topology on rows and cols pins could be scanned.
+    '''
+    if topology == DUPLEX:
+        return {DUPLEX: [(len(rows), len(cols)), (len(cols), len(rows))]}
+    if topology == ROUND_ROBIN:
+        return {ROUND_ROBIN: [(len(rows), len(rows) - 1)]}
+    return {
+        COL2ROW: [(len(rows), len(cols))],
+        ROW2COL: [(len(cols), len(rows))]
+    }
+
+
+def analyze(key_matrix_keys,
+            rows,
+            cols,
+            mcu,
+            direction=COL2ROW,
+            topology=STANDARD):
+    '''
+    Latency report for a matrix of keys on the MCU pins rows and cols, as a
+    dict that can be dumped as JSON. A STANDARD matrix's diodes face
+    direction, and it's compared with its diodes facing the other way.
+    '''
+    if topology != STANDARD:
+        direction = topology
+    key_count = sum(1 for row in key_matrix_keys for key in row if key)
+    orientations = []
+    scan_times = {}
+    for d, passes in _passes(topology, rows, cols).items():
+        # The per-scan overhead is paid once however many passes there are.
+        scan_us = sum(
+            scan_time_us(strobes, reads, mcu.clock_mhz, mcu.pin_io_cycles)
+            for strobes, reads in passes)
+        scan_us -= (len(passes) - 1) * SCAN_OVERHEAD_CYCLES / mcu.clock_mhz
+        strobes = sum(p[0] for p in passes)
+        reads = sum(p[0] * p[1] for p in passes) / strobes
+        latency_us = worst_latency_us(scan_us, *DEFAULT_DEBOUNCE)
+        scan_times[d] = scan_us
+        orientations.append({
+            "direction": d,
+            "current": d == direction,
+            "strobes": strobes,
+            "reads_per_strobe": round(reads, 1),
+            "scan_us": round(scan_us, 1),
+            "scan_rate_hz": round(1e6 / scan_us),
+            "worst_latency_us": round(latency_us, 1),
+        })
+
+    current = next(o for o in orientations if o["current"])
+    debounce = []
+    for debounce_type in DEBOUNCE_TYPES:
+        for ms in DEBOUNCE_MS:
+            latency_us = worst_latency_us(scan_times[direction], debounce_type,
+                                          ms)
+            debounce.append({
+                "type": debounce_type,
+                "ms": ms,
+                "worst_latency_us": round(latency_us, 1),
+            })
+    return {
+        "mcu": type(mcu).__name__,
+        "clock_mhz": mcu.clock_mhz,
+        "topology": topology,
+        "rows": len(key_matrix_keys),
+        "cols": len(key_matrix_keys[0]),
+        "pins": len(rows) + len(cols),
+        "keys": key_count,
+        "direction": direction,
+        "scan_us": current["scan_us"],
+        "worst_latency_us": current["worst_latency_us"],
+        "debounce_type": DEFAULT_DEBOUNCE[0],
+        "debounce_ms": DEFAULT_DEBOUNCE[1],
+        "orientations": orientations,
+        "debounce": debounce,
+    }
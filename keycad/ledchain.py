@@ -0,0 +1,153 @@
+'''
+ledchain decides the order in which the per-key LEDs are daisy-chained.
+
+PARSE_ORDER chains them in the order the keys were parsed, so that every row
+wraps from its right end back to the far left. SERPENTINE runs along the
+physical rows, alternating direction, so that each row starts above or below
+where the last one ended. TSP starts from the serpentine and shortens it with
+2-opt, reversing whichever stretch of the chain saves the most until none
+does.
+
+Distances are Manhattan distances between key centres, in key units.
+
+A long chain is slow to refresh, so the chain can be cut into several, each
+driven from its own GPIO. Cutting one short path into consecutive runs keeps
+each chain's LEDs together on the board.
+'''
+
+import math
+
+import numpy as np
+
+from keycad.matrix import physical_rows
+
+PARSE_ORDER = "parse_order"
+SERPENTINE = "serpentine"
+TSP = "tsp"
+STRATEGIES = (PARSE_ORDER, SERPENTINE, TSP)
+
+_EPSILON = 1e-9
+
+# An SK6812 takes 24 bits of 1.25 us each, and the chain latches after 80 us
+# without data.
+LED_US = 30
+LATCH_US = 80
+
+# Each of an SK6812's three colours draws up to 20 mA at full brightness.
+LED_MAX_MA = 60
+
+
+def _distances(positions):
+    p = np.array(positions, dtype=float).reshape(-1, 2)
+    return np.abs(p[:, None, :] - p[None, :, :]).sum(axis=2)
+
+
+def chain_length(positions, order):
+    '''Length of the chain through positions in order.'''
+    return sum(
+        abs(positions[a][0] - positions[b][0]) +
+        abs(positions[a][1] - positions[b][1])
+        for a, b in zip(order, order[1:]))
+
+
+def serpentine(positions):
+    order = []
+    for i, row in enumerate(physical_rows(positions)):
+        order += row if i % 2 == 0 else row[::-1]
+    return order
+
+
+def two_opt(positions, order):
+    '''
+    Shortens the chain through positions in order by reversing stretches of
+    it, either of whose ends may be an end of the chain.
+    '''
+    path = np.array(order, dtype=int)
+    n = len(path)
+    if n < 3:
+        return list(order)
+    d = _distances(positions)
+    while True:
+        # Reversing path[s + 1:t + 1] swaps edges s and t for the edges
+        # from path[s] to path[t] and from path[s + 1] to path[t + 1].
+        edges = d[path[:-1], path[1:]]
+        inner = (d[np.ix_(path[:-1], path[:-1])] +
+                 d[np.ix_(path[1:], path[1:])] - edges[:, None] -
+                 edges[None, :])
+        inner[np.tril_indices(n - 1)] = np.inf
+        # Reversing path[:t + 1] or path[s + 1:] changes one edge.
+        prefix = d[path[0], path[1:]] - edges
+        suffix = d[path[:-1], path[-1]] - edges
+
+        s, t = np.unravel_index(np.argmin(inner), inner.shape)
+        best = min((inner[s, t], 0), (prefix.min(), 1), (suffix.min(), 2))
+        if best[0] >= -_EPSILON:
+            return [int(k) for k in path]
+        if best[1] == 0:
+            path[s + 1:t + 1] = path[s + 1:t + 1][::-1].copy()
+        elif best[1] == 1:
+            t = int(np.argmin(prefix))
+            path[:t + 1] = path[:t + 1][::-1].copy()
+        else:
+            s = int(np.argmin(suffix))
+            path[s + 1:] = path[s + 1:][::-1].copy()
+
+
+def order(positions, strategy=PARSE_ORDER):
+    '''Indexes of positions in the order that their LEDs are chained.'''
+    if strategy == PARSE_ORDER:
+        return list(range(len(positions)))
+    if strategy == SERPENTINE:
+        return serpentine(positions)
+    if strategy == TSP:
+        return two_opt(positions, serpentine(positions))
+    raise ValueError("unknown LED chain order %s" % strategy)
+
+
+def frame_time_us(led_count):
+    '''Time to refresh a chain of led_count LEDs.'''
+    return led_count * LED_US + LATCH_US
+
+
+def chain_count(led_count, target_us, max_chains):
+    '''
+    The fewest chains, up to max_chains, that refresh led_count LEDs in
+    target_us or less.
+    '''
+    count = 1
+    while (count < max_chains
+           and frame_time_us(math.ceil(led_count / count)) > target_us):
+        count += 1
+    return count
+
+
+def split(chain, count):
+    '''Cuts chain into count consecutive runs, none more than one longer.'''
+    size, extra = divmod(len(chain), count)
+    runs = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        runs.append(chain[start:end])
+        start = end
+    return runs
+
+
+def report(runs, pin_names):
+    '''
+    Describes each chain for the manual: its MCU pin, its LEDs' QMK indexes,
+    its refresh time and its current draw with every LED at full white.
+    '''
+    chains = []
+    first = 0
+    for run, pin_name in zip(runs, pin_names):
+        chains.append({
+            "pin": pin_name,
+            "led_count": len(run),
+            "first_led": first,
+            "last_led": first + len(run) - 1,
+            "frame_time_us": frame_time_us(len(run)),
+            "max_current_ma": len(run) * LED_MAX_MA,
+        })
+        first += len(run)
+    return chains
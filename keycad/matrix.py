@@ -0,0 +1,407 @@
+'''
+matrix decides which row and column of the key matrix each key is wired to.
+
+PARSE_ORDER is how keycad has always done it. A new matrix row starts
+whenever a key's KLE y changes, and columns count up along it. When the
+layout's rows and columns need more GPIOs than the MCU has, keys fill a square
+matrix row by row in the order they were parsed.
+
+WIRELENGTH works from the keys' physical centres instead, so that the ROW and
+COL nets don't criss-cross the board. Keys are chained left to right into
+physical rows, which follow a column stagger up and down, and those are cut
+into matrix rows. Each matrix row's keys are then matched to columns by
+position, and cells are swapped while that shortens the nets. The parse order
+is improved the same way, and whichever ends up shorter is used.
+
+A net's length is estimated as a daisy chain through its keys, left to right
+for a row and top to bottom for a column, with Manhattan distances in key
+units.
+
+When a layout needs more GPIOs than the MCU has, there are other ways to wire
+the matrix than a square. A DUPLEX matrix puts two keys on every crossing of a
+row and a column, one with its diode facing each way, and scans the rows and
+then the columns. A ROUND_ROBIN matrix has no rows or columns, just lines,
+and a key between every ordered pair of them. Each is described by the
+logical matrix that QMK sees, and keys are assigned to it in the same way.
+Both give up some rollover for their pins: any two keys on a round robin
+matrix can ghost a third, and on a duplex matrix three can. matrix_shape()
+picks whichever fits the MCU and keeps the most rollover, and then the one
+with the fewest lines to drive on each scan.
+'''
+
+import collections
+import math
+
+PARSE_ORDER = "parse_order"
+WIRELENGTH = "wirelength"
+STRATEGIES = (PARSE_ORDER, WIRELENGTH)
+
+# Keys closer than this vertically, in key units, can share a physical row.
+_ROW_TOLERANCE = 0.5
+
+_MAX_PASSES = 10
+
+STANDARD = "standard"
+DUPLEX = "duplex"
+ROUND_ROBIN = "round_robin"
+TOPOLOGIES = (STANDARD, DUPLEX, ROUND_ROBIN)
+
+# How many held keys each topology can always read without ghosting, or None
+# for any number, as ghosting.verify() finds for a full matrix.
+ROLLOVER = {STANDARD: None, DUPLEX: 2, ROUND_ROBIN: 1}
+
+# rows and cols are the size of the logical matrix. A DUPLEX matrix's rows
+# come in pairs on one row net, and a ROUND_ROBIN matrix's rows are its lines,
+# each of which reads every other line.
+MatrixShape = collections.namedtuple("MatrixShape",
+                                     ("topology", "rows", "cols", "conserve"))
+
+
+def net_counts(shape):
+    '''
+    (row nets, column nets) of shape. A ROUND_ROBIN matrix's lines are its
+    row nets.
+    '''
+    if shape.topology == DUPLEX:
+        return math.ceil(shape.rows / 2), shape.cols
+    if shape.topology == ROUND_ROBIN:
+        return max(shape.rows, shape.cols + 1), 0
+    return shape.rows, shape.cols
+
+
+def strobe_count(shape):
+    '''How many lines are driven in turn on each scan of shape.'''
+    if shape.topology == STANDARD:
+        return shape.rows
+    return sum(net_counts(shape))
+
+
+def _duplex_shape(key_count):
+    rows = min(range(1, key_count + 1),
+               key=lambda r: r + math.ceil(key_count / (2 * r)))
+    return MatrixShape(DUPLEX, 2 * rows, math.ceil(key_count / (2 * rows)),
+                       True)
+
+
+def _round_robin_shape(key_count):
+    lines = 2
+    while lines * (lines - 1) < key_count:
+        lines += 1
+    return MatrixShape(ROUND_ROBIN, lines, lines - 1, True)
+
+
+def matrix_shape(key_count,
+                 row_count,
+                 col_count,
+                 gpio_count,
+                 topologies=(STANDARD, )):
+    '''
+    The MatrixShape for a layout of row_count rows of up to col_count keys.
+    The layout's own rows and columns are used if they fit in gpio_count.
+    Otherwise, of the topologies that fit, the one with the most rollover
+    wins, then the one that drives the fewest lines on each scan, and then
+    the one that needs the fewest GPIOs.
+    '''
+    if STANDARD in topologies and row_count + col_count <= gpio_count:
+        return MatrixShape(STANDARD, row_count, col_count, False)
+    shapes = []
+    if STANDARD in topologies:
+        size = math.ceil(math.sqrt(key_count))
+        shapes.append(MatrixShape(STANDARD, size, size, True))
+    if DUPLEX in topologies:
+        shapes.append(_duplex_shape(key_count))
+    if ROUND_ROBIN in topologies:
+        shapes.append(_round_robin_shape(key_count))
+    # As for a square matrix, one GPIO is left over for the LEDs.
+    shapes = [s for s in shapes if sum(net_counts(s)) < gpio_count]
+    if not shapes:
+        raise OverflowError("not enough GPIOs for this keyboard")
+    return min(shapes,
+               key=lambda s: (-(ROLLOVER[s.topology] or math.inf),
+                              strobe_count(s), sum(net_counts(s))))
+
+
+def matrix_size(key_count, row_count, col_count, gpio_count):
+    '''
+    (rows, cols, conserve) of the STANDARD matrix for a layout of row_count
+    rows of up to col_count keys. If that needs more GPIOs than gpio_count,
+    conserve is True and the matrix is square.
+    '''
+    shape = matrix_shape(key_count, row_count, col_count, gpio_count)
+    return shape.rows, shape.cols, shape.conserve
+
+
+def duplex_row(row):
+    '''(row net, whether its diode faces ROW2COL) of a DUPLEX matrix row.'''
+    return row // 2, row % 2 == 1
+
+
+def round_robin_line(row, col):
+    '''The line that a ROUND_ROBIN matrix reads for col while driving row.'''
+    return col if col < row else col + 1
+
+
+def _chain_length(points):
+    '''Length of a chain through points, which are (along, across) pairs.'''
+    if len(points) < 2:
+        return 0
+    points = sorted(points)
+    return (points[-1][0] - points[0][0] +
+            sum(abs(b[1] - a[1]) for a, b in zip(points, points[1:])))
+
+
+def _row_length(positions, members):
+    return _chain_length([positions[k] for k in members])
+
+
+def _col_length(positions, members):
+    return _chain_length([(positions[k][1], positions[k][0]) for k in members])
+
+
+def net_length(positions, cells):
+    '''
+    Estimated total length of the ROW and COL nets, in key units, with key i
+    at positions[i] in cells[i], a (row, col) pair.
+    '''
+    rows = {}
+    cols = {}
+    for k, (row, col) in enumerate(cells):
+        rows.setdefault(row, []).append(k)
+        cols.setdefault(col, []).append(k)
+    return (sum(_row_length(positions, m) for m in rows.values()) +
+            sum(_col_length(positions, m) for m in cols.values()))
+
+
+def assign_parse_order(keys, cols, conserve):
+    cells = []
+    row = col = 0
+    prior_y = None
+    for key in keys:
+        if conserve:
+            cells.append(divmod(len(cells), cols))
+            continue
+        if prior_y is not None and key.y != prior_y:
+            row += 1
+            col = 0
+        prior_y = key.y
+        cells.append((row, col))
+        col += 1
+    return cells
+
+
+def physical_rows(positions):
+    '''Chains keys left to right into rows, top row first.'''
+    chains = []
+    for k in sorted(range(len(positions)), key=lambda k: positions[k]):
+        y = positions[k][1]
+        best = None
+        for chain in chains:
+            dy = abs(positions[chain[-1]][1] - y)
+            if dy < _ROW_TOLERANCE and (best is None or dy < best[0]):
+                best = (dy, chain)
+        if best is None:
+            chains.append([k])
+        else:
+            best[1].append(k)
+    chains.sort(key=lambda c: sum(positions[k][1] for k in c) / len(c))
+    return chains
+
+
+def _cut_rows(positions, rows, cols):
+    '''
+    Cuts the physical rows, read as a snake, into at most rows runs of at
+    most cols keys with the shortest total row length.
+    '''
+    order = []
+    for i, chain in enumerate(physical_rows(positions)):
+        order += chain if i % 2 == 0 else chain[::-1]
+    n = len(order)
+
+    # best[g][i] is the shortest way to cut order[:i] into g runs.
+    best = [[math.inf] * (n + 1) for _ in range(rows + 1)]
+    back = [[0] * (n + 1) for _ in range(rows + 1)]
+    best[0][0] = 0
+    lengths = {}
+    for i in range(1, n + 1):
+        for j in range(max(0, i - cols), i):
+            lengths[j, i] = _row_length(positions, order[j:i])
+    for g in range(1, rows + 1):
+        for i in range(1, n + 1):
+            for j in range(max(0, i - cols), i):
+                length = best[g - 1][j] + lengths[j, i]
+                if length < best[g][i]:
+                    best[g][i] = length
+                    back[g][i] = j
+    g = min(range(rows + 1), key=lambda g: best[g][n])
+    runs = []
+    i = n
+    while g > 0:
+        j = back[g][i]
+        runs.append(order[j:i])
+        i = j
+        g -= 1
+    return runs[::-1]
+
+
+def _match(xs, centres):
+    '''
+    Matches xs, sorted, to distinct centres, sorted, keeping their order and
+    minimizing the total distance. Returns the index of each x's centre.
+    '''
+    k, n = len(xs), len(centres)
+    # cost[i][j] matches the first i xs to the first j centres.
+    cost = [[math.inf] * (n + 1) for _ in range(k + 1)]
+    for j in range(n + 1):
+        cost[0][j] = 0
+    for i in range(1, k + 1):
+        for j in range(i, n + 1):
+            cost[i][j] = min(
+                cost[i][j - 1],
+                cost[i - 1][j - 1] + abs(xs[i - 1] - centres[j - 1]))
+    matched = []
+    j = n
+    for i in range(k, 0, -1):
+        while cost[i][j] == cost[i][j - 1]:
+            j -= 1
+        matched.append(j - 1)
+        j -= 1
+    return matched[::-1]
+
+
+def _assign_columns(positions, runs, cols):
+    '''Gives each run's keys distinct columns near the columns' centres.'''
+    xs = [p[0] for p in positions]
+    left, right = min(xs), max(xs)
+    centres = [left + (c + 0.5) * (right - left) / cols for c in range(cols)]
+    runs = [sorted(run, key=lambda k: positions[k][0]) for run in runs]
+    grid = None
+    for _ in range(_MAX_PASSES):
+        by_x = sorted(range(cols), key=lambda c: centres[c])
+        new_grid = []
+        for run in runs:
+            row = [None] * cols
+            matched = _match([positions[k][0] for k in run],
+                             [centres[c] for c in by_x])
+            for k, j in zip(run, matched):
+                row[by_x[j]] = k
+            new_grid.append(row)
+        if new_grid == grid:
+            break
+        grid = new_grid
+        for c in range(cols):
+            members = [row[c] for row in grid if row[c] is not None]
+            if members:
+                centres[c] = sum(positions[k][0]
+                                 for k in members) / len(members)
+    return grid
+
+
+def _improve(positions, grid):
+    '''
+    Swaps pairs of cells in the same row or column, either of which may be
+    empty, while that shortens the nets.
+    '''
+    rows, cols = len(grid), len(grid[0])
+
+    def row_members(r):
+        return [k for k in grid[r] if k is not None]
+
+    def col_members(c):
+        return [row[c] for row in grid if row[c] is not None]
+
+    row_lengths = [_row_length(positions, row_members(r)) for r in range(rows)]
+    col_lengths = [_col_length(positions, col_members(c)) for c in range(cols)]
+    for _ in range(_MAX_PASSES):
+        improved = False
+        for r in range(rows):
+            for c1 in range(cols):
+                for c2 in range(c1 + 1, cols):
+                    if grid[r][c1] is None and grid[r][c2] is None:
+                        continue
+                    grid[r][c1], grid[r][c2] = grid[r][c2], grid[r][c1]
+                    l1 = _col_length(positions, col_members(c1))
+                    l2 = _col_length(positions, col_members(c2))
+                    if l1 + l2 < col_lengths[c1] + col_lengths[c2] - 1e-9:
+                        col_lengths[c1], col_lengths[c2] = l1, l2
+                        improved = True
+                    else:
+                        grid[r][c1], grid[r][c2] = grid[r][c2], grid[r][c1]
+        for c in range(cols):
+            for r1 in range(rows):
+                for r2 in range(r1 + 1, rows):
+                    if grid[r1][c] is None and grid[r2][c] is None:
+                        continue
+                    grid[r1][c], grid[r2][c] = grid[r2][c], grid[r1][c]
+                    l1 = _row_length(positions, row_members(r1))
+                    l2 = _row_length(positions, row_members(r2))
+                    if l1 + l2 < row_lengths[r1] + row_lengths[r2] - 1e-9:
+                        row_lengths[r1], row_lengths[r2] = l1, l2
+                        improved = True
+                    else:
+                        grid[r1][c], grid[r2][c] = grid[r2][c], grid[r1][c]
+        if not improved:
+            break
+    return grid
+
+
+def assign_wirelength(positions, rows, cols, starts=()):
+    '''
+    Returns the (row, col) of each key at positions. starts are other
+    assignments to improve on, such as the parse order, and the shortest
+    result wins.
+    '''
+    grids = [
+        _assign_columns(positions, _cut_rows(positions, rows, cols), cols)
+    ]
+    for cells in starts:
+        if all(0 <= r < rows and 0 <= c < cols for r, c in cells):
+            grid = [[None] * cols for _ in range(rows)]
+            for k, (r, c) in enumerate(cells):
+                grid[r][c] = k
+            grids.append(grid)
+
+    best = None
+    for grid in grids:
+        grid = _improve(positions, grid)
+        cells = [None] * len(positions)
+        for r, row in enumerate(grid):
+            for c, k in enumerate(row):
+                if k is not None:
+                    cells[k] = (r, c)
+        length = net_length(positions, cells)
+        if best is None or length < best[0]:
+            best = (length, cells)
+    return best[1]
+
+
+def _compact(cells, positions):
+    '''
+    Renumbers rows top to bottom and columns left to right, leaving out empty
+    ones, so that every row and column net has keys on it.
+    '''
+    def renumber(axis):
+        centres = {}
+        for cell, p in zip(cells, positions):
+            centres.setdefault(cell[axis], []).append(p[1 - axis])
+        order = sorted(centres,
+                       key=lambda i: (sum(centres[i]) / len(centres[i]), i))
+        return {old: new for new, old in enumerate(order)}
+
+    rows = renumber(0)
+    cols = renumber(1)
+    return [(rows[r], cols[c]) for r, c in cells]
+
+
+def assign(keys, rows, cols, conserve, strategy=PARSE_ORDER):
+    '''
+    Returns the (row, col) of each of keys in a matrix of at most rows by
+    cols, with every row and column in use.
+    '''
+    if strategy == PARSE_ORDER:
+        return assign_parse_order(keys, cols, conserve)
+    if strategy == WIRELENGTH:
+        positions = [key.position for key in keys]
+        cells = assign_wirelength(positions, rows, cols,
+                                  [assign_parse_order(keys, cols, conserve)])
+        return _compact(cells, positions)
+    raise ValueError("unknown matrix strategy %s" % strategy)
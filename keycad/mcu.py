@@ -1,4 +1,5 @@
 from keycad import partstore
+from keycad import ports
 
 
 class Mcu:
@@ -13,6 +14,17 @@ class Mcu:
         self.reset_pin_no = -1
         self.usb_pin_nos = (-1, -1)
 
+        # What latency needs to estimate how long a matrix scan takes.
+        self.clock_mhz = 1
+        self.pin_io_cycles = 1
+
+        # The C expression for a port's input register, given its letter.
+        self.port_register = "%s"
+
+    @property
+    def part(self):
+        return self._part
+
     @property
     def pin_count(self):
         return len(self.pin_names)
@@ -52,6 +64,24 @@ class Mcu:
         val = self.gpio_pin_nos.pop(0)
         return (val, self._part[val])
 
+    def claim_last_gpio(self):
+        if len(self.gpio_pin_nos) == 0:
+            raise RuntimeError("Ran out of GPIOs")
+        val = self.gpio_pin_nos.pop()
+        return (val, self._part[val])
+
+    def claim_port_gpios(self, count):
+        '''Claims count GPIOs on as few ports as possible.'''
+        pins = [
+            (no, ) + (ports.pin_port(self.get_pin_name(no)) or (None, None))
+            for no in self.gpio_pin_nos
+        ]
+        claimed = []
+        for no, _, _ in ports.pack(pins, count):
+            self.gpio_pin_nos.remove(no)
+            claimed.append((no, self._part[no]))
+        return claimed
+
     def claim_led_din_pin(self):
         if self.led_din_pin_no in self.gpio_pin_nos:
             self.gpio_pin_nos.remove(self.led_din_pin_no)
@@ -87,6 +117,12 @@ class ProMicro(Mcu):
         self.populate_pins(self.pin_names)
         self.led_din_pin_no = 5
 
+        # ATmega32U4. QMK looks matrix pins up at run time, so each read or
+        # write is a table lookup and a port access.
+        self.clock_mhz = 16
+        self.pin_io_cycles = 20
+        self.port_register = "PIN%s"
+
     def place(self, pcb):
         pcb.place_pro_micro_on_keyboard_grid(self._part)
 
@@ -159,5 +195,10 @@ class BluePill(Mcu):
 
         self.usb_pin_nos = (29, 28)
 
+        # STM32F103, through ChibiOS's PAL.
+        self.clock_mhz = 72
+        self.pin_io_cycles = 30
+        self.port_register = "palReadPort(GPIO%s)"
+
     def place(self, pcb):
         pcb.place_blue_pill_on_keyboard_grid(self._part)
@@ -0,0 +1,171 @@
+'''
+netlist records a board's connectivity as it's built and writes it as a KiCad
+netlist without going through skidl.
+
+The model is a list of parts plus a union-find over terminals, where a
+terminal is either a part's pin or a named net. Connecting two terminals
+merges their nets, just as += does in skidl. When it's written, the model is
+flattened into net -> pin adjacency arrays.
+'''
+
+import array
+import re
+import time
+
+
+def natural_key(text):
+    '''Sorts K2 before K10.'''
+    return [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", text)]
+
+
+def quote(text):
+    return '"%s"' % str(text).replace("\\", "\\\\").replace('"', '\\"')
+
+
+class Netlist:
+    def __init__(self):
+        self._parts = []
+        self._libsources = []
+        self._part_indexes = {}
+
+        # Union-find over terminals. A terminal's node is an index into these.
+        self._parent = array.array('i')
+        self._node_pins = []
+        self._pin_nodes = {}
+        self._net_nodes = {}
+        self._names = {}
+
+    @property
+    def parts(self):
+        return self._parts
+
+    def add_part(self, part, lib, name):
+        '''
+        Records part, which must have ref, value and footprint attributes.
+        These are read only when the netlist is written, so they may still
+        change.
+        '''
+        self._part_indexes[id(part)] = len(self._parts)
+        self._parts.append(part)
+        self._libsources.append((lib, name))
+
+    def _new_node(self, pin=None):
+        node = len(self._parent)
+        self._parent.append(node)
+        self._node_pins.append(pin)
+        return node
+
+    def add_net(self, net, name):
+        '''Records net, an object that stands for the net called name.'''
+        node = self._new_node()
+        self._net_nodes[id(net)] = (net, node)
+        self._names[node] = name
+        return node
+
+    def _node(self, terminal):
+        entry = self._net_nodes.get(id(terminal))
+        if entry is not None:
+            return entry[1]
+        pin = (self._part_indexes[id(terminal.part)], str(terminal.num))
+        node = self._pin_nodes.get(pin)
+        if node is None:
+            node = self._new_node(pin)
+            self._pin_nodes[pin] = node
+        return node
+
+    def _find(self, node):
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def connect(self, terminal, *others):
+        '''
+        Connects others to terminal. Where both sides are already named, the
+        merged net keeps terminal's name.
+        '''
+        root = self._find(self._node(terminal))
+        for other in others:
+            other_root = self._find(self._node(other))
+            if other_root == root:
+                continue
+            self._parent[other_root] = root
+            other_name = self._names.pop(other_root, None)
+            if root not in self._names and other_name is not None:
+                self._names[root] = other_name
+
+    def rename(self, terminal, name):
+        self._names[self._find(self._node(terminal))] = name
+
+    def net_table(self):
+        '''
+        Returns the nets as (names, offsets, part_indexes, pin_nums), where
+        the pins of net i are part_indexes[offsets[i]:offsets[i + 1]] and the
+        same slice of pin_nums.
+        '''
+        members = {}
+        for node, pin in enumerate(self._node_pins):
+            if pin is not None:
+                members.setdefault(self._find(node), []).append(pin)
+
+        refs = [part.ref for part in self._parts]
+        nets = []
+        for root, pins in members.items():
+            name = self._names.get(root)
+            if name is None:
+                part_index, num = min(pins,
+                                      key=lambda p: natural_key(refs[p[0]]))
+                name = "Net-(%s-Pad%s)" % (refs[part_index], num)
+            pins.sort(
+                key=lambda p: (natural_key(refs[p[0]]), natural_key(p[1])))
+            nets.append((name, pins))
+        nets.sort(key=lambda n: natural_key(n[0]))
+
+        names = []
+        offsets = array.array('I', [0])
+        part_indexes = array.array('I')
+        pin_nums = []
+        for name, pins in nets:
+            names.append(name)
+            for part_index, num in pins:
+                part_indexes.append(part_index)
+                pin_nums.append(num)
+            offsets.append(len(part_indexes))
+        return names, offsets, part_indexes, pin_nums
+
+    def write(self, f, source=""):
+        '''Writes a KiCad (version D) netlist, as kinet2pcb reads, to f.'''
+        w = f.write
+        w("(export (version D)\n")
+        w("  (design\n")
+        w("    (source %s)\n" % quote(source))
+        w("    (date %s)\n" % quote(time.strftime("%m/%d/%Y %I:%M %p")))
+        w("    (tool \"keycad\"))\n")
+
+        w("  (components")
+        order = sorted(range(len(self._parts)),
+                       key=lambda i: natural_key(self._parts[i].ref))
+        for i in order:
+            part = self._parts[i]
+            lib, name = self._libsources[i]
+            w("\n    (comp (ref %s)\n" % quote(part.ref))
+            w("      (value %s)\n" % quote(part.value))
+            w("      (footprint %s)\n" % quote(part.footprint))
+            w("      (libsource (lib %s) (part %s))\n" %
+              (quote(lib), quote(name)))
+            w("      (sheetpath (names /) (tstamps /))\n")
+            w("      (tstamp %08X))" % (i + 1))
+        w(")\n")
+
+        w("  (nets")
+        names, offsets, part_indexes, pin_nums = self.net_table()
+        for code, name in enumerate(names):
+            w("\n    (net (code %d) (name %s)" % (code + 1, quote(name)))
+            for j in range(offsets[code], offsets[code + 1]):
+                w("\n      (node (ref %s) (pin %s))" % (quote(
+                    self._parts[part_indexes[j]].ref), quote(pin_nums[j])))
+            w(")")
+        w("))\n")
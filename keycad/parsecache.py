@@ -0,0 +1,163 @@
+'''
+parsecache remembers parsed KLE layouts so that unchanged files needn't be
+parsed again.
+
+Entries are keyed by a hash of the layout file's bytes and the parser version,
+stored in a compact binary form, and evicted least-recently-used first once the
+cache directory grows past its size cap.
+'''
+
+import array
+import hashlib
+import io
+import logging
+import os
+import struct
+import sys
+
+from keycad import diskcache, key
+from keycad.kle import Parser
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+ENTRY_SUFFIX = ".kle"
+
+# Bump when the layout of an entry changes.
+FORMAT_VERSION = 3
+MAGIC = b"KCPC"
+
+# magic, format version, key count, row count, max col count,
+# board left, top, right, bottom
+_HEADER = struct.Struct("<4sHIIIdddd")
+
+# After the header come the KeyTable columns as little-endian arrays, in this
+# order, followed by the UTF-8 key texts back to back.
+_COLUMN_TYPES = ('d', 'd', 'd', 'd', 'b', 'd', 'd', 'd', 'I')
+
+
+def default_cache_dir():
+    return diskcache.default_cache_dir("kle")
+
+
+def _to_little_endian(column):
+    if sys.byteorder == "big":
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def serialize(parser):
+    columns = parser.key_table.parsed_columns()
+    labels = columns[0]
+    texts = ["\n".join(l).encode("utf-8") for l in labels]
+    text_lengths = array.array('I', (len(t) for t in texts))
+    chunks = [
+        _HEADER.pack(MAGIC, FORMAT_VERSION, parser.key_count, parser.row_count,
+                     parser.max_col_count, parser.board_left, parser.board_top,
+                     parser.board_right, parser.board_bottom)
+    ]
+    for column in columns[1:] + (text_lengths, ):
+        chunks.append(_to_little_endian(column))
+    chunks.extend(texts)
+    return b"".join(chunks)
+
+
+def deserialize(data, parser):
+    (magic, version, key_count, row_count, max_col_count, left, top, right,
+     bottom) = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("not a keycad parse cache entry")
+    offset = _HEADER.size
+    columns = []
+    for typecode in _COLUMN_TYPES:
+        column = array.array(typecode)
+        size = column.itemsize * key_count
+        if offset + size > len(data):
+            raise ValueError("truncated parse cache entry")
+        column.frombytes(data[offset:offset + size])
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column)
+        offset += size
+    text_lengths = columns.pop()
+    labels = []
+    for text_len in text_lengths:
+        labels.append(data[offset:offset +
+                           text_len].decode("utf-8").split("\n"))
+        offset += text_len
+    if offset != len(data):
+        raise ValueError("parse cache entry has the wrong length")
+    table = key.KeyTable.from_parsed_columns(labels, *columns)
+    parser.restore(table, row_count, max_col_count, left, top, right, bottom)
+
+
+class ParseCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def digest(self, data):
+        h = hashlib.sha256()
+        h.update(b"%d:%d:" % (Parser.VERSION, FORMAT_VERSION))
+        h.update(data)
+        return h.hexdigest()
+
+    def _entry_path(self, digest):
+        return os.path.join(self._cache_dir, digest + ENTRY_SUFFIX)
+
+    def load(self, parser, filename):
+        '''
+        Fills parser from the cache if filename's contents have been seen
+        before, and otherwise parses the file and caches the result. Returns
+        True on a cache hit.
+        '''
+        with open(filename, "rb") as f:
+            data = f.read()
+        path = self._entry_path(self.digest(data))
+
+        if self._read_entry(path, parser):
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        parser.load_from_file(io.StringIO(data.decode("utf-8")))
+        self._write_entry(path, parser)
+        return False
+
+    def _read_entry(self, path, parser):
+        try:
+            with open(path, "rb") as f:
+                deserialize(f.read(), parser)
+        except OSError:
+            return False
+        except (ValueError, struct.error, UnicodeDecodeError):
+            logger.warning("discarding corrupt parse cache entry %s", path)
+            diskcache.remove(path)
+            return False
+        diskcache.touch(path)
+        return True
+
+    def _write_entry(self, path, parser):
+        # The cache only ever saves time, so it mustn't fail a build.
+        try:
+            diskcache.write_atomically(path, serialize(parser))
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("couldn't write parse cache entry: %s", e)
+            return
+        try:
+            self.evict()
+        except OSError as e:
+            logger.warning("couldn't evict parse cache entries: %s", e)
+
+    def evict(self):
+        diskcache.evict(self._cache_dir, ENTRY_SUFFIX, self._max_bytes)
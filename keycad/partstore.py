@@ -1,6 +1,16 @@
-import skidl
+import logging
+import os
+import threading
 from enum import Enum
 
+import skidl
+
+from keycad import netlist
+from keycad import symbolcache
+from keycad import trace
+
+logger = logging.getLogger(__name__)
+
 
 class _Part(Enum):
     BluePill = ("STM32 Development Board 'Blue Pill'", )
@@ -33,11 +43,141 @@ class _RefType(Enum):
     Connector = 7
 
 
+# KiCad 5 pin electrical types, as they appear in .lib files.
+_PIN_TYPES = {
+    "I": skidl.Pin.types.INPUT,
+    "O": skidl.Pin.types.OUTPUT,
+    "B": skidl.Pin.types.BIDIR,
+    "T": skidl.Pin.types.TRISTATE,
+    "P": skidl.Pin.types.PASSIVE,
+    "U": skidl.Pin.types.UNSPEC,
+    "W": skidl.Pin.types.PWRIN,
+    "w": skidl.Pin.types.PWROUT,
+    "C": skidl.Pin.types.OPENCOLL,
+    "E": skidl.Pin.types.OPENEMIT,
+    "N": skidl.Pin.types.NOCONNECT,
+}
+
+
+def _find_library(lib):
+    search_paths = skidl.lib_search_paths.get(skidl.get_default_tool(), [])
+    for directory in ["."] + list(search_paths):
+        path = os.path.join(directory, lib + ".lib")
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class TemplateCache:
+    '''
+    Library parts, loaded once per symbol and footprint.
+
+    Instantiating a skidl.Part from the library is far slower than copying an
+    existing part, and a board needs several parts per key. Templates never
+    belong to a circuit, so one cache can serve every board built in the
+    process.
+
+    Where the symbol cache has the library's pin tables, templates are built
+    from those rather than having skidl parse the library.
+    '''
+    def __init__(self, symbol_cache=None):
+        self.symbol_cache = symbol_cache
+        self._templates = {}
+        self._libraries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._templates)
+
+    def get(self, lib, name, footprint):
+        key = (lib, name, footprint)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                self.misses += 1
+                template = self._make_template(lib, name, footprint)
+                self._templates[key] = template
+            else:
+                self.hits += 1
+        return template
+
+    def _make_template(self, lib, name, footprint):
+        symbol = None
+        path = None
+        if self.symbol_cache is not None:
+            path = _find_library(lib)
+            if path is None:
+                logger.warning(
+                    "%s.lib isn't in . or the library search paths, so skidl "
+                    "will load %s itself", lib, name)
+            else:
+                symbol = self.symbol_cache.load(path).get(name)
+                if symbol is None:
+                    logger.warning("%s isn't in %s, so skidl will load it",
+                                   name, path)
+        if symbol is None:
+            return skidl.Part(lib, name, skidl.TEMPLATE, footprint=footprint)
+        pins = [
+            skidl.Pin(num=p.num, name=p.name, func=_PIN_TYPES[p.etype])
+            for p in symbol.pins
+        ]
+        template = skidl.Part(name=name,
+                              tool=skidl.SKIDL,
+                              dest=skidl.TEMPLATE,
+                              ref_prefix=symbol.ref_prefix,
+                              footprint=footprint,
+                              pins=pins)
+        # The netlist's libsource comes from the part's library, so give it
+        # one named as skidl would have named the library it loaded.
+        template.lib = self._library(lib, path)
+        return template
+
+    def _library(self, lib, path):
+        '''An empty library standing in for lib, which was read from path.'''
+        library = self._libraries.get(lib)
+        if library is None:
+            library = skidl.SchLib(tool=skidl.SKIDL)
+            library.filename = lib
+            library.path = path
+            self._libraries[lib] = library
+        return library
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._libraries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_template_cache = TemplateCache(symbolcache.SymbolCache())
+
+
+def get_template_cache():
+    return _template_cache
+
+
 class PartStore:
-    def __init__(self):
+    def __init__(self, circuit=None):
+        # Every part goes into this store's own circuit rather than skidl's
+        # global default, so that several boards can be built in one process.
+        if circuit is None:
+            circuit = skidl.Circuit()
+        self._circuit = circuit
+        self._netlist = netlist.Netlist()
         self._parts = {}
 
-        self._partno = [1, 1, 1, 1, 1, 1, 1, 1]
+        self._partno = [1] * len(_RefType)
+
+    @property
+    def circuit(self):
+        return self._circuit
+
+    @property
+    def netlist(self):
+        return self._netlist
 
     @property
     def parts(self):
@@ -70,6 +210,12 @@ class PartStore:
         self._partno[ref_type.value] += 1
         return val
 
+    def _new_part(self, name, footprint):
+        template = _template_cache.get('keycad', name, footprint)
+        part = template.copy(circuit=self._circuit)
+        self._netlist.add_part(part, 'keycad', name)
+        return part
+
     def record_part(self, part_key):
         if not isinstance(part_key, _Part):
             raise ValueError("%s is not a _Part enum" % (part_key))
@@ -79,30 +225,27 @@ class PartStore:
         else:
             self._parts[name] = 1
 
+    @trace.traced("PartStore.get_mcu")
     def get_mcu(self, mcu_type):
         if not isinstance(mcu_type, McuType):
             raise ValueError("%s is not a Mcu enum" % (mcu_type))
         if mcu_type == McuType.ProMicro:
             self.record_part(_Part.ProMicro)
-            part = skidl.Part('keycad',
-                              'ProMicro',
-                              skidl.NETLIST,
-                              footprint='keycad:ArduinoProMicro')
+            part = self._new_part('ProMicro', 'keycad:ArduinoProMicro')
             part.ref = self.assign_ref(_RefType.IC)
             part.value = 'Pro Micro'
             return part
 
         if mcu_type == McuType.BluePill:
             self.record_part(_Part.BluePill)
-            part = skidl.Part('keycad',
-                              'BluePill_STM32F103C',
-                              skidl.NETLIST,
-                              footprint='keycad:BluePill_STM32F103C')
+            part = self._new_part('BluePill_STM32F103C',
+                                  'keycad:BluePill_STM32F103C')
             part.ref = self.assign_ref(_RefType.IC)
             part.value = 'Blue Pill'
             return part
         raise ValueError("MCU type %s not implemented" % mcu_type)
 
+    @trace.traced("PartStore.get_keyswitch")
     def get_keyswitch(self, value, is_mx, is_hotswap):
         if is_mx:
             switch_type = "MX"
@@ -123,29 +266,22 @@ class PartStore:
             if is_hotswap:
                 self.record_part(_Part.Pg1350Kailh)
 
-        part = skidl.Part('keycad',
-                          'KEYSW',
-                          skidl.NETLIST,
-                          footprint=footprint)
+        part = self._new_part('KEYSW', footprint)
         part.ref = self.assign_ref(_RefType.Keyswitch)
         part.value = value
         return part
 
+    @trace.traced("PartStore.get_per_key_rgb_led")
     def get_per_key_rgb_led(self):
         self.record_part(_Part.Sk6812MiniE)
-        part = skidl.Part('keycad',
-                          'SK6812MINI-E',
-                          skidl.NETLIST,
-                          footprint='keycad:SK6812-MINI-E-BOTTOM')
+        part = self._new_part('SK6812MINI-E', 'keycad:SK6812-MINI-E-BOTTOM')
         part.ref = self.assign_ref(_RefType.LED)
         part.value = "SK6812MINI-E"
         return part
 
+    @trace.traced("PartStore.get_capacitor")
     def get_capacitor(self, value):
-        part = skidl.Part('keycad',
-                          'C',
-                          skidl.NETLIST,
-                          footprint='keycad:C_0805_2012Metric')
+        part = self._new_part('C', 'keycad:C_0805_2012Metric')
         if value == "0.1uF":
             self.record_part(_Part.C0UF1)
             part.value = value
@@ -154,21 +290,17 @@ class PartStore:
         part.ref = self.assign_ref(_RefType.Capacitor)
         return part
 
+    @trace.traced("PartStore.get_diode")
     def get_diode(self):
         self.record_part(_Part.D1N4148)
-        part = skidl.Part('keycad',
-                          'D',
-                          skidl.NETLIST,
-                          footprint='keycad:D_0805')
+        part = self._new_part('D', 'keycad:D_0805')
         part.ref = self.assign_ref(_RefType.Diode)
         part.value = "1N4148"
         return part
 
+    @trace.traced("PartStore.get_resistor")
     def get_resistor(self, value):
-        part = skidl.Part('keycad',
-                          'R',
-                          skidl.NETLIST,
-                          footprint='keycad:R_0805_2012Metric')
+        part = self._new_part('R', 'keycad:R_0805_2012Metric')
         if value == "5K1":
             self.record_part(_Part.R5K1)
             part.value = value
@@ -177,23 +309,19 @@ class PartStore:
         part.ref = self.assign_ref(_RefType.Resistor)
         return part
 
+    @trace.traced("PartStore.get_reset_switch")
     def get_reset_switch(self):
         self.record_part(_Part.SWSKQG)
-        part = skidl.Part('keycad',
-                          'SW_Push',
-                          skidl.NETLIST,
-                          footprint='keycad:SW_SPST_SKQG_WithoutStem')
+        part = self._new_part('SW_Push', 'keycad:SW_SPST_SKQG_WithoutStem')
         part.ref = self.assign_ref(_RefType.Switch)
         part.value = 'SKQGAKE010'
         return part
 
+    @trace.traced("PartStore.get_usb_c_connector")
     def get_usb_c_connector(self):
         self.record_part(_Part.USB_HRO_C31M14)
-        part = skidl.Part(
-            'keycad',
-            'USB_C_Receptacle_USB2.0',
-            skidl.NETLIST,
-            footprint='keycad:USB_C_Receptacle_HRO_TYPE-C-31-M-14')
+        part = self._new_part('USB_C_Receptacle_USB2.0',
+                              'keycad:USB_C_Receptacle_HRO_TYPE-C-31-M-14')
         part.ref = self.assign_ref(_RefType.Connector)
         part.value = 'TYPE-C-31-M-14'
         return part
@@ -1,4 +1,7 @@
 import json
+import math
+
+from keycad.collisions import CollisionChecker
 
 KC_TO_MM = 1000000
 
@@ -20,6 +23,7 @@ class Pcb:
         self._reset_key_attributes()
 
         self.__kinjector_json = {"board": {"modules": {}}}
+        self.__collisions = CollisionChecker()
 
     @property
     def kinjector_dict(self):
@@ -38,6 +42,14 @@ class Pcb:
             return m[part_ref]['position']
         return None
 
+    def get_placement(self, part_ref):
+        '''(x, y, angle, side) of a part this Pcb placed, or None.'''
+        entry = self.__kinjector_json.get(part_ref)
+        if entry is None or 'position' not in entry:
+            return None
+        p = entry['position']
+        return (p['x'], p['y'], p['angle'], p['side'])
+
     def maybe_override_position(self, part, x, y, angle, side):
         m = self.__kinjector_json['board']['modules']
         if part.ref in m and 'position' in m[part.ref]:
@@ -73,6 +85,23 @@ class Pcb:
                 'side': side
             }
         }
+        footprint = getattr(part, "footprint", None)
+        if footprint:
+            self.__collisions.place(part.ref, footprint, x / KC_TO_MM,
+                                    y / KC_TO_MM, angle, side)
+
+    @property
+    def collisions(self):
+        return self.__collisions
+
+    def place_component(self, part, x_mm, y_mm, angle, side):
+        '''Places part at board coordinates rather than on the key grid.'''
+        self._inject_component(part, x_mm * KC_TO_MM, y_mm * KC_TO_MM, angle,
+                               side)
+
+    def find_collisions(self):
+        '''Parts placed so far whose footprints overlap.'''
+        return self.__collisions.find_collisions()
 
     def convert_keyboard_grid_to_kicad_units(self, x, y, x_offset, y_offset):
         return ((x * self.__mx_key_width + x_offset) * KC_TO_MM,
@@ -85,7 +114,17 @@ class Pcb:
                                          angle,
                                          side,
                                          x_offset=0,
-                                         y_offset=0):
+                                         y_offset=0,
+                                         rotation=0):
+        # rotation is a KLE-style clockwise rotation of the whole key, which
+        # swings the offset around the key centre. KiCad angles run
+        # counterclockwise.
+        if rotation:
+            theta = math.radians(rotation)
+            cos, sin = math.cos(theta), math.sin(theta)
+            (x_offset, y_offset) = (x_offset * cos - y_offset * sin,
+                                    x_offset * sin + y_offset * cos)
+            angle = (angle - rotation) % 360
         (x, y) = self.convert_keyboard_grid_to_kicad_units(
             x, y, x_offset, y_offset)
         (x, y, angle,
@@ -101,7 +140,8 @@ class Pcb:
                                               0,
                                               'top',
                                               x_offset=x_offset,
-                                              y_offset=y_offset)
+                                              y_offset=y_offset,
+                                              rotation=key.rotation)
 
     def place_led_on_keyboard_grid(self, part, key):
         (x, y) = key.position
@@ -112,7 +152,8 @@ class Pcb:
                                               0,
                                               'bottom',
                                               x_offset=x_offset,
-                                              y_offset=y_offset)
+                                              y_offset=y_offset,
+                                              rotation=key.rotation)
 
     def place_led_capacitor_on_keyboard_grid(self, part, key):
         (x, y) = key.position
@@ -123,7 +164,8 @@ class Pcb:
                                               270,
                                               'bottom',
                                               x_offset=x_offset,
-                                              y_offset=y_offset)
+                                              y_offset=y_offset,
+                                              rotation=key.rotation)
 
     def place_diode_on_keyboard_grid(self, part, key):
         (x, y) = key.position
@@ -134,7 +176,8 @@ class Pcb:
                                               270,
                                               'bottom',
                                               x_offset=x_offset,
-                                              y_offset=y_offset)
+                                              y_offset=y_offset,
+                                              rotation=key.rotation)
 
     def place_pro_micro_on_keyboard_grid(self, part):
         self.place_component_on_keyboard_grid(part, 10, 3, 0, 'top')
@@ -0,0 +1,278 @@
+'''
+pcbwriter writes a .kicad_pcb straight from a board's netlist model and its
+placements, without kinet2pcb or kinjector.
+
+Footprints come parsed from keycad.footprints. Each is copied, flipped to the
+bottom side if need be, rotated and given its pads' nets as it's placed.
+'''
+
+from keycad import sexpr
+from keycad.footprints import get_footprint_library
+from keycad.netlist import natural_key
+
+# KiCad internal units (nanometres) per millimetre.
+KC_TO_MM = 1000000
+
+BOARD_VERSION = "20171130"
+
+_LAYERS = [
+    (0, "F.Cu", "signal"),
+    (31, "B.Cu", "signal"),
+    (32, "B.Adhes", "user"),
+    (33, "F.Adhes", "user"),
+    (34, "B.Paste", "user"),
+    (35, "F.Paste", "user"),
+    (36, "B.SilkS", "user"),
+    (37, "F.SilkS", "user"),
+    (38, "B.Mask", "user"),
+    (39, "F.Mask", "user"),
+    (40, "Dwgs.User", "user"),
+    (41, "Cmts.User", "user"),
+    (42, "Eco1.User", "user"),
+    (43, "Eco2.User", "user"),
+    (44, "Edge.Cuts", "user"),
+    (45, "Margin", "user"),
+    (46, "B.CrtYd", "user"),
+    (47, "F.CrtYd", "user"),
+    (48, "B.Fab", "user"),
+    (49, "F.Fab", "user"),
+]
+
+_SETUP = [
+    ["last_trace_width", "0.25"],
+    ["trace_clearance", "0.2"],
+    ["zone_clearance", "0.508"],
+    ["zone_45_only", "no"],
+    ["trace_min", "0.2"],
+    ["via_size", "0.8"],
+    ["via_drill", "0.4"],
+    ["via_min_size", "0.4"],
+    ["via_min_drill", "0.3"],
+    ["uvia_size", "0.3"],
+    ["uvia_drill", "0.1"],
+    ["uvias_allowed", "no"],
+    ["uvia_min_size", "0.2"],
+    ["uvia_min_drill", "0.1"],
+    ["edge_width", "0.05"],
+    ["segment_width", "0.2"],
+    ["pcb_text_width", "0.3"],
+    ["pcb_text_size", "1.5", "1.5"],
+    ["mod_edge_width", "0.12"],
+    ["mod_text_size", "1", "1"],
+    ["mod_text_width", "0.15"],
+    ["pad_size", "1.524", "1.524"],
+    ["pad_drill", "0.762"],
+    ["pad_to_mask_clearance", "0.051"],
+    ["aux_axis_origin", "0", "0"],
+    ["visible_elements", "FFFFFF7F"],
+]
+
+_NET_CLASS = [
+    "net_class", "Default",
+    sexpr.Quoted("This is the default net class."), ["clearance", "0.2"],
+    ["trace_width", "0.25"], ["via_dia", "0.8"], ["via_drill", "0.4"],
+    ["uvia_dia", "0.3"], ["uvia_drill", "0.1"]
+]
+
+
+def flip_layer(layer):
+    if layer.startswith("F."):
+        return "B." + layer[2:]
+    if layer.startswith("B."):
+        return "F." + layer[2:]
+    return layer
+
+
+def _copy(expr):
+    # Atoms are immutable, so only the lists need copying. Much faster than
+    # copy.deepcopy().
+    return [_copy(e) if isinstance(e, list) else e for e in expr]
+
+
+def _number(value):
+    return float(value)
+
+
+def _negate(value):
+    return sexpr.format_number(-_number(value))
+
+
+def _flip_item(item):
+    '''Mirrors a footprint item top to bottom, in place.'''
+    keyword = item[0]
+    for child in item[1:]:
+        if not isinstance(child, list) or not child:
+            continue
+        if child[0] == "layer":
+            child[1] = flip_layer(child[1])
+        elif child[0] == "layers":
+            child[1:] = [flip_layer(l) for l in child[1:]]
+        elif child[0] in ("at", "start", "end", "center"):
+            child[2] = _negate(child[2])
+            if child[0] == "at" and len(child) >= 4:
+                child[3] = _negate(child[3])
+        elif child[0] == "angle" and keyword in ("fp_arc", "gr_arc"):
+            child[1] = _negate(child[1])
+        elif child[0] == "pts":
+            for xy in child[1:]:
+                xy[2] = _negate(xy[2])
+        elif child[0] == "drill":
+            offset = sexpr.find(child, "offset")
+            if offset is not None:
+                offset[2] = _negate(offset[2])
+        elif child[0] == "primitives":
+            for primitive in child[1:]:
+                _flip_item(primitive)
+
+
+def _set_mirrored(text_item, mirrored):
+    effects = sexpr.find(text_item, "effects")
+    if effects is None:
+        effects = ["effects"]
+        text_item.append(effects)
+    justify = sexpr.find(effects, "justify")
+    if justify is None:
+        justify = ["justify"]
+        effects.append(justify)
+    justify[1:] = [j for j in justify[1:] if j != "mirror"]
+    if mirrored:
+        justify.append("mirror")
+    if len(justify) == 1:
+        effects.remove(justify)
+
+
+def _rotate_at(item, angle):
+    # Pads and texts are saved with absolute angles, everything else relative
+    # to the module.
+    at = sexpr.find(item, "at")
+    if at is None or not angle:
+        return
+    local = _number(at[3]) if len(at) >= 4 else 0
+    total = (local + angle) % 360
+    at[3:] = [sexpr.format_number(total)] if total else []
+
+
+def place_footprint(module,
+                    footprint,
+                    ref,
+                    value,
+                    x_mm,
+                    y_mm,
+                    angle=0,
+                    side="top",
+                    pad_nets=None,
+                    tstamp=None):
+    '''
+    Returns a copy of the parsed footprint module placed on the board.
+    pad_nets maps pad numbers to (net code, net name).
+    '''
+    module = _copy(module)
+    module[1] = footprint
+    bottom = side == "bottom"
+
+    items = []
+    for item in module[2:]:
+        if not isinstance(item, list) or not item:
+            items.append(item)
+            continue
+        keyword = item[0]
+        if keyword == "layer":
+            if bottom:
+                item[1] = flip_layer(item[1])
+        elif keyword in ("at", "path", "tstamp"):
+            # Set below.
+            continue
+        elif bottom and keyword in ("fp_text", "fp_line", "fp_circle",
+                                    "fp_arc", "fp_poly", "pad"):
+            _flip_item(item)
+
+        if keyword == "fp_text":
+            if item[1] == "reference":
+                item[2] = ref
+            elif item[1] == "value":
+                item[2] = value
+            if bottom:
+                layer = sexpr.find(item, "layer")
+                _set_mirrored(item, layer is not None
+                              and layer[1].startswith("B."))
+            _rotate_at(item, angle)
+        elif keyword == "pad":
+            _rotate_at(item, angle)
+            net = (pad_nets or {}).get(str(item[1]))
+            if net is not None:
+                item.append(["net", str(net[0]), sexpr.Quoted(net[1])])
+        items.append(item)
+
+    at = ["at", sexpr.format_number(x_mm), sexpr.format_number(y_mm)]
+    if angle % 360:
+        at.append(sexpr.format_number(angle % 360))
+    header = []
+    if tstamp is not None:
+        header.append(["tstamp", tstamp])
+    header.append(at)
+    if tstamp is not None:
+        header.append(["path", "/" + tstamp])
+
+    # Keep layer and tedit first, as KiCad does.
+    lead = []
+    rest = []
+    for item in items:
+        if isinstance(item, list) and item[0] in ("layer", "tedit"):
+            lead.append(item)
+        else:
+            rest.append(item)
+    return module[:2] + lead + header + rest
+
+
+def write_board(f, netlist, pcb, footprints=None):
+    '''
+    Writes a KiCad 5 board to f with a module for every part in netlist,
+    placed where pcb put it. Parts that pcb didn't place go at the origin,
+    as kinet2pcb leaves them.
+    '''
+    if footprints is None:
+        footprints = get_footprint_library()
+    names, offsets, part_indexes, pin_nums = netlist.net_table()
+    parts = netlist.parts
+
+    # Net 0 is KiCad's "no net".
+    pad_nets = [{} for _ in parts]
+    for code, name in enumerate(names):
+        for j in range(offsets[code], offsets[code + 1]):
+            pad_nets[part_indexes[j]][pin_nums[j]] = (code + 1, name)
+
+    w = f.write
+    w("(kicad_pcb (version %s) (host keycad 0)\n" % BOARD_VERSION)
+    w("\n  (general\n    (thickness 1.6)\n  )\n")
+    w("\n  (page A4)\n  (layers\n")
+    for number, name, kind in _LAYERS:
+        w("    (%d %s %s)\n" % (number, name, kind))
+    w("  )\n\n")
+    w("  " + sexpr.dumps(["setup"] + _SETUP, indent=1) + "\n\n")
+    w("  (net 0 \"\")\n")
+    for code, name in enumerate(names):
+        w("  (net %d %s)\n" % (code + 1, sexpr.quote(name)))
+    w("\n  " + sexpr.dumps(
+        _NET_CLASS + [["add_net", sexpr.Quoted(n)]
+                      for n in names], indent=1) + "\n")
+
+    order = sorted(range(len(parts)), key=lambda i: natural_key(parts[i].ref))
+    for i in order:
+        part = parts[i]
+        placement = pcb.get_placement(part.ref)
+        if placement is None:
+            x, y, angle, side = 0, 0, 0, "top"
+        else:
+            x, y, angle, side = placement
+        module = place_footprint(footprints.get(part.footprint),
+                                 part.footprint,
+                                 part.ref,
+                                 part.value,
+                                 x / KC_TO_MM,
+                                 y / KC_TO_MM,
+                                 angle=angle,
+                                 side=side,
+                                 pad_nets=pad_nets[i],
+                                 tstamp="%08X" % (i + 1))
+        w("\n  " + sexpr.dumps(module, indent=1, inline_depth=1) + "\n")
+    w(")\n")
@@ -0,0 +1,226 @@
+'''
+placement finds room on the board for the parts that don't belong to a key:
+the MCU, its reset switch, the USB-C connector and the connector's CC
+resistors.
+
+A part is tried at every point of a grid over the board, at each of four
+angles, on the side it's already on. Candidates whose bounding boxes would
+leave the board or run into a part already placed are masked out, and the
+rest are scored by estimated wirelength, the sum of the half-perimeters of
+the boxes around each of the part's nets. Each net's other pins are boiled
+down to one box beforehand, so scoring is a few numpy operations over a
+candidates by nets array, and a whole board's worth of candidates takes
+milliseconds. The cheapest candidate is then checked exactly against the
+Pcb's CollisionChecker.
+'''
+
+import math
+
+import numpy as np
+
+from keycad.collisions import placed_shapes
+from keycad.footprints import get_footprint_index, to_board
+from keycad.pcb import KC_TO_MM
+
+# 0.05", which divides the 0.75" MX key pitch evenly, so that a part can line
+# up with a row of keys.
+STEP_MM = 1.27
+ANGLES = (0, 90, 180, 270)
+
+_EPSILON_MM = 1e-6
+
+
+def _bbox(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _grid(low, high, step):
+    '''Multiples of step from low to high.'''
+    first = math.ceil(low / step - _EPSILON_MM)
+    last = math.floor(high / step + _EPSILON_MM)
+    return np.arange(first, last + 1) * step
+
+
+def wirelength(xs, ys, fixed, moving):
+    '''
+    Estimated wirelength with a part's origin at each (xs[i], ys[i]).
+
+    fixed is a (nets, 4) array of the boxes (left, top, right, bottom) around
+    each net's other pins, with inf and -inf for a net that has none. moving
+    is the same around the part's own pins on each net, relative to its
+    origin.
+    '''
+    x = xs[:, None]
+    y = ys[:, None]
+    width = (np.maximum(fixed[:, 2], x + moving[:, 2]) -
+             np.minimum(fixed[:, 0], x + moving[:, 0]))
+    height = (np.maximum(fixed[:, 3], y + moving[:, 3]) -
+              np.minimum(fixed[:, 1], y + moving[:, 1]))
+    return (width + height).sum(axis=1)
+
+
+class Placer:
+    '''
+    Places parts on pcb, whose netlist must be complete, inside outline
+    (left, top, right, bottom) in millimetres.
+    '''
+    def __init__(self, pcb, netlist, outline, index=None, step_mm=STEP_MM):
+        self._pcb = pcb
+        self._outline = outline
+        self._index = index or get_footprint_index()
+        self._step = step_mm
+        self._parts = {part.ref: part for part in netlist.parts}
+
+        names, offsets, part_indexes, pin_nums = netlist.net_table()
+        self._nets = {}
+        for i, name in enumerate(names):
+            self._nets[name] = [(netlist.parts[part_indexes[j]].ref,
+                                 pin_nums[j])
+                                for j in range(offsets[i], offsets[i + 1])]
+
+    @property
+    def outline(self):
+        return self._outline
+
+    @property
+    def net_names(self):
+        return list(self._nets)
+
+    def _pad_points(self, ref, num):
+        '''Board positions of the pads of ref's pin num.'''
+        placement = self._pcb.get_placement(ref)
+        if placement is None:
+            return []
+        x, y, angle, side = placement
+        geometry = self._index.get(self._parts[ref].footprint)
+        return to_board([(p.x, p.y) for p in geometry.pads if p.number == num],
+                        x / KC_TO_MM, y / KC_TO_MM, angle, side)
+
+    def _net_boxes(self, ref, geometry, nets, angles, side):
+        '''
+        The fixed array, and the moving array at each of angles, for the
+        nets that ref is on.
+        '''
+        fixed = []
+        moving = {angle: [] for angle in angles}
+        for name in nets:
+            pins = self._nets.get(name, ())
+            nums = {num for pin_ref, num in pins if pin_ref == ref}
+            if not nums:
+                continue
+            others = []
+            for pin_ref, num in pins:
+                if pin_ref != ref:
+                    others += self._pad_points(pin_ref, num)
+            if others:
+                fixed.append(_bbox(others))
+            else:
+                fixed.append((math.inf, math.inf, -math.inf, -math.inf))
+            own = [(p.x, p.y) for p in geometry.pads if p.number in nums]
+            for angle in angles:
+                moving[angle].append(_bbox(to_board(own, 0, 0, angle, side)))
+        return (np.array(fixed).reshape(-1, 4), {
+            a: np.array(m).reshape(-1, 4)
+            for a, m in moving.items()
+        })
+
+    def _candidates(self, ref, geometry, angle, side, y_mm, edge_y_mm):
+        '''
+        (xs, ys) of the grid points where the part's bounding boxes stay on
+        the board and clear of every other part's. With edge_y_mm, the part
+        may hang over the board's edge, and ys runs outwards from it.
+        '''
+        shapes = placed_shapes(geometry, 0, 0, angle, side)
+        boxes = {
+            s: _bbox([p for polygon in polygons for p in polygon])
+            for s, polygons in shapes.items() if polygons
+        }
+        left, top, right, bottom = _bbox(
+            [p for box in boxes.values() for p in (box[:2], box[2:])])
+        o_left, o_top, o_right, o_bottom = self._outline
+        xs = _grid(o_left - left, o_right - right, self._step)
+        low, high = o_top - top, o_bottom - bottom
+        if edge_y_mm is not None:
+            # Up to a step at a time beyond the edge, until the part is clear
+            # of the board, in ascending order for searchsorted().
+            steps = math.ceil((bottom - top) / self._step - _EPSILON_MM)
+            ys = edge_y_mm - np.arange(steps, -1, -1) * self._step
+        elif y_mm is None:
+            ys = _grid(low, high, self._step)
+        elif low - _EPSILON_MM <= y_mm <= high + _EPSILON_MM:
+            ys = np.array([y_mm])
+        else:
+            ys = np.array([])
+
+        blocked = np.zeros((len(ys), len(xs)), dtype=bool)
+        checker = self._pcb.collisions
+        for s, (left, top, right, bottom) in boxes.items():
+            obstacles = np.array(checker.boxes(s, exclude=ref)).reshape(-1, 4)
+            # The part's box at (x, y) overlaps an obstacle's exactly when
+            # (x, y) is inside the obstacle grown by the part's box.
+            i0 = np.searchsorted(xs, obstacles[:, 0] - right + _EPSILON_MM,
+                                 "right")
+            i1 = np.searchsorted(xs, obstacles[:, 2] - left - _EPSILON_MM,
+                                 "left")
+            j0 = np.searchsorted(ys, obstacles[:, 1] - bottom + _EPSILON_MM,
+                                 "right")
+            j1 = np.searchsorted(ys, obstacles[:, 3] - top - _EPSILON_MM,
+                                 "left")
+            for k in np.nonzero((i0 < i1) & (j0 < j1))[0]:
+                blocked[j0[k]:j1[k], i0[k]:i1[k]] = True
+        jj, ii = np.nonzero(~blocked)
+        return xs[ii], ys[jj]
+
+    def place(self, part, nets, angles=ANGLES, y_mm=None, edge_y_mm=None):
+        '''
+        Moves part to where its pins on nets are closest to the rest of
+        those nets, without leaving the board or overlapping another part,
+        and returns its new (x_mm, y_mm, angle). If y_mm is given, only
+        positions at that height are tried.
+
+        If edge_y_mm is given, the part's origin goes on that line, which is
+        normally the board's top edge, or as little above it as leaves room.
+        Either way the part can hang over the edge.
+
+        Returns None, leaving part where it was, if there's no room.
+        '''
+        placement = self._pcb.get_placement(part.ref)
+        if placement is None:
+            raise ValueError("%s hasn't been placed" % part.ref)
+        x, y, angle, side = placement
+        geometry = self._index.get(part.footprint)
+        fixed, moving = self._net_boxes(part.ref, geometry, nets, angles, side)
+
+        costs, xs, ys, candidate_angles = [], [], [], []
+        for a in angles:
+            cx, cy = self._candidates(part.ref, geometry, a, side, y_mm,
+                                      edge_y_mm)
+            costs.append(wirelength(cx, cy, fixed, moving[a]))
+            xs.append(cx)
+            ys.append(cy)
+            candidate_angles.append(np.full(len(cx), a))
+        xs, ys, candidate_angles = (np.concatenate(xs), np.concatenate(ys),
+                                    np.concatenate(candidate_angles))
+
+        costs = np.concatenate(costs)
+        if edge_y_mm is None:
+            ranked = np.argsort(costs, kind="stable")
+        else:
+            # The less it overhangs the better, whatever the wirelength.
+            ranked = np.lexsort((costs, np.round(
+                (edge_y_mm - ys) / self._step)))
+
+        # Bounding boxes only ever overstate a part, so the cheapest
+        # candidate almost always passes the exact check.
+        checker = self._pcb.collisions
+        for k in ranked:
+            cx, cy, a = float(xs[k]), float(ys[k]), int(candidate_angles[k])
+            checker.place(part.ref, part.footprint, cx, cy, a, side)
+            if not checker.collisions_with(part.ref):
+                self._pcb.place_component(part, cx, cy, a, side)
+                return (cx, cy, a)
+        checker.place(part.ref, part.footprint, x / KC_TO_MM, y / KC_TO_MM,
+                      angle, side)
+        return None
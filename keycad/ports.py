@@ -0,0 +1,95 @@
+'''
+ports decides which MCU pins the key matrix's columns go on.
+
+With COL2ROW diodes, QMK reads every column once for each row it drives.
+IN_ORDER takes the MCU's GPIOs in the order it lists them, which scatters the
+columns over several ports and means one pin read per column. BY_PORT packs
+the columns onto as few ports as it can, in runs of neighbouring bits, so that
+a custom matrix can read them a whole port register at a time and shift each
+run into place.
+
+Pins are named after their port and bit, such as B4 for PB4. Pins that aren't,
+such as the Blue Pill's LED1, are never packed, and each of them is read on
+its own.
+'''
+
+import re
+
+IN_ORDER = "in_order"
+BY_PORT = "by_port"
+STRATEGIES = (IN_ORDER, BY_PORT)
+
+_PIN_NAME = re.compile(r"^([A-Z])(\d+)$")
+
+
+def pin_port(name):
+    '''(port, bit) of the pin called name, or None if it isn't a port pin.'''
+    match = _PIN_NAME.match(name)
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def _tightest(pins, count):
+    '''The count of pins, sorted by bit, whose bits span the least.'''
+    start = min(range(len(pins) - count + 1),
+                key=lambda i: pins[i + count - 1][2] - pins[i][2])
+    return pins[start:start + count]
+
+
+def pack(pins, count):
+    '''
+    Chooses count of pins, which are (pin_no, port, bit) with port None for
+    a pin that isn't on one, on as few ports as possible. Returns them sorted
+    by port and bit.
+    '''
+    if count > len(pins):
+        raise RuntimeError("Ran out of GPIOs")
+    by_port = {}
+    loose = []
+    for pin in pins:
+        if pin[1] is None:
+            loose.append([pin])
+        else:
+            by_port.setdefault(pin[1], []).append(pin)
+    # Taking the biggest ports first needs the fewest of them.
+    groups = sorted(
+        (sorted(group, key=lambda p: p[2]) for group in by_port.values()),
+        key=lambda group: (-len(group), group[0][1])) + loose
+
+    chosen = []
+    for group in groups:
+        need = count - len(chosen)
+        if need <= 0:
+            break
+        chosen += group if len(group) <= need else _tightest(group, need)
+    return sorted(chosen, key=lambda p: (p[1] is None, p[1] or "", p[2] or 0))
+
+
+def read_runs(pin_names, register):
+    '''
+    How to read the columns on pin_names with as few register reads as
+    possible. Each run is a dict of width bits to take from one port's input
+    register, which register formats with the port's letter, and the column
+    that its lowest bit belongs to. A pin that isn't on a port gets a run of
+    its own with no register, to be read with readPin().
+    '''
+    runs = []
+    for col, name in enumerate(pin_names):
+        port = pin_port(name)
+        last = runs[-1] if runs else None
+        if (port is not None and last is not None and last["port"] == port[0]
+                and last["shift"] + last["width"] == port[1]):
+            last["width"] += 1
+            continue
+        runs.append({
+            "pin": name,
+            "port": port and port[0],
+            "register": port and register % port[0],
+            "shift": port and port[1],
+            "width": 1,
+            "col": col,
+        })
+    for run in runs:
+        run["mask"] = "0x%X" % ((1 << run["width"]) - 1)
+    return runs
@@ -0,0 +1,149 @@
+'''
+pourfills pours the GND fills of many boards at once.
+
+Boards are named by paths, globs, or manifests, and spread over a pool of
+worker processes that each import pcbnew once. Unless --force is given, a
+board whose copper and zones haven't changed since its last pour is skipped
+without being loaded.
+
+A manifest is a JSON file like
+
+    {
+        "boards": ["output/*/*.kicad_pcb", "extra/macropad.kicad_pcb"]
+    }
+
+where paths and globs are relative to the manifest.
+'''
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+MANIFEST_SUFFIX = ".json"
+
+
+def _expand(pattern):
+    if glob.has_magic(pattern):
+        return sorted(glob.glob(pattern))
+    return [pattern]
+
+
+def read_manifest(path):
+    with open(path, "r") as f:
+        manifest = json.loads(f.read())
+    base_dir = os.path.dirname(path)
+    boards = []
+    for pattern in manifest["boards"]:
+        boards += _expand(os.path.join(base_dir, pattern))
+    return boards
+
+
+def find_boards(specs):
+    '''
+    Expands specs, each a board, a glob or a manifest, into a list of boards
+    without duplicates.
+    '''
+    boards = []
+    seen = set()
+    for spec in specs:
+        if spec.endswith(MANIFEST_SUFFIX):
+            found = read_manifest(spec)
+        else:
+            found = _expand(spec)
+        for board in found:
+            key = os.path.realpath(board)
+            if key not in seen:
+                seen.add(key)
+                boards.append(board)
+    return boards
+
+
+def _init_worker():
+    # pcbnew is slow to import, so each worker does it once.
+    from keycad import kicad  # noqa: F401
+
+
+def pour_board(filename, force=False):
+    from keycad import kicad
+
+    start = time.perf_counter()
+    result = {
+        "filename": filename,
+        "pid": os.getpid(),
+        "zones": [],
+        "fills": []
+    }
+    try:
+        report = kicad.pour_fills_on_board(filename, incremental=not force)
+        if report is None:
+            result["status"] = "skipped"
+        else:
+            result["status"] = "ok"
+            result["fills"] = report
+            result["zones"] = [zone for zones, _ in report for zone in zones]
+    except Exception:
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _pour_board(filename_and_force):
+    return pour_board(*filename_and_force)
+
+
+def run(boards, workers=None, force=False):
+    results = []
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(_pour_board,
+                                          [(b, force) for b in boards]):
+            print("%-48s %-7s %7.2fs  %d zones filled" %
+                  (result["filename"], result["status"], result["seconds"],
+                   len(result["zones"])))
+            results.append(result)
+    return results
+
+
+def print_summary(results, wall_seconds):
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    print()
+    print("%d boards: %d poured, %d up to date, %d failed" %
+          (len(results), counts.get("ok", 0), counts.get(
+              "skipped", 0), counts.get("failed", 0)))
+    print("wall time %.2fs, pour time %.2fs" %
+          (wall_seconds, sum(r["seconds"] for r in results)))
+    for r in results:
+        if r["status"] == "failed":
+            print()
+            print("%s failed:" % r["filename"])
+            print(r["error"])
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Pour GND fills on both sides of Kicad PCBs.")
+    arg_parser.add_argument(
+        "boards",
+        help="Kicad PCB filenames, globs, or JSON manifests listing them",
+        nargs="+")
+    arg_parser.add_argument("--workers",
+                            help="number of worker processes",
+                            type=int,
+                            default=os.cpu_count())
+    arg_parser.add_argument(
+        "--force",
+        help="refill every zone, even on boards that haven't changed",
+        action="store_true")
+    args = arg_parser.parse_args(argv)
+
+    boards = find_boards(args.boards)
+    start = time.perf_counter()
+    results = run(boards, args.workers, args.force)
+    print_summary(results, time.perf_counter() - start)
+    return 1 if any(r["status"] == "failed" for r in results) else 0
@@ -3,8 +3,11 @@ import sys
 from skidl import Net
 
 from keycad import key
+from keycad import matrix
 from keycad import mcu
 from keycad import partstore
+from keycad import ports
+from keycad import trace
 
 
 class Schematic:
@@ -13,27 +16,53 @@ class Schematic:
         self.__key_matrix_rows = []
         self.__key_matrix_cols = []
         self.__key_matrix_keys = None
+        self.__matrix_shape = None
 
         self.__pcb = pcb
 
-        self.__vcc = Net('VCC')
-        self.__gnd = Net('GND')
+        self.__vcc = self._net('VCC')
+        self.__gnd = self._net('GND')
 
-        self.__led_din_pin = None
+        # The first DIN of each LED chain, and the last DOUT of the chain
+        # being built.
+        self.__led_din_pins = []
         self.__led_dout_pin = None
 
-        self.__key_matrix_x = 0
-        self.__key_matrix_y = 0
-
         self.__legend_rows = []
         self.__legend_cols = []
+        self.__col_reads = []
 
         self._is_mx = is_mx
         self._is_hotswap = is_hotswap
 
-        self._prior_y = -1
+        self.__led_din_pin_names = []
+
+    @property
+    def circuit(self):
+        return self._partstore.circuit
+
+    @property
+    def netlist(self):
+        return self._partstore.netlist
+
+    @property
+    def pcb(self):
+        return self.__pcb
+
+    def _net(self, name):
+        net = Net(name, circuit=self._partstore.circuit)
+        self._partstore.netlist.add_net(net, name)
+        return net
 
-        self.__led_din_pin_name = None
+    # Connections go through these so that the netlist model sees the same
+    # connectivity as skidl.
+    def _connect(self, terminal, *others):
+        terminal += others
+        self._partstore.netlist.connect(terminal, *others)
+
+    def _rename(self, pin, name):
+        pin.net.name = name
+        self._partstore.netlist.rename(pin, name)
 
     @property
     def key_matrix_keys(self):
@@ -41,7 +70,18 @@ class Schematic:
 
     @property
     def led_data_pin_name(self):
-        return self.__led_din_pin_name
+        if not self.__led_din_pin_names:
+            return None
+        return self.__led_din_pin_names[0]
+
+    @property
+    def led_data_pin_names(self):
+        '''The MCU pin driving each LED chain.'''
+        return self.__led_din_pin_names
+
+    @property
+    def matrix_pin_count(self):
+        return len(self.__key_matrix_rows) + len(self.__key_matrix_cols)
 
     def create_keyswitch(self, key):
         part = self._partstore.get_keyswitch(key.printable_label, self._is_mx,
@@ -66,139 +106,188 @@ class Schematic:
         # 3 GND
         # 4 DIN
 
-        self.__vcc += led[1]
-        self.__gnd += led[3]
+        self._connect(self.__vcc, led[1])
+        self._connect(self.__gnd, led[3])
 
-        if self.__led_din_pin is None:
-            self.__led_din_pin = led[4]
         if self.__led_dout_pin is None:
-            self.__led_dout_pin = led[2]
+            self.__led_din_pins.append(led[4])
         else:
-            led[4] += self.__led_dout_pin
-            led[4].net.name = "%s_DIN" % led.ref
+            self._connect(led[4], self.__led_dout_pin)
+            self._rename(led[4], "%s_DIN" % led.ref)
         self.__led_dout_pin = led[2]
 
+    def start_led_chain(self):
+        '''Starts a new LED chain, which gets its own MCU pin.'''
+        self.__led_dout_pin = None
+
     def connect_per_key_rgb_capacitor(self, c):
-        self.__vcc += c[1]
-        self.__gnd += c[2]
+        self._connect(self.__vcc, c[1])
+        self._connect(self.__gnd, c[2])
 
     def create_diode(self, key):
         part = self._partstore.get_diode()
         self.__pcb.place_diode_on_keyboard_grid(part, key)
         return part
 
-    def connect_to_matrix(self, pin_1, pin_2):
-        self.__key_matrix_cols[self.__key_matrix_x] += pin_1
-        self.__key_matrix_rows[self.__key_matrix_y] += pin_2
-        self.__key_matrix_x += 1
-
-    def advance_matrix_row(self):
-        if self._conserve_cols:
-            return
-        self.__key_matrix_x = 0
-        self.__key_matrix_y += 1
-
-    def assign_matrix_location_to_key(self, key):
-        key.matrix_col = self.__key_matrix_x
-        key.matrix_row = self.__key_matrix_y
-        self.__key_matrix_keys[self.__key_matrix_y][self.__key_matrix_x] = key
+    @property
+    def matrix_topology(self):
+        return self.__matrix_shape.topology
+
+    def connect_to_matrix(self, key, pin_1, pin_2):
+        row, col = key.matrix_row, key.matrix_col
+        topology = self.__matrix_shape.topology
+        if topology == matrix.DUPLEX:
+            # Every other row's diodes face the other way, so that it can
+            # share its row net.
+            row, reverse = matrix.duplex_row(row)
+            row_net = self.__key_matrix_rows[row]
+            col_net = self.__key_matrix_cols[col]
+            if reverse:
+                row_net, col_net = col_net, row_net
+        elif topology == matrix.ROUND_ROBIN:
+            row_net = self.__key_matrix_rows[row]
+            col_net = self.__key_matrix_rows[matrix.round_robin_line(row, col)]
+        else:
+            row_net = self.__key_matrix_rows[row]
+            col_net = self.__key_matrix_cols[col]
+        self._connect(col_net, pin_1)
+        self._connect(row_net, pin_2)
+
+    def assign_matrix(self, keys, strategy=matrix.PARSE_ORDER):
+        '''
+        Gives each of keys its row and column in the key matrix, and drops
+        the matrix nets that no key uses.
+        '''
+        shape = self.__matrix_shape
+        cells = matrix.assign(keys, shape.rows, shape.cols, shape.conserve,
+                              strategy)
+        row_count = max(row for row, _ in cells) + 1
+        col_count = max(col for _, col in cells) + 1
+        self.__matrix_shape = shape._replace(rows=row_count, cols=col_count)
+        row_nets, col_nets = matrix.net_counts(self.__matrix_shape)
+        del self.__key_matrix_rows[row_nets:]
+        del self.__key_matrix_cols[col_nets:]
+        self.__key_matrix_keys = [[None] * col_count for i in range(row_count)]
+        for key, (row, col) in zip(keys, cells):
+            key.matrix_row = row
+            key.matrix_col = col
+            self.__key_matrix_keys[row][col] = key
 
     def connect_keyswitch_and_diode(self, key, keysw_part, diode_part):
-        net = Net("%s_%s" % (keysw_part.ref, diode_part.ref))
-        net += keysw_part[2], diode_part[2]
+        net = self._net("%s_%s" % (keysw_part.ref, diode_part.ref))
+        self._connect(net, keysw_part[2], diode_part[2])
 
         # COL2ROW means the connection goes COL_ to switch to diode anode
         # to diode cathode to ROW_. See
         # https://github.com/qmk/qmk_firmware/blob/master/docs/config_options.md
-        self.assign_matrix_location_to_key(key)
-        self.connect_to_matrix(keysw_part[1], diode_part[1])
+        self.connect_to_matrix(key, keysw_part[1], diode_part[1])
 
+    @trace.traced("Schematic.add_key")
     def add_key(self, key, add_led=True):
-        if key.y != self._prior_y:
-            if self._prior_y != -1:
-                self.advance_matrix_row()
-            self._prior_y = key.y
-
         keysw_part = self.create_keyswitch(key)
         d_part = self.create_diode(key)
         self.connect_keyswitch_and_diode(key, keysw_part, d_part)
 
+    @trace.traced("Schematic.add_per_key_rgb")
     def add_per_key_rgb(self, key):
         led_part = self.create_key_rgb(key)
         cap_part = self.create_key_rgb_capacitor(key)
         self.connect_per_key_rgb(led_part)
         self.connect_per_key_rgb_capacitor(cap_part)
 
-    def create_matrix_nets(self, key_count, key_row_count, key_col_count,
-                           gpio_count):
-        if key_row_count + key_col_count <= gpio_count:
-            row_count = key_row_count
-            col_count = key_col_count
-            self._conserve_cols = False
-        else:
-            import math
-            square_matrix_size = math.ceil(math.sqrt(key_count))
-            if square_matrix_size * 2 >= gpio_count:
-                raise OverflowError("not enough GPIOs for this keyboard")
-            row_count = square_matrix_size
-            col_count = square_matrix_size
-            self._conserve_cols = True
-        for y in range(0, row_count):
-            self.__key_matrix_rows.append(Net("ROW_%d" % (y + 1)))
-        for x in range(0, col_count):
-            self.__key_matrix_cols.append(Net("COL_%d" % (x + 1)))
-        self.__key_matrix_keys = [[None] * col_count for i in range(row_count)]
-
-    def connect_mcu(self, mcu):
-        self.__gnd += mcu.get_gnd_pins()
-        self.__vcc += mcu.get_vcc_pins()
-
-        if self.__led_din_pin is not None:
-            self.__led_din_pin += mcu.claim_led_din_pin()
-            self.__led_din_pin.net.name = "LED_DATA"
-            self.__led_din_pin_name = mcu.get_pin_name(mcu.led_din_pin_no)
-
-        for row in self.__key_matrix_rows:
-            if len(row) == 0:
-                self.__key_matrix_rows.remove(row)
+    def create_matrix_nets(self,
+                           key_count,
+                           key_row_count,
+                           key_col_count,
+                           gpio_count,
+                           topologies=(matrix.STANDARD, )):
+        self.__matrix_shape = matrix.matrix_shape(key_count, key_row_count,
+                                                  key_col_count, gpio_count,
+                                                  topologies)
+        row_nets, col_nets = matrix.net_counts(self.__matrix_shape)
+        row_name = "ROW_%d"
+        if self.__matrix_shape.topology == matrix.ROUND_ROBIN:
+            row_name = "LINE_%d"
+        for y in range(0, row_nets):
+            self.__key_matrix_rows.append(self._net(row_name % (y + 1)))
+        for x in range(0, col_nets):
+            self.__key_matrix_cols.append(self._net("COL_%d" % (x + 1)))
+        self.__key_matrix_keys = [[None] * self.__matrix_shape.cols
+                                  for i in range(self.__matrix_shape.rows)]
+
+    def connect_mcu(self, mcu, pin_allocation=ports.IN_ORDER):
+        self._connect(self.__gnd, *mcu.get_gnd_pins())
+        self._connect(self.__vcc, *mcu.get_vcc_pins())
+
+        # The first chain is on the MCU's usual LED pin. Any others take
+        # GPIOs from the far end, which the matrix doesn't reach.
+        for i, din_pin in enumerate(self.__led_din_pins):
+            if i == 0:
+                pin_no, pin = mcu.led_din_pin_no, mcu.claim_led_din_pin()
+                name = "LED_DATA"
+            else:
+                pin_no, pin = mcu.claim_last_gpio()
+                name = "LED_DATA_%d" % (i + 1)
+            self._connect(din_pin, pin)
+            self._rename(din_pin, name)
+            self.__led_din_pin_names.append(mcu.get_pin_name(pin_no))
+
+        # A ROUND_ROBIN matrix's lines are numbered by position, so they
+        # all stay.
+        if self.__matrix_shape.topology != matrix.ROUND_ROBIN:
+            for row in self.__key_matrix_rows:
+                if len(row) == 0:
+                    self.__key_matrix_rows.remove(row)
         for col in self.__key_matrix_cols:
             if len(col) == 0:
                 self.__key_matrix_cols.remove(col)
 
+        # The columns are what QMK reads, so they get first pick of the pins
+        # when they're packed onto ports.
+        col_pins = None
+        if pin_allocation == ports.BY_PORT:
+            col_pins = mcu.claim_port_gpios(len(self.__key_matrix_cols))
+        elif pin_allocation != ports.IN_ORDER:
+            raise ValueError("unknown pin allocation %s" % pin_allocation)
         for row in self.__key_matrix_rows:
             pin_no, pin_net = mcu.claim_next_gpio()
             self.__legend_rows.append(mcu.get_pin_name(pin_no))
-            row += pin_net
-        for col in self.__key_matrix_cols:
-            pin_no, pin_net = mcu.claim_next_gpio()
+            self._connect(row, pin_net)
+        for i, col in enumerate(self.__key_matrix_cols):
+            if col_pins is None:
+                pin_no, pin_net = mcu.claim_next_gpio()
+            else:
+                pin_no, pin_net = col_pins[i]
             self.__legend_cols.append(mcu.get_pin_name(pin_no))
-            col += pin_net
+            self._connect(col, pin_net)
+        self.__col_reads = ports.read_runs(self.__legend_cols,
+                                           mcu.port_register)
 
     def connect_reset_switch(self, reset, mcu):
-        self.__gnd += reset[2]
-        reset[1] += mcu.get_reset_pin()
-        reset[1].net.name = "RST"
+        self._connect(self.__gnd, reset[2])
+        self._connect(reset[1], mcu.get_reset_pin())
+        self._rename(reset[1], "RST")
 
     def connect_usb_c_connector(self, conn, mcu, r1, r2):
-        self.__gnd += conn["A1"], conn["A12"], conn["B1"], conn["B12"]
-        self.__vcc += conn["A4"], conn["A9"], conn["B4"], conn["B9"]
+        self._connect(self.__gnd, conn["A1"], conn["A12"], conn["B1"],
+                      conn["B12"])
+        self._connect(self.__vcc, conn["A4"], conn["A9"], conn["B4"],
+                      conn["B9"])
 
         # TODO(miket): Per ST AN4775, 22-ohm resistors aren't necessary.
         usb_dp, usb_dm = mcu.get_usb_pins()
-        conn["A6"] += conn["B6"]
-        conn["A6"] += usb_dp
-        conn["A6"].net.name = "USB_DP"
-        conn["A7"] += conn["B7"]
-        conn["A7"] += usb_dm
-        conn["A7"].net.name = "USB_DM"
+        self._connect(conn["A6"], conn["B6"], usb_dp)
+        self._rename(conn["A6"], "USB_DP")
+        self._connect(conn["A7"], conn["B7"], usb_dm)
+        self._rename(conn["A7"], "USB_DM")
 
         # CC1 and CC2
-        conn["A5"] += r1[1]
-        conn["A5"].net.name = "CC1"
-        r1[2] += self.__gnd
-        conn["B5"] += r2[1]
-        conn["B5"].net.name = "CC2"
-        r2[2] += self.__gnd
+        self._connect(conn["A5"], r1[1])
+        self._rename(conn["A5"], "CC1")
+        self._connect(self.__gnd, r1[2])
+        self._connect(conn["B5"], r2[1])
+        self._rename(conn["B5"], "CC2")
+        self._connect(self.__gnd, r2[2])
 
     def set_next_dout_pin(self, next_dout_pin):
         self.__next_dout_pin = next_dout_pin
@@ -228,9 +317,16 @@ class Schematic:
         self.__pcb.place_resistor_on_keyboard_grid(part)
         return part
 
+    @property
+    def col_reads(self):
+        '''How to read the matrix columns a port at a time; see ports.'''
+        return self.__col_reads
+
     def get_legend_dict(self):
         return {"cols": self.__legend_cols, "rows": self.__legend_rows}
 
     def get_legend_text(self):
+        if self.__matrix_shape.topology == matrix.ROUND_ROBIN:
+            return "Lines: %s" % "/".join(self.__legend_rows)
         return "Rows: %s Cols: %s" % ("/".join(self.__legend_rows), "/".join(
             self.__legend_cols))
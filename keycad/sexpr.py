@@ -0,0 +1,121 @@
+'''
+sexpr reads and writes the S-expressions of KiCad's file formats.
+
+A list is a Python list whose first element is usually its keyword, atoms are
+strs, and strings that were quoted in the source are Quoted so that they're
+quoted again on the way out.
+'''
+
+import re
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))',
+                       re.DOTALL)
+_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+_NEEDS_QUOTES_RE = re.compile(r'[\s()"]')
+
+
+class Quoted(str):
+    pass
+
+
+def parse(text):
+    '''Parses the first S-expression in text.'''
+    stack = []
+    current = None
+    pos = 0
+    end = len(text)
+    while pos < end:
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            if text[pos:].strip():
+                raise ValueError("unexpected character at offset %d" % pos)
+            break
+        pos = m.end()
+        if m.group(1):
+            new_list = []
+            if current is not None:
+                current.append(new_list)
+                stack.append(current)
+            current = new_list
+        elif m.group(2):
+            if current is None:
+                raise ValueError("unbalanced ) at offset %d" % m.start())
+            if not stack:
+                return current
+            current = stack.pop()
+        elif m.group(3) is not None:
+            if current is None:
+                raise ValueError("string outside a list at offset %d" %
+                                 m.start())
+            current.append(Quoted(_ESCAPE_RE.sub(r"\1", m.group(3))))
+        else:
+            if current is None:
+                raise ValueError("atom outside a list at offset %d" %
+                                 m.start())
+            current.append(m.group(4))
+    raise ValueError("unterminated S-expression")
+
+
+def quote(text):
+    return '"%s"' % str(text).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def format_number(value):
+    '''Formats a coordinate or angle the way KiCad does, without noise.'''
+    text = "%.6f" % value
+    text = text.rstrip("0").rstrip(".")
+    if text == "-0":
+        return "0"
+    return text
+
+
+def _atom(value):
+    if isinstance(value, str):
+        if isinstance(value,
+                      Quoted) or not value or _NEEDS_QUOTES_RE.search(value):
+            return quote(value)
+        return value
+    if isinstance(value, float):
+        return format_number(value)
+    return str(value)
+
+
+def _inline(expr):
+    return "(" + " ".join(
+        _inline(e) if isinstance(e, list) else _atom(e) for e in expr) + ")"
+
+
+def dumps(expr, indent=0, inline_depth=1):
+    '''
+    Formats expr. Lists nested more than inline_depth levels deep stay on
+    their parent's line, which is roughly how KiCad lays its files out.
+    '''
+    if not isinstance(expr, list):
+        return _atom(expr)
+    if inline_depth <= 0 or not any(isinstance(e, list) for e in expr):
+        return _inline(expr)
+    chunks = ["("]
+    first = True
+    for e in expr:
+        if isinstance(e, list):
+            chunks.append("\n" + "  " * (indent + 1))
+            chunks.append(dumps(e, indent + 1, inline_depth - 1))
+        else:
+            if not first:
+                chunks.append(" ")
+            chunks.append(_atom(e))
+        first = False
+    chunks.append(")")
+    return "".join(chunks)
+
+
+def find(expr, keyword):
+    '''Returns the first child list of expr that starts with keyword.'''
+    for e in expr:
+        if isinstance(e, list) and e and e[0] == keyword:
+            return e
+    return None
+
+
+def find_all(expr, keyword):
+    return [e for e in expr if isinstance(e, list) and e and e[0] == keyword]
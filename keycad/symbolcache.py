@@ -0,0 +1,168 @@
+'''
+symbolcache keeps the pin tables of KiCad symbol libraries such as keycad.lib
+so that they needn't be parsed from text on every run.
+
+keycad only needs each symbol's reference prefix and pins to build skidl
+parts, so that's all an entry holds. Entries are JSON, keyed by a hash of the
+library file's contents, and evicted least-recently-used first once the cache
+directory grows past its size cap. Each process also remembers the symbols it
+has loaded by the library's path, size and mtime.
+'''
+
+import collections
+import hashlib
+import json
+import logging
+import os
+
+from keycad import diskcache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+ENTRY_SUFFIX = ".sym"
+
+# Bump when the contents of an entry change.
+FORMAT_VERSION = 1
+
+Symbol = collections.namedtuple("Symbol", ("name", "ref_prefix", "pins"))
+
+# (number, name, electrical type), e.g. ("A4", "VBUS", "W").
+Pin = collections.namedtuple("Pin", ("num", "name", "etype"))
+
+
+def default_cache_dir():
+    return diskcache.default_cache_dir("symbols")
+
+
+def parse_library(f):
+    '''
+    Reads the DEF, ALIAS and pin (X) records of a KiCad 5 .lib file, returning
+    a dict of Symbols by name.
+    '''
+    symbols = {}
+    name = None
+    for line in f:
+        fields = line.split()
+        if not fields:
+            continue
+        record = fields[0]
+        if record == "DEF":
+            name = fields[1]
+            ref_prefix = fields[2].rstrip("?")
+            aliases = []
+            pins = []
+        elif name is None:
+            continue
+        elif record == "ALIAS":
+            aliases.extend(fields[1:])
+        elif record == "X":
+            # X name number x y length orientation num_size name_size unit
+            # convert etype [shape]
+            if len(fields) < 12:
+                raise ValueError("bad pin record in %s: %s" %
+                                 (name, line.strip()))
+            # Pins of the alternate (De Morgan) body style duplicate the
+            # normal ones.
+            if fields[10] in ("0", "1"):
+                pin_name = "" if fields[1] == "~" else fields[1]
+                pins.append(Pin(fields[2], pin_name, fields[11]))
+        elif record == "ENDDEF":
+            symbol = Symbol(name, ref_prefix, tuple(pins))
+            for symbol_name in [name] + aliases:
+                symbols[symbol_name] = symbol._replace(name=symbol_name)
+            name = None
+    return symbols
+
+
+def serialize(symbols):
+    rows = [[s.name, s.ref_prefix, [list(p) for p in s.pins]]
+            for s in symbols.values()]
+    entry = {"version": FORMAT_VERSION, "symbols": rows}
+    return json.dumps(entry, separators=(",", ":")).encode("utf-8")
+
+
+def deserialize(data):
+    entry = json.loads(data.decode("utf-8"))
+    if entry.get("version") != FORMAT_VERSION:
+        raise ValueError("not a keycad symbol cache entry")
+    symbols = {}
+    for name, ref_prefix, pins in entry["symbols"]:
+        symbols[name] = Symbol(name, ref_prefix,
+                               tuple(Pin(*pin) for pin in pins))
+    return symbols
+
+
+class SymbolCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        # path -> ((size, mtime), symbols)
+        self._loaded = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def digest(self, data):
+        h = hashlib.sha256()
+        h.update(b"%d:" % FORMAT_VERSION)
+        h.update(data)
+        return h.hexdigest()
+
+    def _entry_path(self, digest):
+        return os.path.join(self._cache_dir, digest + ENTRY_SUFFIX)
+
+    def load(self, filename):
+        '''Returns the symbols of the library at filename, by name.'''
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        loaded = self._loaded.get(path)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        entry_path = self._entry_path(self.digest(data))
+        symbols = self._read_entry(entry_path)
+        if symbols is None:
+            self.misses += 1
+            symbols = parse_library(data.decode("utf-8").splitlines())
+            self._write_entry(entry_path, symbols)
+        else:
+            self.hits += 1
+        self._loaded[path] = (stamp, symbols)
+        return symbols
+
+    def _read_entry(self, path):
+        try:
+            with open(path, "rb") as f:
+                symbols = deserialize(f.read())
+        except OSError:
+            return None
+        except (ValueError, KeyError, TypeError):
+            logger.warning("discarding corrupt symbol cache entry %s", path)
+            diskcache.remove(path)
+            return None
+        diskcache.touch(path)
+        return symbols
+
+    def _write_entry(self, path, symbols):
+        try:
+            diskcache.write_atomically(path, serialize(symbols))
+        except OSError as e:
+            logger.warning("couldn't write symbol cache entry: %s", e)
+            return
+        try:
+            self.evict()
+        except OSError as e:
+            logger.warning("couldn't evict symbol cache entries: %s", e)
+
+    def evict(self):
+        diskcache.evict(self._cache_dir, ENTRY_SUFFIX, self._max_bytes)
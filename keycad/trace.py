@@ -0,0 +1,219 @@
+'''
+trace times the stages of a build.
+
+Tracing is off unless enable() is called, in which case every span records
+its wall time, CPU time, the CPU time of any subprocesses it waited for, and
+the process's peak RSS so far. write() saves the spans in Chrome's trace event
+format, which chrome://tracing and https://ui.perfetto.dev can load, and
+print_summary() totals them by name.
+'''
+
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_tracer = None
+
+
+def _children_cpu_seconds():
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_kb():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+
+def _usage(cpu_clock):
+    return cpu_clock(), _children_cpu_seconds()
+
+
+def _usage_args(cpu_clock, start):
+    cpu, children = _usage(cpu_clock)
+    return {
+        "cpu_ms": (cpu - start[0]) * 1000,
+        "subprocess_cpu_ms": (children - start[1]) * 1000,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def _measured(cpu_clock, f):
+    '''Calls f where it runs and returns its result and resource usage.'''
+    start = _usage(cpu_clock)
+    result = f()
+    return result, _usage_args(cpu_clock, start)
+
+
+class Tracer:
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._epoch = time.perf_counter()
+        # Thread idents are addresses, so small numbers won't clash with them.
+        self._tracks = itertools.count(1)
+
+    @property
+    def events(self):
+        return self._events
+
+    @contextlib.contextmanager
+    def span(self, name, category="keycad", **args):
+        start = time.perf_counter()
+        start_usage = _usage(time.process_time)
+        try:
+            yield
+        finally:
+            args.update(_usage_args(time.process_time, start_usage))
+            self.add_event(name, category, start, time.perf_counter(),
+                           threading.get_ident(), args)
+
+    def new_track(self, name):
+        '''Returns a new tid for spans that overlap the other tracks.'''
+        with self._lock:
+            tid = next(self._tracks)
+            self._events.append({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {
+                    "name": name
+                },
+            })
+        return tid
+
+    def add_event(self, name, category, start, end, tid, args):
+        '''Records a span from perf_counter() times start to end.'''
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._epoch) * 1000000,
+            "dur": (end - start) * 1000000,
+            "pid": self._pid,
+            "tid": tid,
+            "args": args,
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def summary(self):
+        '''Total wall time in ms and call count for each span name.'''
+        totals = {}
+        for e in self._events:
+            if e["ph"] != "X":
+                continue
+            total, count = totals.get(e["name"], (0, 0))
+            totals[e["name"]] = (total + e["dur"] / 1000, count + 1)
+        return totals
+
+    def write(self, filename):
+        with open(filename, "w") as f:
+            json.dump({
+                "traceEvents": self._events,
+                "displayTimeUnit": "ms"
+            }, f)
+
+
+def print_summary(tracer):
+    '''Prints each span name's wall time and count, slowest first.'''
+    totals = tracer.summary()
+    print()
+    print("%-32s %6s %10s" % ("span", "count", "total ms"))
+    for name, (total, count) in sorted(totals.items(),
+                                       key=lambda item: -item[1][0]):
+        print("%-32s %6d %10.1f" % (name, count, total))
+
+
+def enable():
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, category="keycad", **args):
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.span(name, category, **args)
+
+
+def traced(name, category="keycad"):
+    '''Decorator that wraps each call in a span while tracing is enabled.'''
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return f(*args, **kwargs)
+            with _tracer.span(name, category):
+                return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def stage(executor, name, f, *args, trace_args=None, **kwargs):
+    '''
+    Runs f(*args, **kwargs) on executor, or right away in this process if
+    executor is None, as a span on a track of its own.
+
+    Stages overlap on the event loop's thread, so each gets its own tid, and
+    f is timed where it runs: by the worker's CPU clock in a process pool and
+    by its own thread's otherwise.
+    '''
+    call = functools.partial(f, *args, **kwargs)
+    tracer = _tracer
+    if tracer is None:
+        if executor is None:
+            return call()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, call)
+
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        cpu_clock = time.process_time
+    else:
+        cpu_clock = time.thread_time
+    measured = functools.partial(_measured, cpu_clock, call)
+    usage = {}
+    start = time.perf_counter()
+    try:
+        if executor is None:
+            result, usage = measured()
+        else:
+            loop = asyncio.get_running_loop()
+            result, usage = await loop.run_in_executor(executor, measured)
+        return result
+    finally:
+        tracer.add_event(name, "keycad", start, time.perf_counter(),
+                         tracer.new_track(name), dict(trace_args or {},
+                                                      **usage))
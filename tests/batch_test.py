@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import tempfile
+import unittest
+
+from keycad import batch
+
+
+class TestBatch(unittest.TestCase):
+    def test_discover_jobs(self):
+        jobs = {job.name: job for job in batch.discover_jobs("kle_layouts")}
+        self.assertIn("ansi-104", jobs)
+        self.assertNotIn("ansi-104.descriptors", jobs)
+        self.assertNotIn("ansi-104.positions", jobs)
+
+        ansi = jobs["ansi-104"]
+        self.assertEqual(os.path.join("kle_layouts", "ansi-104.json"),
+                         ansi.kle_filename)
+        self.assertEqual(
+            os.path.join("kle_layouts", "ansi-104.descriptors.json"),
+            ansi.descriptors_filename)
+        self.assertEqual(
+            os.path.join("kle_layouts", "ansi-104.positions.json"),
+            ansi.positions_filename)
+
+        # planck has positions but no descriptors.
+        self.assertIsNone(jobs["planck"].descriptors_filename)
+        self.assertIsNotNone(jobs["planck"].positions_filename)
+
+    def test_read_manifest(self):
+        with tempfile.TemporaryDirectory() as d:
+            for name in ("a.json", "a.positions.json", "b.json"):
+                with open(os.path.join(d, name), "w") as f:
+                    f.write("[]")
+            manifest = os.path.join(d, "manifest.json")
+            with open(manifest, "w") as f:
+                json.dump(
+                    {
+                        "args": ["--add_pro_micro"],
+                        "jobs": [{
+                            "kle": "a.json"
+                        }, {
+                            "kle": "b.json",
+                            "name": "bee",
+                            "args": ["--use_pg1350"]
+                        }]
+                    }, f)
+
+            jobs = batch.read_manifest(manifest, ["--no_hotswap"])
+            self.assertEqual(["a", "bee"], [job.name for job in jobs])
+            self.assertEqual(os.path.join(d, "a.positions.json"),
+                             jobs[0].positions_filename)
+            self.assertIsNone(jobs[1].positions_filename)
+            self.assertEqual(["--no_hotswap", "--add_pro_micro"], jobs[0].args)
+            self.assertEqual(
+                ["--no_hotswap", "--add_pro_micro", "--use_pg1350"],
+                jobs[1].args)
+
+            argv = jobs[1].get_argv("out")
+            self.assertEqual(os.path.join(d, "b.json"), argv[0])
+            self.assertIn(os.path.join("out", "bee"), argv)
+            self.assertIn("--no_open", argv)
+            self.assertEqual("0", argv[argv.index("--output_workers") + 1])
+
+    def test_board_argv(self):
+        arg_parser = argparse.ArgumentParser()
+        actions = [
+            arg_parser.add_argument("--add_blue_pill", action="store_true"),
+            arg_parser.add_argument("--use_pg1350", action="store_true"),
+            arg_parser.add_argument("--matrix_topologies",
+                                    nargs="+",
+                                    default=["standard"]),
+            arg_parser.add_argument("--led_frame_time_us", type=int),
+            arg_parser.add_argument("--pin_allocation", default="by_port")
+        ]
+        args = arg_parser.parse_args([
+            "--add_blue_pill", "--matrix_topologies", "standard", "duplex",
+            "--led_frame_time_us", "2000"
+        ])
+        argv = batch.board_argv(args, actions)
+        self.assertEqual([
+            "--add_blue_pill", "--matrix_topologies", "standard", "duplex",
+            "--led_frame_time_us", "2000", "--pin_allocation", "by_port"
+        ], argv)
+        self.assertEqual(args, arg_parser.parse_args(argv))
+
+    def test_duplicate_names(self):
+        with tempfile.TemporaryDirectory() as d:
+            manifest = os.path.join(d, "manifest.json")
+            with open(manifest, "w") as f:
+                json.dump({"jobs": [{"kle": "a.json"}, {"kle": "a.json"}]}, f)
+            with self.assertRaises(ValueError):
+                batch.read_manifest(manifest)
+
+
+if __name__ == '__main__':
+    unittest.main()
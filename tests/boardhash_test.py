@@ -0,0 +1,57 @@
+import unittest
+
+from keycad import boardhash, sexpr
+
+BOARD = '''
+(kicad_pcb (version 20171130) (host pcbnew 5.1.5)
+  (net 0 "")
+  (net 1 GND)
+  (module keycad:D_0805 (layer B.Cu) (tedit 0) (tstamp 1)
+    (at 10 20 90)
+    (fp_text reference D1 (at 0 1.4) (layer B.SilkS))
+    (pad 1 smd rect (at -0.95 0 90) (size 0.7 1.3) (layers B.Cu) (net 1 GND)))
+  (gr_line (start 0 0) (end 100 0) (layer Edge.Cuts) (width 0.15))
+  (gr_text Hello (at 5 5) (layer F.SilkS))
+  (segment (start 1 1) (end 2 2) (width 0.25) (layer F.Cu) (net 1))
+  (zone (net 1) (net_name GND) (layer F.Cu) (tstamp 0) (hatch edge 0.508)
+    (fill yes (arc_segments 32) (thermal_gap 0.508))
+    (polygon (pts (xy 0 0) (xy 100 0) (xy 100 50)))
+    (filled_polygon (pts (xy 1 1) (xy 99 1) (xy 99 49))))
+)
+'''
+
+
+class TestBoardHash(unittest.TestCase):
+    def hashes(self, text):
+        board = sexpr.parse(text)
+        return boardhash.copper_hash(board), boardhash.zone_hash(board)
+
+    def test_unchanged(self):
+        self.assertEqual(self.hashes(BOARD), self.hashes(BOARD))
+
+    def test_ignores_silkscreen_and_fills(self):
+        copper, zones = self.hashes(BOARD)
+        for old, new in (("Hello", "Goodbye"),
+                         ("reference D1", "reference D2"), ("(xy 99 49)",
+                                                            "(xy 98 49)")):
+            self.assertEqual(self.hashes(BOARD.replace(old, new)),
+                             (copper, zones), new)
+
+    def test_copper_changes(self):
+        copper, zones = self.hashes(BOARD)
+        for old, new in (("(at 10 20 90)", "(at 10 21 90)"),
+                         ("(end 2 2)", "(end 2 3)"), ("(end 100 0)",
+                                                      "(end 90 0)")):
+            changed = self.hashes(BOARD.replace(old, new))
+            self.assertNotEqual(changed[0], copper, new)
+            self.assertEqual(changed[1], zones, new)
+
+    def test_zone_changes(self):
+        copper, zones = self.hashes(BOARD)
+        changed = self.hashes(BOARD.replace("(xy 100 50)", "(xy 100 60)"))
+        self.assertEqual(changed[0], copper)
+        self.assertNotEqual(changed[1], zones)
+
+
+if __name__ == '__main__':
+    unittest.main()
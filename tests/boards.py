@@ -0,0 +1,49 @@
+'''
+Whole boards, built from the schematic up without pcbnew, for the tests that
+need one.
+'''
+
+import collections
+
+from keycad.builder import BoardBuilder
+from keycad.kle import Parser
+from keycad.partstore import PartStore
+from keycad.pcb import Pcb
+from keycad.schematic import Schematic
+
+Board = collections.namedtuple("Board",
+                               ("parser", "store", "schematic", "builder"))
+
+
+def grid(rows, cols):
+    '''A KLE layout of rows full rows of cols keys.'''
+    return [["K%d_%d" % (row, col) for col in range(cols)]
+            for row in range(rows)]
+
+
+def build(layout, **kwargs):
+    '''
+    Builds layout, a KLE layout or the name of a KLE file, passing kwargs to
+    BoardBuilder.build().
+    '''
+    store = PartStore()
+    schematic = Schematic(store, Pcb(19.05, 19.05))
+    parser = Parser()
+    if isinstance(layout, str):
+        parser.load(layout)
+    else:
+        parser.handle_dict(layout)
+    builder = BoardBuilder(parser, schematic)
+    builder.build(**kwargs)
+    return Board(parser, store, schematic, builder)
+
+
+def nets(store):
+    '''{net name: sorted [(ref, pin number), ...]} of store's netlist.'''
+    names, offsets, part_indexes, pin_nums = store.netlist.net_table()
+    return {
+        name:
+        sorted((store.netlist.parts[part_indexes[j]].ref, pin_nums[j])
+               for j in range(offsets[i], offsets[i + 1]))
+        for i, name in enumerate(names)
+    }
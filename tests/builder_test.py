@@ -32,13 +32,13 @@ class TestBuilder(unittest.TestCase):
         builder = BoardBuilder(parser, schematic)
         builder.build(add_pro_micro=False, add_blue_pill=True)
 
-        gnd = Net.get("GND")
+        gnd = Net.get("GND", circuit=store.circuit)
         self.assertEqual(gnd.name, "GND")
-        vcc = Net.get("VCC")
+        vcc = Net.get("VCC", circuit=store.circuit)
         self.assertEqual(vcc.name, "VCC")
 
         # Is the Blue Pill correctly connected?
-        mcu = Part.get("U2")[0]
+        mcu = Part.get("U2", circuit=store.circuit)[0]
         expected_mcu_nets = [
             None,  # 1, VBAT - RTC backup, not used by us
             None,  # 2, PC_13 - LED
@@ -97,7 +97,7 @@ class TestBuilder(unittest.TestCase):
         for i in range(1, parser.key_count + 1):
             is_first = i == 1
             is_last = i == parser.key_count
-            part = Part.get("L%d" % i)[0]
+            part = Part.get("L%d" % i, circuit=store.circuit)[0]
             self.assertEqual(part[1].net.name, "VCC")
             interconnect_net_name_in = "L%d_DIN" % (i)
             interconnect_net_name_out = "L%d_DIN" % (i + 1)
@@ -114,7 +114,7 @@ class TestBuilder(unittest.TestCase):
         # Are all the LED nets connected to exactly two things?
         # (Except the last one)
         for i in range(1, parser.key_count + 1):
-            part = Part.get("L%d" % i)[0]
+            part = Part.get("L%d" % i, circuit=store.circuit)[0]
             self.assertEqual(len(part[4].nets[0]), 2)
             if i == parser.key_count:
                 self.assertEqual(len(part[2].nets), 0)
@@ -128,8 +128,8 @@ class TestBuilder(unittest.TestCase):
         current_col = 1
         key_no = 1
         for i in range(1, parser.key_count + 1):
-            part = Part.get("K%d" % i)[0]
-            diode_part = Part.get("D%d" % i)[0]
+            part = Part.get("K%d" % i, circuit=store.circuit)[0]
+            diode_part = Part.get("D%d" % i, circuit=store.circuit)[0]
 
             # For COL2ROW, flow should be COL GPIO, switch, diode, ROW GPIO,
             # and the diode's arrow should be pointing toward the ROW GPIO.
@@ -155,7 +155,7 @@ class TestBuilder(unittest.TestCase):
         self.assertEqual(current_row, expected_rows + 1)
 
         # Is the USB-C connector connected properly?
-        part = Part.get("J1")[0]
+        part = Part.get("J1", circuit=store.circuit)[0]
 
         # Power
         self.assertEqual(part["A1"].net.name, "GND")
@@ -177,8 +177,8 @@ class TestBuilder(unittest.TestCase):
         self.assertEqual(part["A5"].net.name, "CC1")
         self.assertEqual(part["B5"].net.name, "CC2")
 
-        r1 = Part.get("R1")[0]
-        r2 = Part.get("R2")[0]
+        r1 = Part.get("R1", circuit=store.circuit)[0]
+        r2 = Part.get("R2", circuit=store.circuit)[0]
         self.assertEqual(r1.value, "5K1")
         self.assertEqual(r2.value, "5K1")
         self.assertEqual(r1[1].net.name, "CC1")
@@ -0,0 +1,86 @@
+import collections
+import unittest
+
+from keycad import collisions
+from keycad.pcb import Pcb
+
+FakePart = collections.namedtuple("FakePart", ["ref", "footprint"])
+
+DIODE = "keycad:D_0805"
+SWITCH = "keycad:SW_MX"
+SOCKET = "keycad:Kailh_socket_MX"
+
+
+class TestSpatialHash(unittest.TestCase):
+    def test_query(self):
+        grid = collisions.SpatialHash(cell_size=5)
+        grid.insert("a", (0, 0, 12, 3))
+        grid.insert("b", (20, 20, 21, 21))
+        self.assertEqual(grid.query((11, 1, 30, 2)), {"a"})
+        self.assertEqual(grid.query((12, 0, 13, 3)), set())  # touching
+        self.assertEqual(grid.query((-10, -10, 30, 30)), {"a", "b"})
+
+        grid.insert("a", (100, 100, 101, 101))
+        self.assertEqual(grid.query((0, 0, 12, 3)), set())
+        grid.remove("b")
+        self.assertEqual(len(grid), 1)
+        self.assertEqual(grid.query((-10, -10, 30, 30)), set())
+
+
+class TestCollisions(unittest.TestCase):
+    def test_polygons_overlap(self):
+        square = [(0, 0), (2, 0), (2, 2), (0, 2)]
+        diamond = [(3, 1), (4, 0), (5, 1), (4, 2)]
+        self.assertFalse(collisions.polygons_overlap(square, diamond))
+        # Their boxes overlap, but the shapes don't.
+        diamond = [(2.5, 1), (3.5, 0), (4.5, 1), (3.5, 2)]
+        self.assertFalse(collisions.polygons_overlap(square, diamond))
+        diamond = [(1.5, 1), (2.5, 0), (3.5, 1), (2.5, 2)]
+        self.assertTrue(collisions.polygons_overlap(square, diamond))
+
+    def test_sides(self):
+        checker = collisions.CollisionChecker()
+        checker.place("K1", SWITCH, 0, 0)
+        checker.place("K2", SWITCH, 19.05, 0)
+        # Under the switch, between its pins.
+        checker.place("D1", DIODE, -4.6, -5.05, 270, "bottom")
+        self.assertEqual(checker.find_collisions(), [])
+
+        # On top of the switch's peg hole.
+        checker.place("D2", DIODE, -5.08, 0, 270, "bottom")
+        self.assertEqual(checker.find_collisions(),
+                         [collisions.Collision("D2", "K1", "B")])
+
+        # Moving a part replaces it.
+        checker.place("D2", DIODE, 19.05 - 4.6, -5.05, 270, "bottom")
+        self.assertEqual(checker.find_collisions(), [])
+
+    def test_socket(self):
+        checker = collisions.CollisionChecker()
+        checker.place("K1", SOCKET, 0, 0)
+        checker.place("D1", DIODE, -4.6, -5.05, 270, "bottom")
+        self.assertEqual(checker.collisions_with("D1"), [])
+        checker.place("D2", DIODE, 0, 5, 0, "bottom")
+        self.assertEqual(checker.collisions_with("D2"),
+                         [collisions.Collision("D2", "K1", "B")])
+
+    def test_unknown_footprint(self):
+        checker = collisions.CollisionChecker()
+        checker.place("X1", "keycad:nothing", 0, 0)
+        self.assertEqual(checker.unchecked, {"X1"})
+        self.assertEqual(checker.find_collisions(), [])
+
+    def test_pcb(self):
+        pcb = Pcb(19.05, 19.05)
+        pcb.place_component_on_keyboard_grid(FakePart("R1", DIODE), 14, -5, 0,
+                                             "bottom")
+        pcb.place_component_on_keyboard_grid(FakePart("R2", DIODE), 14, -5, 0,
+                                             "bottom")
+        pcb.place_component_on_keyboard_grid(FakePart("R3", DIODE), 15, -5, 0,
+                                             "bottom")
+        self.assertEqual(pcb.find_collisions(),
+                         [collisions.Collision("R1", "R2", "B")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from keycad import diskcache
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._dir.name, "cache")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def test_default_cache_dir(self):
+        old_home = os.environ.get("XDG_CACHE_HOME")
+        try:
+            os.environ["XDG_CACHE_HOME"] = self._dir.name
+            self.assertEqual(diskcache.default_cache_dir("kle"),
+                             os.path.join(self._dir.name, "keycad", "kle"))
+        finally:
+            if old_home is None:
+                del os.environ["XDG_CACHE_HOME"]
+            else:
+                os.environ["XDG_CACHE_HOME"] = old_home
+
+    def test_write_atomically(self):
+        diskcache.write_atomically(self.path("a.x"), b"first")
+        diskcache.write_atomically(self.path("a.x"), b"second")
+        with open(self.path("a.x"), "rb") as f:
+            self.assertEqual(f.read(), b"second")
+        self.assertEqual(os.listdir(self.cache_dir), ["a.x"])
+
+    def test_failed_write_leaves_no_temp_file(self):
+        # A directory where the entry should go makes the final rename fail.
+        os.makedirs(self.path("a.x"))
+        with self.assertRaises(OSError):
+            diskcache.write_atomically(self.path("a.x"), b"data")
+        self.assertEqual(os.listdir(self.cache_dir), ["a.x"])
+
+    def test_evict(self):
+        for i, name in enumerate(("old.x", "new.x", "newest.x", "other.y")):
+            diskcache.write_atomically(self.path(name), b"0123456789")
+            os.utime(self.path(name), (i, i))
+        diskcache.evict(self.cache_dir, ".x", 25)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ["new.x", "newest.x", "other.y"])
+
+        diskcache.touch(self.path("new.x"))
+        diskcache.evict(self.cache_dir, ".x", 10)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ["new.x", "other.y"])
+
+
+if __name__ == "__main__":
+    unittest.main()
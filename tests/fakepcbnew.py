@@ -0,0 +1,239 @@
+'''
+A stand-in for the parts of KiCad's pcbnew module that keycad.kicad uses, so
+that its board edits can be tested without KiCad.
+
+LoadBoard() returns a copy of the board last saved under a filename, and
+SaveBoard() also writes the board as enough .kicad_pcb text for boardhash.
+'''
+
+import collections
+import copy
+import importlib
+import sys
+
+import keycad
+
+wxPoint = collections.namedtuple("wxPoint", ("x", "y"))
+wxSize = collections.namedtuple("wxSize", ("x", "y"))
+
+LAYER_NAMES = ("F.Cu", "B.Cu", "F.SilkS", "Edge.Cuts")
+F_Cu, B_Cu, F_SilkS, Edge_Cuts = range(len(LAYER_NAMES))
+PCB_LAYER_ID_COUNT = len(LAYER_NAMES)
+
+IU_PER_MM = 1000000
+S_ARC = 1
+GR_TEXT_HJUSTIFY_CENTER = 0
+
+# filename -> the board saved there
+boards = {}
+# The filename of each SaveBoard() call, in order.
+saves = []
+# The (net name, layer name) of the zones of each ZONE_FILLER.Fill() call.
+fills = []
+
+
+def reset():
+    boards.clear()
+    del saves[:]
+    del fills[:]
+
+
+class _Item:
+    '''A board item that records its setter calls.'''
+    def __init__(self, board=None):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if not name.startswith("Set"):
+            raise AttributeError(name)
+        return lambda *args: self.calls.append((name, args))
+
+
+class DRAWSEGMENT(_Item):
+    pass
+
+
+class TEXTE_PCB(_Item):
+    pass
+
+
+class ZONE_CONTAINER(_Item):
+    DIAGONAL_EDGE = 2
+
+    def __init__(self, netname, layer, x, y):
+        super().__init__()
+        self.netname = netname
+        self.layer = layer
+        self.corners = [wxPoint(x, y)]
+        self.keepout = False
+        self.filled = False
+
+    def GetNetname(self):
+        return self.netname
+
+    def GetLayer(self):
+        return self.layer
+
+    def GetNumCorners(self):
+        return len(self.corners)
+
+    def GetCornerPosition(self, i):
+        return self.corners[i]
+
+    def IsFilled(self):
+        return self.filled
+
+    def Hatch(self):
+        pass
+
+    def SetIsKeepout(self, keepout):
+        self.keepout = keepout
+
+    def GetIsKeepout(self):
+        return self.keepout
+
+    def Outline(self):
+        return self
+
+    def Append(self, x, y):
+        self.corners.append(wxPoint(x, y))
+
+
+ZONE_CONTAINERS = list
+
+
+class ZONE_FILLER:
+    def __init__(self, board):
+        self._board = board
+
+    def Fill(self, zones):
+        fills.append([(z.netname, LAYER_NAMES[z.layer]) for z in zones])
+        for zone in zones:
+            zone.filled = True
+
+
+class NETINFO_ITEM:
+    def __init__(self, code):
+        self._code = code
+
+    def GetNet(self):
+        return self._code
+
+
+class _Found:
+    def __init__(self, value):
+        self._value = value
+
+    def value(self):
+        return self._value
+
+
+class _NetsByName(dict):
+    def has_key(self, name):
+        return name in self
+
+    def find(self, name):
+        return _Found((name, self[name]))
+
+
+class EDA_RECT:
+    def __init__(self, left, top, right, bottom):
+        self._bounds = left, top, right, bottom
+
+    def GetLeft(self):
+        return self._bounds[0]
+
+    def GetTop(self):
+        return self._bounds[1]
+
+    def GetRight(self):
+        return self._bounds[2]
+
+    def GetBottom(self):
+        return self._bounds[3]
+
+
+class BOARD:
+    def __init__(self):
+        self.items = []
+        self.nets = {"": 0}
+        # (x1, y1, x2, y2) of each track on F.Cu
+        self.tracks = []
+
+    def ComputeBoundingBox(self, board_edges_only):
+        pass
+
+    def GetBoundingBox(self):
+        return EDA_RECT(0, 0, 100 * IU_PER_MM, 50 * IU_PER_MM)
+
+    def GetLayerName(self, layer):
+        return LAYER_NAMES[layer]
+
+    def GetNetsByName(self):
+        return _NetsByName(
+            (name, NETINFO_ITEM(code)) for name, code in self.nets.items())
+
+    def Add(self, item):
+        self.items.append(item)
+
+    def InsertArea(self, netcode, _, layer, x, y, style):
+        netname = {code: name for name, code in self.nets.items()}[netcode]
+        zone = ZONE_CONTAINER(netname, layer, x, y)
+        self.items.append(zone)
+        return zone
+
+    def Zones(self):
+        return [i for i in self.items if isinstance(i, ZONE_CONTAINER)]
+
+    def to_text(self):
+        lines = ["(kicad_pcb (version 20171130)"]
+        for name, code in sorted(self.nets.items(), key=lambda n: n[1]):
+            lines.append('  (net %d "%s")' % (code, name))
+        for track in self.tracks:
+            lines.append("  (segment (start %d %d) (end %d %d) (width 250000) "
+                         "(layer F.Cu) (net 1))" % track)
+        for zone in self.Zones():
+            pts = "(pts %s)" % " ".join("(xy %d %d)" % p for p in zone.corners)
+            # Like KiCad, a filled zone is saved with its fill.
+            fill = " (filled_polygon %s)" % pts if zone.filled else ""
+            lines.append('  (zone (net %d) (net_name "%s") (layer %s) '
+                         "(polygon %s)%s)" %
+                         (self.nets[zone.netname], zone.netname,
+                          LAYER_NAMES[zone.layer], pts, fill))
+        lines.append(")")
+        return "\n".join(lines) + "\n"
+
+
+def LoadBoard(filename):
+    return copy.deepcopy(boards[filename])
+
+
+def SaveBoard(filename, board):
+    boards[filename] = copy.deepcopy(board)
+    saves.append(filename)
+    with open(filename, "w") as f:
+        f.write(board.to_text())
+
+
+def import_kicad():
+    '''
+    Imports a copy of keycad.kicad that uses this module as pcbnew, leaving
+    sys.modules and the keycad package as they were.
+    '''
+    old_pcbnew = sys.modules.get("pcbnew")
+    old_kicad = sys.modules.pop("keycad.kicad", None)
+    old_attr = keycad.__dict__.get("kicad")
+    sys.modules["pcbnew"] = sys.modules[__name__]
+    try:
+        return importlib.import_module("keycad.kicad")
+    finally:
+        for name, module in (("pcbnew", old_pcbnew), ("keycad.kicad",
+                                                      old_kicad)):
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        if old_attr is None:
+            keycad.__dict__.pop("kicad", None)
+        else:
+            keycad.kicad = old_attr
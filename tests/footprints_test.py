@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from keycad import footprints, sexpr
+
+
+class TestFootprints(unittest.TestCase):
+    def test_pads(self):
+        diode = footprints.get_footprint_index().get("keycad:D_0805")
+        self.assertEqual(diode.name, "D_0805")
+        self.assertEqual(diode.layer, "F.Cu")
+        pads = {p.number: p for p in diode.pads}
+        self.assertEqual(sorted(pads), ["1", "2"])
+        self.assertEqual((pads["1"].x, pads["1"].y), (-0.95, 0))
+        self.assertEqual((pads["1"].width, pads["1"].height), (0.7, 1.3))
+        self.assertEqual(pads["1"].kind, "smd")
+        self.assertIsNone(pads["1"].drill)
+        self.assertIn("Diode_SMD.3dshapes", diode.model)
+
+        switch = footprints.get_footprint_index().get("keycad:SW_MX")
+        holes = [p for p in switch.pads if p.kind == "np_thru_hole"]
+        self.assertIn(3.9878, [p.drill for p in holes])
+
+    def test_courtyard(self):
+        capacitor = footprints.get_footprint_index().get(
+            "keycad:C_0805_2012Metric")
+        self.assertEqual(capacitor.bbox, (-1.68, -0.95, 1.68, 0.95))
+        self.assertEqual(
+            sorted(capacitor.courtyard),
+            sorted([(-1.68, -0.95), (1.68, -0.95), (1.68, 0.95),
+                    (-1.68, 0.95)]))
+
+        # No courtyard, so the box around the switch's outline.
+        switch = footprints.get_footprint_index().get("keycad:SW_MX")
+        self.assertEqual(switch.bbox, (-7.5, -7.5, 7.5, 7.5))
+        self.assertEqual(len(switch.courtyard), 4)
+
+    def test_rotated_pad_extent(self):
+        module = sexpr.parse(
+            "(module X (layer F.Cu) (pad 1 smd rect (at 0 0 90) (size 4 2) "
+            "(layers F.Cu)))")
+        self.assertEqual(
+            tuple(round(v, 6) for v in footprints.read_footprint(module).bbox),
+            (-1, -2, 1, 2))
+
+    def test_reloaded_when_changed(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, "lib.pretty"))
+            path = os.path.join(d, "lib.pretty", "D.kicad_mod")
+            shutil.copy(os.path.join("keycad.pretty", "D_0805.kicad_mod"),
+                        path)
+            index = footprints.FootprintIndex(footprints.FootprintLibrary([d]))
+            first = index.get("lib:D")
+            self.assertIs(index.get("lib:D"), first)
+
+            with open(path, "r") as f:
+                text = f.read()
+            with open(path, "w") as f:
+                f.write(text.replace("(at 0.95 0)", "(at 1.05 0)"))
+            os.utime(path, ns=(0, 0))
+            pads = {p.number: p for p in index.get("lib:D").pads}
+            self.assertEqual(pads["2"].x, 1.05)
+
+            with self.assertRaises(FileNotFoundError):
+                index.get("lib:nothing")
+
+
+if __name__ == '__main__':
+    unittest.main()
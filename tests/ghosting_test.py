@@ -0,0 +1,86 @@
+import itertools
+import unittest
+
+import boards
+from keycad import ghosting, matrix
+
+MatrixKey = ghosting.MatrixKey
+
+
+def round_robin_keys(lines):
+    # Driving line d and reading line r is the key from r to d.
+    return [
+        MatrixKey("K%d" % (i + 1), "LINE_%d" % r, "LINE_%d" % d)
+        for i, (d, r) in enumerate((d, r) for d in range(1, lines + 1)
+                                   for r in range(1, lines + 1) if d != r)
+    ]
+
+
+def smallest_ghosting_chord(keys, k, max_keys):
+    '''Tries every chord, smallest first.'''
+    others = [i for i in range(len(keys)) if i != k]
+    for size in range(1, max_keys + 1):
+        for chord in itertools.combinations(others, size):
+            if k in ghosting.chord_ghosts(keys, chord):
+                return size
+    return None
+
+
+class TestGhosting(unittest.TestCase):
+    def test_standard(self):
+        keys = [
+            MatrixKey("K%d" % (r * 3 + c + 1), "COL_%d" % c, "ROW_%d" % r)
+            for r in range(3) for c in range(3)
+        ]
+        # Diodes stop every chain, even with every key held.
+        self.assertEqual(ghosting.chord_ghosts(keys, range(8)), set())
+        report = ghosting.verify_keys(keys, matrix.STANDARD)
+        self.assertIsNone(report["rollover"])
+        self.assertEqual((report["ghosts"], report["masked"]), ([], []))
+
+    def test_round_robin(self):
+        keys = round_robin_keys(4)
+        report = ghosting.verify_keys(keys, matrix.ROUND_ROBIN, 3)
+        self.assertEqual(report["rollover"], 1)
+        self.assertEqual(len(report["ghosts"]), len(keys))
+        # The reported chords are as small as trying every chord finds.
+        refs = [k.ref for k in keys]
+        for ghost in report["ghosts"]:
+            k = refs.index(ghost["key"])
+            chord = [refs.index(ref) for ref in ghost["chord"]]
+            self.assertIn(k, ghosting.chord_ghosts(keys, chord))
+            self.assertEqual(len(chord), smallest_ghosting_chord(keys, k, 3))
+
+    def test_masked(self):
+        keys = [
+            MatrixKey("K1", "COL_1", "ROW_1"),
+            MatrixKey("K2", "COL_1", "ROW_1"),
+            MatrixKey("K3", "ROW_1", "COL_1")
+        ]
+        report = ghosting.verify_keys(keys, matrix.STANDARD)
+        self.assertEqual([m["key"] for m in report["masked"]], ["K2", "K3"])
+
+    def build(self, topologies, rows=6, cols=18):
+        board = boards.build(boards.grid(rows, cols),
+                             add_per_key_rgb=False,
+                             matrix_topologies=topologies)
+        return ghosting.verify(board.store.netlist,
+                               board.schematic.matrix_topology)
+
+    def test_build(self):
+        report = self.build((matrix.STANDARD, ), 5, 12)
+        self.assertEqual(report["keys"], 60)
+        self.assertIsNone(report["rollover"])
+
+        # Two held keys in one duplex row can complete a chain through a
+        # third.
+        report = self.build((matrix.STANDARD, matrix.DUPLEX))
+        self.assertEqual(report["rollover"], 2)
+        self.assertEqual(report["keys"], 108)
+        self.assertEqual(report["masked"], [])
+        self.assertTrue(
+            all(len(ghost["chord"]) == 3 for ghost in report["ghosts"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from keycad import key
+
+
+class TestKeyTable(unittest.TestCase):
+    def test_views(self):
+        table = key.KeyTable()
+        a = table.append(0, 0, text="Esc")
+        b = table.append(1.5,
+                         2,
+                         text="~\n`",
+                         width=2,
+                         height=1.5,
+                         is_homing=True)
+        self.assertEqual(len(table), 2)
+        self.assertIs(table[1], b)
+        self.assertEqual(b.labels, ["~", "`"])
+        self.assertEqual((b.x, b.y, b.width, b.height), (1.5, 2, 2, 1.5))
+        self.assertTrue(b.is_homing)
+        self.assertFalse(a.is_homing)
+        self.assertEqual(b.printable_label, "GRV")
+
+        b.matrix_row = 1
+        b.matrix_col = 3
+        self.assertEqual(b.matrix_identifier, "B3")
+        self.assertEqual(b.rowcol_label, "R1C3")
+        self.assertEqual(a.matrix_row, -1)
+
+        with self.assertRaises(AttributeError):
+            b.something_else = 1
+
+    def test_geometry(self):
+        table = key.KeyTable()
+        a = table.append(0, 0)
+        self.assertEqual(a.position, (0, 0))
+        # Keys appended after geometry was computed are picked up too.
+        b = table.append(1, 1, width=2.25, height=2)
+        self.assertEqual(b.position, (1.625, 1.5))
+
+        table.assign_led_coordinates(0, 0, 3.25, 3)
+        self.assertEqual((a.led_x, a.led_y, a.led_identifier), (0, 0, 0))
+        self.assertEqual((b.led_x, b.led_y, b.led_identifier),
+                         (int(1.625 / 3.25 * 224), int(1.5 / 3 * 64), 1))
+        table.assign_led_identifiers([1, 0])
+        self.assertEqual((a.led_identifier, b.led_identifier), (1, 0))
+
+        b.matrix_row = 0
+        b.matrix_col = 1
+        labels = table.get_rowcol_label_dicts(19.05, 19.05)
+        self.assertEqual(labels[1], b.get_rowcol_label_dict(19.05, 19.05))
+        self.assertEqual(labels[1]["text"], "R0C1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+
+import fakepcbnew
+
+kicad = fakepcbnew.import_kicad()
+
+
+class TestBoardSession(unittest.TestCase):
+    def setUp(self):
+        fakepcbnew.reset()
+        self._dir = tempfile.TemporaryDirectory()
+        self.pcb_filename = os.path.join(self._dir.name, "board.kicad_pcb")
+        fakepcbnew.boards[self.pcb_filename] = fakepcbnew.BOARD()
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def kinds(self):
+        board = fakepcbnew.boards[self.pcb_filename]
+        return [type(item).__name__ for item in board.items]
+
+    def test_edits_apply_in_order_and_save_once(self):
+        with kicad.BoardSession(self.pcb_filename) as session:
+            session.add_labels([{"text": "hi", "x_mm": 1, "y_mm": 2}])
+            session.add_outline(0, 0, 100, 50)
+            session.add_keepout(10, -5, 9.4, 6.1)
+            session.add_labels([{"text": "bye", "x_mm": 3, "y_mm": 4}])
+            # Nothing happens until the block exits.
+            self.assertEqual(session.board.items, [])
+        self.assertEqual(fakepcbnew.saves, [self.pcb_filename])
+        # Four sides and four corners.
+        self.assertEqual(self.kinds(), ["TEXTE_PCB"] + ["DRAWSEGMENT"] * 8 +
+                         ["ZONE_CONTAINER", "TEXTE_PCB"])
+
+        board = fakepcbnew.boards[self.pcb_filename]
+        texts = [
+            dict(item.calls)["SetText"][0] for item in board.items
+            if isinstance(item, fakepcbnew.TEXTE_PCB)
+        ]
+        self.assertEqual(texts, ["hi", "bye"])
+        self.assertTrue(board.items[-2].keepout)
+
+    def test_exception_skips_save(self):
+        with self.assertRaises(RuntimeError):
+            with kicad.BoardSession(self.pcb_filename) as session:
+                session.add_outline(0, 0, 100, 50)
+                raise RuntimeError("stop")
+        self.assertEqual(fakepcbnew.saves, [])
+        self.assertEqual(self.kinds(), [])
+
+    def test_new_board(self):
+        fakepcbnew.boards[self.pcb_filename].Add(fakepcbnew.DRAWSEGMENT())
+        kicad.add_outline_to_board(self.pcb_filename,
+                                   0,
+                                   0,
+                                   100,
+                                   50,
+                                   usb_cutout_position=50,
+                                   usb_cutout_width=9.4,
+                                   modify_existing=False)
+        self.assertEqual(fakepcbnew.saves, [self.pcb_filename])
+        # The old board's segment is gone, and the USB cutout splits the top
+        # side in two.
+        self.assertEqual(self.kinds(), ["DRAWSEGMENT"] * 9)
+
+
+class TestPourFills(unittest.TestCase):
+    def setUp(self):
+        fakepcbnew.reset()
+        self._dir = tempfile.TemporaryDirectory()
+        self.pcb_filename = os.path.join(self._dir.name, "board.kicad_pcb")
+        board = fakepcbnew.BOARD()
+        board.nets["GND"] = 1
+        board.tracks.append((0, 0, 10, 0))
+        self.save(board)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def save(self, board):
+        '''Saves board as if by hand, then forgets that it was saved.'''
+        fakepcbnew.SaveBoard(self.pcb_filename, board)
+        del fakepcbnew.saves[:]
+        del fakepcbnew.fills[:]
+
+    def pour(self):
+        return kicad.pour_fills_on_board(self.pcb_filename, incremental=True)
+
+    def test_unchanged_board_is_skipped(self):
+        both = [("GND", "F.Cu"), ("GND", "B.Cu")]
+        (report, ) = self.pour()
+        self.assertEqual(report[0], both)
+        self.assertEqual(fakepcbnew.fills, [both])
+        self.assertEqual(fakepcbnew.saves, [self.pcb_filename])
+
+        self.assertIsNone(self.pour())
+        self.assertEqual(fakepcbnew.fills, [both])
+        self.assertEqual(fakepcbnew.saves, [self.pcb_filename])
+
+        # Without incremental, everything is filled again.
+        kicad.pour_fills_on_board(self.pcb_filename)
+        self.assertEqual(fakepcbnew.fills, [both, both])
+        self.assertEqual(len(fakepcbnew.saves), 2)
+
+    def test_moved_zone_refills_only_itself(self):
+        self.pour()
+        board = fakepcbnew.boards[self.pcb_filename]
+        self.assertEqual(len(board.Zones()), 2)
+        zone = [z for z in board.Zones() if z.layer == fakepcbnew.B_Cu][0]
+        zone.corners[0] = fakepcbnew.wxPoint(1, 1)
+        self.save(board)
+
+        self.pour()
+        self.assertEqual(fakepcbnew.fills, [[("GND", "B.Cu")]])
+        self.assertEqual(fakepcbnew.saves, [self.pcb_filename])
+        # The existing zones were refilled, not added again.
+        self.assertEqual(len(fakepcbnew.boards[self.pcb_filename].Zones()), 2)
+
+    def test_copper_change_refills_everything(self):
+        self.pour()
+        board = fakepcbnew.boards[self.pcb_filename]
+        board.tracks.append((0, 10, 10, 10))
+        self.save(board)
+
+        self.pour()
+        self.assertEqual(fakepcbnew.fills, [[("GND", "F.Cu"),
+                                             ("GND", "B.Cu")]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,10 @@
+import io
+import json
+import os
+import tempfile
 import unittest
-from keycad import kle
+
+from keycad import kle, klestream
 
 
 class TestKle(unittest.TestCase):
@@ -86,6 +91,100 @@ class TestKle(unittest.TestCase):
             if key.labels[0] == '!':
                 self.assertEqual(key.y, 1.5)
 
+    def _load_text(self, text):
+        with tempfile.NamedTemporaryFile("w", suffix=".json",
+                                         delete=False) as f:
+            f.write(text)
+        try:
+            p = kle.Parser()
+            p.load(f.name)
+        finally:
+            os.unlink(f.name)
+        return p
+
+    def test_streaming_matches_json(self):
+        with open("kle_layouts/ansi-104.json", "r") as f:
+            text = f.read()
+        expected = kle.Parser()
+        expected.handle_dict(json.loads(text))
+
+        # A tiny chunk size makes tokens straddle chunk boundaries.
+        p = kle.Parser()
+        p.reset()
+        reader = klestream.LayoutReader(io.StringIO(text), chunk_size=7)
+        for _ in p._process_rows(reader.rows()):
+            pass
+
+        self.assertEqual(p.key_count, expected.key_count)
+        for a, b in zip(p.keys, expected.keys):
+            self.assertEqual(a.labels, b.labels)
+            self.assertEqual((a.x, a.y, a.width, a.height),
+                             (b.x, b.y, b.width, b.height))
+        self.assertEqual(p.board_right, expected.board_right)
+        self.assertEqual(p.board_bottom, expected.board_bottom)
+
+    def test_relaxed_syntax(self):
+        # KLE's "raw data" tab: no outer array, unquoted keys, JS strings.
+        p = self._load_text("""
+// Function row
+[{a:7, w:1.5}, 'Esc', "F1"],
+[{y:0.5}, "~\\n`", /* inline */ '\\'', {w:2,}, "Back\\u0020Space",],
+""")
+        self.assertEqual(p.key_count, 5)
+        self.assertEqual(p.row_count, 2)
+        self.assertEqual(p.keys[0].width, 1.5)
+        self.assertEqual(p.keys[0].labels, ["Esc"])
+        self.assertEqual(p.keys[2].labels, ["~", "`"])
+        self.assertEqual(p.keys[2].y, 1.5)
+        self.assertEqual(p.keys[3].labels, ["'"])
+        self.assertEqual(p.keys[4].labels, ["Back Space"])
+        self.assertEqual(p.keys[4].width, 2)
+
+        p = self._load_text('[{name: "x"}, ["A", "B"], ["C"]]')
+        self.assertEqual(p.key_count, 3)
+        self.assertEqual(p.row_count, 2)
+
+        p = self._load_text('["A", "B"]\n["C"]')
+        self.assertEqual(p.key_count, 3)
+
+        with self.assertRaises(ValueError):
+            self._load_text('[["A", 1]]')
+
+    def test_rotation(self):
+        p = kle.Parser()
+        p.handle_dict([[{"r": 90, "rx": 1, "ry": 1}, "A", "B"], ["C"]])
+        a, b, c = p.keys
+        # Setting the rotation origin moves the cursor there, and each new
+        # row starts back at rotation_x.
+        self.assertEqual((a.x, a.y), (1, 1))
+        self.assertEqual((b.x, b.y), (2, 1))
+        self.assertEqual((c.x, c.y), (1, 2))
+        self.assertEqual(a.rotation, 90)
+
+        # A quarter turn clockwise about (1, 1).
+        for k, expected in ((a, (0, 1)), (b, (0, 2)), (c, (-1, 1))):
+            for got, want in zip(k.position, expected):
+                self.assertAlmostEqual(got, want)
+        self.assertAlmostEqual(p.board_left, -1)
+        self.assertAlmostEqual(p.board_top, 1)
+        self.assertAlmostEqual(p.board_right, 1)
+        self.assertAlmostEqual(p.board_bottom, 3)
+
+        # Unrotated keys are unaffected.
+        p = kle.Parser()
+        p.handle_dict([[{"w": 2}, "A"], [{"r": 0}, "B"]])
+        self.assertEqual(p.keys[0].position, (0.5, 0))
+        self.assertEqual((p.board_right, p.board_bottom), (2, 2))
+
+    def test_iter_keys(self):
+        p = kle.Parser()
+        seen = 0
+        for key in p.iter_keys("kle_layouts/planck.json"):
+            seen += 1
+            self.assertIs(key, p.keys[-1])
+        self.assertEqual(seen, 47)
+        self.assertEqual(p.key_count, 47)
+
 
 if __name__ == "__main__":
     unittest.main()
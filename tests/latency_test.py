@@ -0,0 +1,83 @@
+import json
+import unittest
+
+import boards
+from keycad import latency, matrix
+from keycad.mcu import Mcu
+
+
+class TestLatency(unittest.TestCase):
+    def test_scan_time(self):
+        # 4 lines of 30us, 4 * (10 + 2) pin accesses of 2 cycles, the
+        # overheads, all at 1MHz.
+        self.assertEqual(
+            latency.scan_time_us(4, 10, 1, 2), 4 * 30 + 4 * 12 * 2 +
+            latency.SCAN_OVERHEAD_CYCLES + 40 * latency.KEY_OVERHEAD_CYCLES)
+        # A faster clock only speeds up the pin accesses.
+        self.assertGreater(latency.scan_time_us(4, 10, 16, 20),
+                           latency.scan_time_us(4, 10, 72, 20))
+        self.assertGreater(latency.scan_time_us(4, 10, 1000, 1), 4 * 30)
+
+    def test_worst_latency(self):
+        self.assertEqual(latency.worst_latency_us(500, latency.EAGER, 5),
+                         500 + 1000)
+        self.assertEqual(latency.worst_latency_us(500, latency.DEFER, 5),
+                         500 + 1000 + 5000 + 500)
+        with self.assertRaises(ValueError):
+            latency.worst_latency_us(500, "sym_random", 5)
+
+    def test_analyze(self):
+        board = boards.build(
+            json.loads('[["A","B","C","D","E"],["F","G","H","I","J"]]'),
+            add_per_key_rgb=False)
+        schematic, builder = board.schematic, board.builder
+        legend = schematic.get_legend_dict()
+        report = latency.analyze(schematic.key_matrix_keys, legend["rows"],
+                                 legend["cols"], builder.mcu)
+
+        self.assertEqual((report["mcu"], report["clock_mhz"]),
+                         ("ProMicro", 16))
+        self.assertEqual((report["rows"], report["cols"], report["keys"]),
+                         (2, 5, 10))
+        col2row, row2col = report["orientations"]
+        self.assertTrue(col2row["current"])
+        self.assertEqual((col2row["strobes"], row2col["strobes"]), (2, 5))
+        # Driving the two rows settles fewer lines than driving the five
+        # columns.
+        self.assertLess(col2row["scan_us"], row2col["scan_us"])
+        self.assertEqual(report["scan_us"], col2row["scan_us"])
+        self.assertEqual(
+            len(report["debounce"]),
+            len(latency.DEBOUNCE_TYPES) * len(latency.DEBOUNCE_MS))
+        eager = [
+            d["worst_latency_us"] for d in report["debounce"]
+            if d["type"] == latency.EAGER
+        ]
+        self.assertEqual(len(set(eager)), 1)
+        self.assertLess(eager[0], report["worst_latency_us"])
+        json.dumps(report)
+
+    def test_topologies(self):
+        mcu = Mcu()
+        duplex = latency.analyze([[1] * 4] * 6, ["R"] * 3, ["C"] * 4,
+                                 mcu,
+                                 topology=matrix.DUPLEX)
+        self.assertEqual(len(duplex["orientations"]), 1)
+        self.assertEqual(duplex["orientations"][0]["strobes"], 3 + 4)
+        self.assertEqual((duplex["rows"], duplex["cols"], duplex["pins"]),
+                         (6, 4, 7))
+        # Both passes, with the overhead paid once.
+        self.assertEqual(
+            duplex["scan_us"],
+            latency.scan_time_us(3, 4, 1, 1) +
+            latency.scan_time_us(4, 3, 1, 1) - latency.SCAN_OVERHEAD_CYCLES)
+
+        round_robin = latency.analyze([[1] * 4] * 5, ["L"] * 5, [],
+                                      mcu,
+                                      topology=matrix.ROUND_ROBIN)
+        self.assertEqual(round_robin["direction"], matrix.ROUND_ROBIN)
+        self.assertEqual(round_robin["orientations"][0]["reads_per_strobe"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import unittest
+
+import boards
+from keycad import ledchain
+
+# Three rows of four keys.
+GRID = [(x, y) for y in range(3) for x in range(4)]
+
+
+class TestLedChain(unittest.TestCase):
+    def test_parse_order(self):
+        self.assertEqual(ledchain.order(GRID), list(range(12)))
+        self.assertEqual(ledchain.chain_length(GRID, ledchain.order(GRID)),
+                         3 * 3 + 2 * 4)
+
+    def test_serpentine(self):
+        self.assertEqual(ledchain.order(GRID, ledchain.SERPENTINE),
+                         [0, 1, 2, 3, 7, 6, 5, 4, 8, 9, 10, 11])
+
+    def test_tsp(self):
+        # Keys in no particular order, in two clusters.
+        positions = [(0, 0), (10, 1), (1, 0), (11, 0), (0, 1), (10, 0), (1, 1),
+                     (11, 1)]
+        serpentine = ledchain.order(positions, ledchain.SERPENTINE)
+        tsp = ledchain.order(positions, ledchain.TSP)
+        self.assertEqual(sorted(tsp), list(range(len(positions))))
+        self.assertLess(ledchain.chain_length(positions, tsp),
+                        ledchain.chain_length(positions, serpentine))
+        self.assertEqual(ledchain.chain_length(positions, tsp), 3 + 9 + 3)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            ledchain.order(GRID, "random")
+
+    def test_chain_count(self):
+        self.assertEqual(ledchain.frame_time_us(10), 380)
+        self.assertEqual(ledchain.chain_count(10, 1000, 4), 1)
+        # Five LEDs a chain take 230us.
+        self.assertEqual(ledchain.chain_count(10, 230, 4), 2)
+        self.assertEqual(ledchain.chain_count(10, 229, 4), 3)
+        self.assertEqual(ledchain.chain_count(10, 0, 4), 4)
+
+    def test_split(self):
+        self.assertEqual(ledchain.split(list(range(7)), 3),
+                         [[0, 1, 2], [3, 4], [5, 6]])
+        self.assertEqual(ledchain.split([4, 2], 1), [[4, 2]])
+
+    def test_report(self):
+        chains = ledchain.report([[3, 1, 2], [0, 4]], ["PA1", "PB9"])
+        self.assertEqual([c["pin"] for c in chains], ["PA1", "PB9"])
+        self.assertEqual([(c["first_led"], c["last_led"]) for c in chains],
+                         [(0, 2), (3, 4)])
+        self.assertEqual(chains[0]["frame_time_us"], 3 * 30 + 80)
+        self.assertEqual(chains[1]["max_current_ma"], 2 * 60)
+
+    def build(self, **kwargs):
+        board = boards.build(json.loads('[["A","B","C"],["D","E","F"]]'),
+                             add_pro_micro=False,
+                             add_blue_pill=True,
+                             led_chain_order=ledchain.TSP,
+                             **kwargs)
+        return (board.parser, board.schematic, board.builder,
+                boards.nets(board.store))
+
+    def test_build(self):
+        parser, schematic, builder, nets = self.build()
+
+        # The chain runs back along the second row, and the LEDs are
+        # numbered along it.
+        identifiers = [key.led_identifier for key in parser.keys]
+        self.assertEqual(identifiers, [0, 1, 2, 5, 4, 3])
+        self.assertIn(("L1", "4"), nets["LED_DATA"])
+        self.assertEqual(nets["L4_DIN"], [("L3", "2"), ("L4", "4")])
+        self.assertEqual(len(schematic.led_data_pin_names), 1)
+
+    def test_build_chains(self):
+        # Three LEDs a chain take 170us, and six take 260us.
+        parser, schematic, builder, nets = self.build(led_frame_time_us=200)
+        self.assertEqual(builder.led_chains, [[0, 1, 2], [5, 4, 3]])
+        self.assertIn(("L1", "4"), nets["LED_DATA"])
+        self.assertIn(("L4", "4"), nets["LED_DATA_2"])
+        self.assertNotIn("L4_DIN", nets)
+        self.assertEqual(nets["L5_DIN"], [("L4", "2"), ("L5", "4")])
+        pins = schematic.led_data_pin_names
+        self.assertEqual(len(pins), 2)
+        self.assertNotIn(pins[1], schematic.get_legend_dict()["rows"])
+        self.assertNotIn(pins[1], schematic.get_legend_dict()["cols"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import collections
+import unittest
+
+from keycad import matrix
+
+FakeKey = collections.namedtuple("FakeKey", ("y", "position"))
+
+
+def column_staggered_keys():
+    # Three rows of five keys, each column a little higher or lower than the
+    # last, listed column by column as some layouts are.
+    stagger = (0.3, 0, -0.25, 0, 0.4)
+    return [
+        FakeKey(col + row * 0.01, (col, row + stagger[col]))
+        for col in range(5) for row in range(3)
+    ]
+
+
+class TestMatrix(unittest.TestCase):
+    def test_matrix_size(self):
+        self.assertEqual(matrix.matrix_size(60, 5, 14, 20), (5, 14, False))
+        self.assertEqual(matrix.matrix_size(60, 5, 14, 18), (8, 8, True))
+        with self.assertRaises(OverflowError):
+            matrix.matrix_size(120, 6, 22, 18)
+
+    def test_matrix_shape(self):
+        # A layout that fits keeps its own rows and columns.
+        self.assertEqual(matrix.matrix_shape(60, 5, 14, 20, matrix.TOPOLOGIES),
+                         (matrix.STANDARD, 5, 14, False))
+        # A square drives the fewest lines when it fits.
+        self.assertEqual(matrix.matrix_shape(60, 5, 14, 18, matrix.TOPOLOGIES),
+                         (matrix.STANDARD, 8, 8, True))
+        # A full size board doesn't fit a square on 18 GPIOs, but fits 6
+        # duplex row nets and 9 columns, or 11 round robin lines. Round robin
+        # drives fewer lines but ghosts with two keys held, so it only wins
+        # when nothing else fits.
+        shape = matrix.matrix_shape(104, 6, 22, 18, matrix.TOPOLOGIES)
+        self.assertEqual(shape, (matrix.DUPLEX, 12, 9, True))
+        self.assertEqual(
+            matrix.matrix_shape(104, 6, 22, 18,
+                                (matrix.STANDARD, matrix.ROUND_ROBIN)),
+            (matrix.ROUND_ROBIN, 11, 10, True))
+        self.assertEqual(
+            matrix.matrix_shape(104, 6, 22, 13, matrix.TOPOLOGIES),
+            (matrix.ROUND_ROBIN, 11, 10, True))
+        self.assertEqual(matrix.net_counts(shape), (6, 9))
+        self.assertEqual(matrix.strobe_count(shape), 15)
+        with self.assertRaises(OverflowError):
+            matrix.matrix_shape(104, 6, 22, 18)
+        with self.assertRaises(OverflowError):
+            matrix.matrix_shape(104, 6, 22, 11, matrix.TOPOLOGIES)
+
+    def test_wiring(self):
+        self.assertEqual(matrix.duplex_row(4), (2, False))
+        self.assertEqual(matrix.duplex_row(5), (2, True))
+        # A round robin row never reads the line it drives.
+        for row in range(4):
+            lines = [matrix.round_robin_line(row, col) for col in range(3)]
+            self.assertEqual(sorted(lines + [row]), list(range(4)))
+
+    def test_parse_order(self):
+        keys = [FakeKey(0, (0, 0)), FakeKey(0, (1, 0)), FakeKey(1, (0, 1))]
+        self.assertEqual(matrix.assign(keys, 2, 2, False), [(0, 0), (0, 1),
+                                                            (1, 0)])
+        # A square matrix fills row by row.
+        self.assertEqual(matrix.assign(keys, 2, 2, True), [(0, 0), (0, 1),
+                                                           (1, 0)])
+
+    def test_net_length(self):
+        positions = [(0, 0), (1, 0), (0, 1), (1, 1.5)]
+        self.assertEqual(
+            matrix.net_length(positions, [(0, 0), (0, 1), (1, 0), (1, 1)]),
+            1 + 1.5 + 1 + 1.5)
+
+    def test_wirelength(self):
+        keys = column_staggered_keys()
+        positions = [key.position for key in keys]
+        cells = matrix.assign(keys, 3, 5, False, matrix.WIRELENGTH)
+
+        # Each physical row becomes a matrix row, left to right, and each
+        # physical column a matrix column, top to bottom.
+        self.assertEqual(cells,
+                         [(row, col) for col in range(5) for row in range(3)])
+        self.assertLess(
+            matrix.net_length(positions, cells),
+            matrix.net_length(positions, matrix.assign(keys, 3, 5, False)))
+
+    def test_wirelength_square(self):
+        keys = column_staggered_keys()
+        cells = matrix.assign(keys, 4, 4, True, matrix.WIRELENGTH)
+        self.assertEqual(len(set(cells)), len(keys))
+
+        # Every row and column is used, so none of their nets is empty.
+        rows = {row for row, _ in cells}
+        cols = {col for _, col in cells}
+        self.assertEqual(rows, set(range(len(rows))))
+        self.assertEqual(cols, set(range(len(cols))))
+        self.assertLessEqual(max(rows), 3)
+        self.assertLessEqual(max(cols), 3)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            matrix.assign(column_staggered_keys(), 3, 5, False, "random")
+
+
+if __name__ == "__main__":
+    unittest.main()
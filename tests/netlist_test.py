@@ -0,0 +1,80 @@
+import collections
+import io
+import json
+import unittest
+
+import boards
+from keycad import netlist
+
+FakePart = collections.namedtuple("FakePart", ("ref", "value", "footprint"))
+FakePin = collections.namedtuple("FakePin", ("part", "num"))
+
+
+class TestNetlist(unittest.TestCase):
+    def test_connect_and_rename(self):
+        model = netlist.Netlist()
+        k10 = FakePart("K10", "A", "keycad:SW_MX")
+        k2 = FakePart("K2", "B", "keycad:SW_MX")
+        d1 = FakePart("D1", "1N4148", "keycad:D_0805")
+        for part in (k10, k2, d1):
+            model.add_part(part, "keycad", "X")
+        gnd = object()
+        model.add_net(gnd, "GND")
+
+        model.connect(gnd, FakePin(k10, 1))
+        model.connect(FakePin(k2, 1), FakePin(d1, 2))
+        model.connect(FakePin(d1, 2), gnd)
+        model.connect(FakePin(k2, 2), FakePin(d1, 1))
+        model.rename(FakePin(d1, 1), "ROW_1")
+        model.connect(FakePin(k10, 2), FakePin(k2, "A1"))
+
+        names, offsets, part_indexes, pin_nums = model.net_table()
+        nets = {
+            name: [(model.parts[part_indexes[j]].ref, pin_nums[j])
+                   for j in range(offsets[i], offsets[i + 1])]
+            for i, name in enumerate(names)
+        }
+        self.assertEqual(
+            nets, {
+                "GND": [("D1", "2"), ("K2", "1"), ("K10", "1")],
+                "ROW_1": [("D1", "1"), ("K2", "2")],
+                "Net-(K2-PadA1)": [("K2", "A1"), ("K10", "2")],
+            })
+        self.assertEqual(names, ["GND", "Net-(K2-PadA1)", "ROW_1"])
+
+    def test_write(self):
+        model = netlist.Netlist()
+        part = FakePart('J"1', "USB", "keycad:USB")
+        model.add_part(part, "keycad", "USB_C")
+        model.rename(FakePin(part, "A1"), "GND")
+        f = io.StringIO()
+        model.write(f)
+        text = f.getvalue()
+        self.assertTrue(text.startswith("(export (version D)\n"))
+        self.assertIn('(comp (ref "J\\"1")', text)
+        self.assertIn('(libsource (lib "keycad") (part "USB_C"))', text)
+        self.assertIn(
+            '(net (code 1) (name "GND")\n      (node (ref "J\\"1") (pin "A1"))',
+            text)
+        self.assertTrue(text.endswith(")))\n"))
+
+    def test_matches_skidl(self):
+        layout = json.loads('''
+[["Esc","Q","W","E","R","T","Y","U","I","O","P","Back<br>Space"],
+[{"w":1.25},"Tab","A","S","D","F","G","H","J","K","L",{"w":1.75},"Enter"],
+[{"w":1.75},"Shift","Z","X","C","V","B","N","M","<\\n.",{"w":1.25},"Shift","Fn"],
+[{"w":1.25},"Hyper","Super","Meta",{"a":7,"w":6.25},"",{"a":4,"w":1.25},"Meta",{"w":1.25},"Super"]]
+''')
+        store = boards.build(layout, add_pro_micro=False,
+                             add_blue_pill=True).store
+
+        expected = {}
+        for net in store.circuit.nets:
+            pins = sorted((pin.part.ref, str(pin.num)) for pin in net.pins)
+            if pins:
+                expected[net.name] = pins
+        self.assertEqual(boards.nets(store), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
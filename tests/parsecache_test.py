@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+
+from keycad import kle, parsecache
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self._dir.name
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def entries(self):
+        return [
+            n for n in os.listdir(self.cache_dir)
+            if n.endswith(parsecache.ENTRY_SUFFIX)
+        ]
+
+    def test_hit_matches_parse(self):
+        cache = parsecache.ParseCache(self.cache_dir)
+        filename = "kle_layouts/ansi-104.json"
+
+        first = kle.Parser()
+        self.assertFalse(cache.load(first, filename))
+        second = kle.Parser()
+        self.assertTrue(cache.load(second, filename))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.assertEqual(second.key_count, first.key_count)
+        self.assertEqual(second.row_count, first.row_count)
+        self.assertEqual(second.max_col_count, first.max_col_count)
+        self.assertEqual((second.board_left, second.board_top,
+                          second.board_right, second.board_bottom),
+                         (first.board_left, first.board_top, first.board_right,
+                          first.board_bottom))
+        for a, b in zip(first.keys, second.keys):
+            self.assertEqual(a.labels, b.labels)
+            self.assertEqual((a.x, a.y, a.width, a.height, a.is_homing),
+                             (b.x, b.y, b.width, b.height, b.is_homing))
+
+    def test_parser_version_is_part_of_key(self):
+        cache = parsecache.ParseCache(self.cache_dir)
+        digest = cache.digest(b"[]")
+        old_version = kle.Parser.VERSION
+        try:
+            kle.Parser.VERSION += 1
+            self.assertNotEqual(cache.digest(b"[]"), digest)
+        finally:
+            kle.Parser.VERSION = old_version
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = parsecache.ParseCache(self.cache_dir)
+        filename = "kle_layouts/planck.json"
+        cache.load(kle.Parser(), filename)
+        (name, ) = self.entries()
+        with open(os.path.join(self.cache_dir, name), "wb") as f:
+            f.write(b"garbage")
+        p = kle.Parser()
+        self.assertFalse(cache.load(p, filename))
+        self.assertEqual(p.key_count, 47)
+
+    def test_failed_write_leaves_no_temp_file(self):
+        cache = parsecache.ParseCache(self.cache_dir)
+        old_serialize = parsecache.serialize
+
+        def serialize(parser):
+            raise ValueError("can't serialize")
+
+        p = kle.Parser()
+        try:
+            parsecache.serialize = serialize
+            with self.assertLogs("keycad.parsecache", "WARNING"):
+                self.assertFalse(cache.load(p, "kle_layouts/planck.json"))
+        finally:
+            parsecache.serialize = old_serialize
+        # The parse itself still stands.
+        self.assertEqual(p.key_count, 47)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_evict_skips_vanished_entries(self):
+        cache = parsecache.ParseCache(self.cache_dir)
+        cache.load(kle.Parser(), "kle_layouts/planck.json")
+        # Like an entry that another process removed after it was listed.
+        os.symlink(os.path.join(self.cache_dir, "gone"),
+                   os.path.join(self.cache_dir, "x" + parsecache.ENTRY_SUFFIX))
+        cache.evict()
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_lru_eviction(self):
+        planck = "kle_layouts/planck.json"
+        numpad = "kle_layouts/number-pad.json"
+        cache = parsecache.ParseCache(self.cache_dir)
+        cache.load(kle.Parser(), planck)
+        (planck_entry, ) = self.entries()
+        planck_size = os.path.getsize(
+            os.path.join(self.cache_dir, planck_entry))
+
+        # Room for planck plus a little, but not for a second entry.
+        cache = parsecache.ParseCache(self.cache_dir,
+                                      max_bytes=planck_size + 16)
+        os.utime(os.path.join(self.cache_dir, planck_entry), (0, 0))
+        cache.load(kle.Parser(), numpad)
+        self.assertNotIn(planck_entry, self.entries())
+        self.assertEqual(len(self.entries()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+import io
 import unittest
+
 from keycad import partstore
 
 
@@ -14,6 +16,67 @@ class TestPartStore(unittest.TestCase):
         part = store.get_mcu(partstore.McuType.BluePill)
         self.assertEqual(len(store.parts), 1)
 
+    def test_stores_are_isolated(self):
+        store_a = partstore.PartStore()
+        store_b = partstore.PartStore()
+
+        diode_a = store_a.get_diode()
+        store_a.get_diode()
+        diode_b = store_b.get_diode()
+
+        # Each store numbers its own parts into its own circuit.
+        self.assertEqual(diode_a.ref, "D1")
+        self.assertEqual(diode_b.ref, "D1")
+        self.assertEqual(len(store_a.circuit.parts), 2)
+        self.assertEqual(len(store_b.circuit.parts), 1)
+        self.assertIs(diode_b.circuit, store_b.circuit)
+
+    def test_template_cache(self):
+        templates = partstore.get_template_cache()
+        templates.clear()
+        store = partstore.PartStore()
+
+        d1 = store.get_diode()
+        d2 = store.get_diode()
+        self.assertEqual((templates.misses, templates.hits), (1, 1))
+        self.assertEqual((d1.ref, d2.ref), ("D1", "D2"))
+        self.assertEqual(d2.value, "1N4148")
+        self.assertIs(d2.circuit, store.circuit)
+
+        # Switch and socket types have different footprints, so each gets its
+        # own template.
+        mx = store.get_keyswitch("A", True, True)
+        choc = store.get_keyswitch("B", False, False)
+        store.get_keyswitch("C", True, True)
+        self.assertEqual((templates.misses, templates.hits), (3, 2))
+        self.assertEqual(mx.footprint, "keycad:Kailh_socket_MX")
+        self.assertEqual(choc.footprint, "keycad:SW_PG1350")
+        self.assertEqual(len(store.circuit.parts), 5)
+
+    def test_template_library(self):
+        templates = partstore.TemplateCache(
+            partstore.get_template_cache().symbol_cache)
+        store = partstore.PartStore()
+        diode = store.get_diode()
+        template = templates.get("keycad", "D", "keycad:D_0805")
+        self.assertEqual(template.lib.filename, "keycad")
+        self.assertEqual(template.lib.path, "./keycad.lib")
+
+        diode.ref = "D1"
+        f = io.StringIO()
+        store.circuit.generate_netlist(file_=f)
+        self.assertRegex(f.getvalue(), r'\(lib "?keycad"?\)')
+
+    def test_missing_library_warns(self):
+        templates = partstore.TemplateCache(
+            partstore.get_template_cache().symbol_cache)
+        with self.assertLogs("keycad.partstore", "WARNING"):
+            try:
+                templates.get("no_such_lib", "D", "keycad:D_0805")
+            except Exception:
+                # skidl can't find it either.
+                pass
+
 
 if __name__ == "__main__":
     unittest.main()
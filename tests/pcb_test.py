@@ -0,0 +1,38 @@
+import collections
+import unittest
+
+from keycad import kle, pcb
+
+FakePart = collections.namedtuple("FakePart", ["ref"])
+
+
+class TestPcb(unittest.TestCase):
+    def test_rotated_key_placement(self):
+        board = pcb.Pcb(19.05, 19.05)
+        p = kle.Parser()
+        p.handle_dict([["A"], [{"r": 90, "rx": 0, "ry": 0}, "B"]])
+        a, b = p.keys
+
+        board.place_diode_on_keyboard_grid(FakePart("D1"), a)
+        board.place_diode_on_keyboard_grid(FakePart("D2"), b)
+        board.place_keyswitch_on_keyboard_grid(FakePart("K2"), b)
+        placed = board.kinjector_dict
+
+        self.assertEqual(placed["D1"]["position"]["angle"], 270)
+        self.assertEqual(placed["D2"]["position"]["angle"], 180)
+        self.assertEqual(placed["K2"]["position"]["angle"], 270)
+
+        # The diode's offset from its switch turns with the key.
+        def offset(d, k):
+            return (placed[d]["position"]["x"] - placed[k]["position"]["x"],
+                    placed[d]["position"]["y"] - placed[k]["position"]["y"])
+
+        board.place_keyswitch_on_keyboard_grid(FakePart("K1"), a)
+        (ax, ay) = offset("D1", "K1")
+        (bx, by) = offset("D2", "K2")
+        self.assertAlmostEqual(bx, -ay)
+        self.assertAlmostEqual(by, ax)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import collections
+import io
+import unittest
+
+from keycad import footprints, pcbwriter, sexpr
+from keycad.netlist import Netlist
+from keycad.pcb import Pcb
+
+FakePart = collections.namedtuple("FakePart", ("ref", "value", "footprint"))
+FakePin = collections.namedtuple("FakePin", ("part", "num"))
+
+DIODE = "keycad:D_0805"
+
+
+class TestPcbWriter(unittest.TestCase):
+    def setUp(self):
+        self.diode = footprints.get_footprint_library().get(DIODE)
+
+    def test_place_top(self):
+        module = pcbwriter.place_footprint(self.diode,
+                                           DIODE,
+                                           "D1",
+                                           "1N4148",
+                                           10,
+                                           20.5,
+                                           angle=90,
+                                           pad_nets={"1": (2, "ROW_1")})
+        self.assertEqual(module[1], DIODE)
+        self.assertEqual(sexpr.find(module, "layer"), ["layer", "F.Cu"])
+        self.assertEqual(sexpr.find(module, "at"), ["at", "10", "20.5", "90"])
+
+        texts = sexpr.find_all(module, "fp_text")
+        self.assertEqual(texts[0][2], "D1")
+        self.assertEqual(texts[1][2], "1N4148")
+        self.assertEqual(sexpr.find(texts[0], "at"), ["at", "0", "1.4", "90"])
+
+        pads = {p[1]: p for p in sexpr.find_all(module, "pad")}
+        self.assertEqual(sexpr.find(pads["1"], "net"), ["net", "2", "ROW_1"])
+        self.assertIsNone(sexpr.find(pads["2"], "net"))
+        self.assertEqual(sexpr.find(pads["1"], "at"),
+                         ["at", "-0.95", "0", "90"])
+
+        # The cached footprint is left alone.
+        self.assertEqual(self.diode[1], "D_0805")
+        self.assertIsNone(sexpr.find(self.diode, "at"))
+
+    def test_place_bottom(self):
+        module = pcbwriter.place_footprint(self.diode,
+                                           DIODE,
+                                           "D1",
+                                           "1N4148",
+                                           0,
+                                           0,
+                                           side="bottom")
+        self.assertEqual(sexpr.find(module, "layer"), ["layer", "B.Cu"])
+        line = sexpr.find(module, "fp_line")
+        self.assertEqual(line[1:4],
+                         [["start", "-2", "0.7"], ["end", "1.4", "0.7"],
+                          ["layer", "B.SilkS"]])
+        pad = sexpr.find(module, "pad")
+        self.assertEqual(
+            sexpr.find(pad, "layers")[1:], ["B.Cu", "B.Paste", "B.Mask"])
+        text = sexpr.find(module, "fp_text")
+        self.assertEqual(sexpr.find(text, "at"), ["at", "0", "-1.4"])
+        justify = sexpr.find(sexpr.find(text, "effects"), "justify")
+        self.assertEqual(justify, ["justify", "mirror"])
+
+    def test_write_board(self):
+        model = Netlist()
+        d1 = FakePart("D1", "1N4148", DIODE)
+        d2 = FakePart("D2", "1N4148", DIODE)
+        model.add_part(d1, "keycad", "D")
+        model.add_part(d2, "keycad", "D")
+        model.connect(FakePin(d1, 1), FakePin(d2, 1))
+        model.rename(FakePin(d1, 1), "ROW_1")
+
+        pcb = Pcb(19.05, 19.05)
+        pcb.place_component_on_keyboard_grid(d2,
+                                             0,
+                                             0,
+                                             180,
+                                             "bottom",
+                                             x_offset=5,
+                                             y_offset=6)
+
+        f = io.StringIO()
+        pcbwriter.write_board(f, model, pcb)
+        board = sexpr.parse(f.getvalue())
+        self.assertEqual(board[0], "kicad_pcb")
+        self.assertEqual(sexpr.find_all(board, "net"),
+                         [["net", "0", ""], ["net", "1", "ROW_1"]])
+
+        modules = sexpr.find_all(board, "module")
+        self.assertEqual(len(modules), 2)
+        self.assertEqual(sexpr.find(modules[0], "at"), ["at", "0", "0"])
+        self.assertEqual(sexpr.find(modules[1], "at"), ["at", "5", "6", "180"])
+        self.assertEqual(sexpr.find(modules[1], "layer"), ["layer", "B.Cu"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import collections
+import unittest
+
+import numpy as np
+
+import boards
+from keycad import matrix, netlist, placement
+from keycad.pcb import Pcb
+
+FakePart = collections.namedtuple("FakePart", ("ref", "value", "footprint"))
+FakePin = collections.namedtuple("FakePin", ("part", "num"))
+
+
+class TestPlacement(unittest.TestCase):
+    def setUp(self):
+        # Two keys four units apart, with a resistor that belongs near the
+        # right-hand one.
+        self.pcb = Pcb(19.05, 19.05)
+        self.model = netlist.Netlist()
+        self.k1 = FakePart("K1", "A", "keycad:SW_MX")
+        self.k2 = FakePart("K2", "B", "keycad:SW_MX")
+        self.r1 = FakePart("R1", "5K1", "keycad:R_0805_2012Metric")
+        for part in (self.k1, self.k2, self.r1):
+            self.model.add_part(part, "keycad", "X")
+        self.pcb.place_component_on_keyboard_grid(self.k1, 0, 0, 0, "top")
+        self.pcb.place_component_on_keyboard_grid(self.k2, 4, 0, 0, "top")
+        self.pcb.place_component_on_keyboard_grid(self.r1, 2, 0, 0, "bottom")
+        self.model.connect(FakePin(self.k2, 1), FakePin(self.r1, 1))
+        self.model.rename(FakePin(self.r1, 1), "ROW_1")
+        self.outline = (-9.525, -9.525, 4.5 * 19.05, 9.525)
+
+    def test_wirelength(self):
+        fixed = np.array([[0, 0, 10, 10], [np.inf, np.inf, -np.inf, -np.inf]])
+        moving = np.array([[0, 0, 0, 0], [-1, 0, 1, 0]])
+        costs = placement.wirelength(np.array([5, 20]), np.array([5, -5]),
+                                     fixed, moving)
+        # Inside the box costs nothing extra; outside stretches it.
+        self.assertEqual(list(costs), [20 + 2, 20 + 15 + 2])
+
+    def test_place(self):
+        placer = placement.Placer(self.pcb, self.model, self.outline)
+        x, y, angle = placer.place(self.r1, ["ROW_1"])
+
+        # Right by K2's pin 1, which is at (73.66, 5.08).
+        self.assertLess(abs(x - 73.66) + abs(y - 5.08), 4)
+        self.assertEqual(self.pcb.get_placement("R1")[3], "bottom")
+        self.assertEqual(self.pcb.find_collisions(), [])
+
+    def test_keep_height(self):
+        placer = placement.Placer(self.pcb, self.model, self.outline)
+        x, y, angle = placer.place(self.r1, ["ROW_1"],
+                                   angles=(90, ),
+                                   y_mm=-7.62)
+        self.assertEqual((y, angle), (-7.62, 90))
+        self.assertEqual(self.pcb.find_collisions(), [])
+
+    def test_top_edge(self):
+        placer = placement.Placer(self.pcb, self.model, self.outline)
+        # Between the keys there's room right on the edge.
+        x, y, angle = placer.place(self.r1, ["ROW_1"],
+                                   angles=(0, ),
+                                   edge_y_mm=-9.525)
+        self.assertEqual((y, angle), (-9.525, 0))
+        self.assertLess(abs(x - 73.66), 10)
+        self.assertEqual(self.pcb.find_collisions(), [])
+
+        # On top, over K2, there isn't, so it moves out beyond the edge.
+        self.pcb.place_component_on_keyboard_grid(self.r1, 2, 0, 0, "top")
+        placer = placement.Placer(self.pcb, self.model,
+                                  (70, -9.525, 80, 9.525))
+        x, y, angle = placer.place(self.r1, ["ROW_1"],
+                                   angles=(0, ),
+                                   edge_y_mm=-7.62)
+        self.assertLess(y, -7.62)
+        self.assertEqual(self.pcb.find_collisions(), [])
+
+    def test_no_room(self):
+        # On top, K1's body fills all of a board that's only one key big.
+        self.pcb.place_component_on_keyboard_grid(self.r1, 0, 0, 0, "top")
+        placer = placement.Placer(self.pcb, self.model,
+                                  (-9.525, -9.525, 9.525, 9.525))
+        before = self.pcb.get_placement("R1")
+        self.assertIsNone(placer.place(self.r1, ["ROW_1"]))
+        self.assertEqual(self.pcb.get_placement("R1"), before)
+
+
+class TestPlaceParts(unittest.TestCase):
+    def test_full_top_row(self):
+        # Every spot along planck's top edge is under a key.
+        builder = boards.build("kle_layouts/planck.json",
+                               add_pro_micro=False,
+                               add_blue_pill=True,
+                               matrix_topologies=matrix.TOPOLOGIES).builder
+        placed = builder.place_parts()
+
+        x, y, angle = placed["J1"]
+        self.assertLessEqual(y, -9.525)
+        self.assertIsNotNone(placed["R1"])
+        self.assertIsNotNone(placed["R2"])
+        # A Blue Pill is too big for any gap between the keys, so only it can
+        # still overlap them.
+        for collision in builder.find_collisions():
+            self.assertIn("U2", (collision.ref_a, collision.ref_b))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import unittest
+
+import boards
+from keycad import ports
+
+
+class TestPorts(unittest.TestCase):
+    def test_pin_port(self):
+        self.assertEqual(ports.pin_port("B4"), ("B", 4))
+        self.assertEqual(ports.pin_port("C15"), ("C", 15))
+        self.assertIsNone(ports.pin_port("LED1"))
+        self.assertIsNone(ports.pin_port("GND"))
+
+    def test_pack(self):
+        pins = [(1, "D", 3), (2, "B", 1), (3, "B", 2), (4, "F", 7),
+                (5, "B", 6), (6, "B", 3), (7, None, None), (8, "D", 2)]
+        # B has room for three, and 1, 2 and 3 are closest together.
+        self.assertEqual(ports.pack(pins, 3), [(2, "B", 1), (3, "B", 2),
+                                               (6, "B", 3)])
+        # B fills up, then D.
+        self.assertEqual([p[0] for p in ports.pack(pins, 6)],
+                         [2, 3, 6, 5, 8, 1])
+        # Pins that aren't on ports go last.
+        self.assertEqual(ports.pack(pins, 8)[-1], (7, None, None))
+        with self.assertRaises(RuntimeError):
+            ports.pack(pins, 9)
+
+    def test_read_runs(self):
+        runs = ports.read_runs(["B1", "B2", "B3", "D2", "X", "B6"], "PIN%s")
+        self.assertEqual([(r["register"], r["shift"], r["mask"], r["col"])
+                          for r in runs], [("PINB", 1, "0x7", 0),
+                                           ("PIND", 2, "0x1", 3),
+                                           (None, None, "0x1", 4),
+                                           ("PINB", 6, "0x1", 5)])
+
+    def build(self, pin_allocation):
+        return boards.build(json.loads('[["A","B","C","D","E","F","G","H"]]'),
+                            add_per_key_rgb=False,
+                            pin_allocation=pin_allocation).schematic
+
+    def test_build(self):
+        in_order = self.build(ports.IN_ORDER)
+        self.assertEqual(in_order.get_legend_dict()["rows"], ["D3"])
+        by_port = self.build(ports.BY_PORT)
+        cols = by_port.get_legend_dict()["cols"]
+        self.assertEqual(cols,
+                         ["B1", "B2", "B3", "B4", "B5", "B6", "D0", "D1"])
+        self.assertNotIn(by_port.get_legend_dict()["rows"][0], cols)
+        self.assertLess(len(by_port.col_reads), len(in_order.col_reads))
+
+
+if __name__ == "__main__":
+    unittest.main()
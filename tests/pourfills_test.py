@@ -0,0 +1,30 @@
+import json
+import os
+import tempfile
+import unittest
+
+from keycad import pourfills
+
+
+class TestPourFills(unittest.TestCase):
+    def test_find_boards(self):
+        with tempfile.TemporaryDirectory() as d:
+            for name in ("a", "b", "c"):
+                os.makedirs(os.path.join(d, name))
+                open(os.path.join(d, name, name + ".kicad_pcb"), "w").close()
+            manifest = os.path.join(d, "manifest.json")
+            with open(manifest, "w") as f:
+                json.dump({"boards": ["*/*.kicad_pcb"]}, f)
+
+            boards = pourfills.find_boards([
+                os.path.join(d, "c", "c.kicad_pcb"),
+                os.path.join(d, "[ab]", "*.kicad_pcb"), manifest
+            ])
+            self.assertEqual(boards, [
+                os.path.join(d, name, name + ".kicad_pcb")
+                for name in ("c", "a", "b")
+            ])
+
+
+if __name__ == '__main__':
+    unittest.main()
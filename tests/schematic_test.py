@@ -1,6 +1,8 @@
 import unittest
 
-from keycad import mcu, partstore, schematic
+import boards
+from keycad import matrix, mcu, partstore, schematic
+from keycad.pcb import Pcb
 
 
 class TestSchematic(unittest.TestCase):
@@ -32,3 +34,44 @@ class TestSchematic(unittest.TestCase):
         store = partstore.PartStore()
         uc = mcu.BluePill(store)
         self.check_mcu(uc)
+
+
+class TestMatrixTopologies(unittest.TestCase):
+    def build(self, topologies):
+        board = boards.build(boards.grid(6, 18),
+                             add_per_key_rgb=False,
+                             matrix_topologies=topologies)
+        return board.parser, board.schematic, boards.nets(board.store)
+
+    def net_of(self, nets, ref, pin):
+        return next(name for name, pins in nets.items() if (ref, pin) in pins)
+
+    def test_duplex(self):
+        parser, sch, nets = self.build((matrix.STANDARD, matrix.DUPLEX))
+        self.assertEqual(sch.matrix_topology, matrix.DUPLEX)
+        self.assertEqual(
+            len(sch.get_legend_dict()["rows"]) +
+            len(sch.get_legend_dict()["cols"]), 15)
+        for i, key in enumerate(parser.keys):
+            switch = self.net_of(nets, "K%d" % (i + 1), "1")
+            cathode = self.net_of(nets, "D%d" % (i + 1), "1")
+            # Odd rows' diodes point from their row to their column.
+            row_net = "ROW_%d" % (key.matrix_row // 2 + 1)
+            col_net = "COL_%d" % (key.matrix_col + 1)
+            if key.matrix_row % 2:
+                row_net, col_net = col_net, row_net
+            self.assertEqual((switch, cathode), (col_net, row_net))
+
+    def test_round_robin(self):
+        parser, sch, nets = self.build((matrix.STANDARD, matrix.ROUND_ROBIN))
+        self.assertEqual(sch.matrix_topology, matrix.ROUND_ROBIN)
+        self.assertEqual(len(sch.get_legend_dict()["rows"]), 11)
+        self.assertEqual(sch.get_legend_dict()["cols"], [])
+        self.assertTrue(sch.get_legend_text().startswith("Lines: "))
+        for i, key in enumerate(parser.keys):
+            switch = self.net_of(nets, "K%d" % (i + 1), "1")
+            cathode = self.net_of(nets, "D%d" % (i + 1), "1")
+            self.assertEqual(cathode, "LINE_%d" % (key.matrix_row + 1))
+            self.assertEqual(
+                switch, "LINE_%d" %
+                (matrix.round_robin_line(key.matrix_row, key.matrix_col) + 1))
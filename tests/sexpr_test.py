@@ -0,0 +1,38 @@
+import unittest
+
+from keycad import sexpr
+
+
+class TestSexpr(unittest.TestCase):
+    def test_parse(self):
+        expr = sexpr.parse('(module "A B" (at 1.5 -2) (descr "say \\"hi\\""))')
+        self.assertEqual(
+            expr,
+            ["module", "A B", ["at", "1.5", "-2"], ["descr", 'say "hi"']])
+        self.assertIsInstance(expr[1], sexpr.Quoted)
+        self.assertNotIsInstance(expr[2][1], sexpr.Quoted)
+
+    def test_parse_errors(self):
+        for text in ("(a (b)", ")", "a"):
+            with self.assertRaises(ValueError):
+                sexpr.parse(text)
+
+    def test_round_trip(self):
+        text = '(pad 1 smd rect (at -0.95 0) (layers F.Cu F.Mask) (net 3 "a b"))'
+        self.assertEqual(sexpr.dumps(sexpr.parse(text), inline_depth=0), text)
+
+    def test_dumps(self):
+        self.assertEqual(
+            sexpr.dumps(["m", "x", ["at", 1.0, -0.0], ["f", ["g", ""]]]),
+            '(m x\n  (at 1 0)\n  (f (g "")))')
+        self.assertEqual(sexpr.format_number(0.1 + 0.2), "0.3")
+
+    def test_find(self):
+        expr = sexpr.parse("(m (a 1) (b 2) (a 3))")
+        self.assertEqual(sexpr.find(expr, "a"), ["a", "1"])
+        self.assertIsNone(sexpr.find(expr, "c"))
+        self.assertEqual(sexpr.find_all(expr, "a"), [["a", "1"], ["a", "3"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
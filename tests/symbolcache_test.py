@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from keycad import symbolcache
+
+USED_SYMBOLS = ("KEYSW", "D", "C", "R", "SK6812MINI-E", "ProMicro",
+                "BluePill_STM32F103C", "SW_Push", "USB_C_Receptacle_USB2.0")
+
+
+class TestSymbolCache(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._dir.name, "cache")
+        self.lib_filename = os.path.join(self._dir.name, "keycad.lib")
+        shutil.copy("keycad.lib", self.lib_filename)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def entries(self):
+        return [
+            n for n in os.listdir(self.cache_dir)
+            if n.endswith(symbolcache.ENTRY_SUFFIX)
+        ]
+
+    def test_parse_library(self):
+        with open("keycad.lib", "r") as f:
+            symbols = symbolcache.parse_library(f)
+        for name in USED_SYMBOLS:
+            self.assertIn(name, symbols)
+
+        diode = symbols["D"]
+        self.assertEqual(diode.ref_prefix, "D")
+        self.assertEqual([(p.num, p.name) for p in diode.pins], [("1", "K"),
+                                                                 ("2", "A")])
+        self.assertEqual(symbols["KEYSW"].ref_prefix, "K")
+
+        usb = symbols["USB_C_Receptacle_USB2.0"]
+        self.assertEqual(len(usb.pins), 17)
+        pins = {p.num: p for p in usb.pins}
+        self.assertEqual(pins["A4"].name, "VBUS")
+        self.assertEqual(pins["A1"].etype, "W")
+
+        self.assertEqual(len(symbols["BluePill_STM32F103C"].pins), 42)
+
+    def test_load_is_cached(self):
+        with open("keycad.lib", "r") as f:
+            expected = symbolcache.parse_library(f)
+
+        cache = symbolcache.SymbolCache(self.cache_dir)
+        self.assertEqual(cache.load(self.lib_filename), expected)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(len(self.entries()), 1)
+
+        # Unchanged in this process: not even the cache entry is read.
+        cache.load(self.lib_filename)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # A new process reads the entry instead of the library.
+        cache = symbolcache.SymbolCache(self.cache_dir)
+        self.assertEqual(cache.load(self.lib_filename), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_changed_library(self):
+        cache = symbolcache.SymbolCache(self.cache_dir)
+        cache.load(self.lib_filename)
+        with open(self.lib_filename, "a") as f:
+            f.write("DEF EXTRA X 0 40 Y Y 1 F N\n"
+                    "X ~ 1 0 0 100 R 50 50 1 1 P\n"
+                    "ENDDEF\n")
+        os.utime(self.lib_filename, ns=(0, 0))
+
+        symbols = cache.load(self.lib_filename)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(symbols["EXTRA"].pins,
+                         (symbolcache.Pin("1", "", "P"), ))
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_corrupt_entry(self):
+        cache = symbolcache.SymbolCache(self.cache_dir)
+        cache.load(self.lib_filename)
+        path = os.path.join(self.cache_dir, self.entries()[0])
+        with open(path, "wb") as f:
+            f.write(b"{not json")
+
+        cache = symbolcache.SymbolCache(self.cache_dir)
+        with self.assertLogs("keycad.symbolcache", level="WARNING"):
+            symbols = cache.load(self.lib_filename)
+        self.assertIn("KEYSW", symbols)
+        self.assertEqual(cache.misses, 1)
+
+    def test_lru_eviction(self):
+        cache = symbolcache.SymbolCache(self.cache_dir)
+        cache.load(self.lib_filename)
+        (first, ) = self.entries()
+        size = os.path.getsize(os.path.join(self.cache_dir, first))
+        os.utime(os.path.join(self.cache_dir, first), (0, 0))
+
+        # Room for one entry, not two.
+        cache = symbolcache.SymbolCache(self.cache_dir, max_bytes=size + 100)
+        with open(self.lib_filename, "a") as f:
+            f.write("DEF EXTRA X 0 40 Y Y 1 F N\nENDDEF\n")
+        cache.load(self.lib_filename)
+        self.assertNotIn(first, self.entries())
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_failed_write_leaves_no_temp_file(self):
+        # The cache directory can't be created where a file is in the way.
+        with open(self.cache_dir, "w"):
+            pass
+        cache = symbolcache.SymbolCache(os.path.join(self.cache_dir, "sub"))
+        with self.assertLogs("keycad.symbolcache", level="WARNING"):
+            symbols = cache.load(self.lib_filename)
+        self.assertIn("KEYSW", symbols)
+        self.assertEqual(sorted(os.listdir(self._dir.name)),
+                         ["cache", "keycad.lib"])
+
+
+if __name__ == '__main__':
+    unittest.main()
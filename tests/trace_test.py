@@ -0,0 +1,101 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from keycad import trace
+
+
+@trace.traced("double")
+def double(x):
+    return x * 2
+
+
+class TestTrace(unittest.TestCase):
+    def tearDown(self):
+        trace.disable()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(trace.get_tracer())
+        with trace.span("nothing"):
+            pass
+        self.assertEqual(double(2), 4)
+
+    def test_spans(self):
+        tracer = trace.enable()
+        with trace.span("outer", layout="planck"):
+            self.assertEqual(double(3), 6)
+            self.assertEqual(double(4), 8)
+            subprocess.call([sys.executable, "-c", "pass"])
+
+        inner, _, outer = tracer.events
+        self.assertEqual(inner["name"], "double")
+        self.assertEqual(outer["name"], "outer")
+        self.assertEqual(outer["ph"], "X")
+        self.assertEqual(outer["args"]["layout"], "planck")
+        self.assertGreater(outer["args"]["subprocess_cpu_ms"], 0)
+        self.assertGreater(outer["args"]["peak_rss_kb"], 0)
+        self.assertLessEqual(outer["ts"], inner["ts"])
+        self.assertGreaterEqual(outer["dur"], inner["dur"])
+        self.assertEqual(tracer.summary()["double"][1], 2)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            trace.print_summary(tracer)
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        self.assertEqual([(row[0], row[1]) for row in rows], [("outer", "1"),
+                                                              ("double", "2")])
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "trace.json")
+            tracer.write(filename)
+            with open(filename, "r") as f:
+                self.assertEqual(len(json.load(f)["traceEvents"]), 3)
+
+    def test_concurrent_stages(self):
+        tracer = trace.enable()
+
+        async def stages(processes, threads):
+            # Each stage burns CPU in its worker while this process waits.
+            work = range(3000000)
+            return await asyncio.gather(
+                trace.stage(processes, "sum", sum, work, trace_args={"n": 1}),
+                trace.stage(processes, "sum", sum, work, trace_args={"n": 2}),
+                trace.stage(threads, "max", max, work),
+                trace.stage(None, "min", min, work))
+
+        processes = concurrent.futures.ProcessPoolExecutor(2)
+        threads = concurrent.futures.ThreadPoolExecutor(1)
+        with processes, threads:
+            results = asyncio.run(stages(processes, threads))
+        self.assertEqual(results, [sum(range(3000000))] * 2 + [2999999, 0])
+
+        spans = [e for e in tracer.events if e["ph"] == "X"]
+        tracks = {
+            e["tid"]: e["args"]["name"]
+            for e in tracer.events if e["ph"] == "M"
+        }
+        self.assertEqual(sorted(e["name"] for e in spans),
+                         ["max", "min", "sum", "sum"])
+        self.assertEqual(len(tracks), 4)
+        for e in spans:
+            self.assertEqual(tracks[e["tid"]], e["name"])
+            self.assertGreater(e["args"]["cpu_ms"], 10)
+            self.assertLessEqual(e["args"]["cpu_ms"], e["dur"] / 1000 + 1)
+        self.assertEqual(sorted(e["args"].get("n", 0) for e in spans),
+                         [0, 0, 1, 2])
+        self.assertEqual(tracer.summary()["sum"][1], 2)
+
+    def test_stage_without_tracing(self):
+        self.assertEqual(asyncio.run(trace.stage(None, "sum", sum, [1, 2])), 3)
+        self.assertIsNone(trace.get_tracer())
+
+
+if __name__ == "__main__":
+    unittest.main()